@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Dotted-quad parsing and global-address checks without building ipaddress objects.
+
+Results match `ipaddress.IPv4Address(text)` and its `.is_global` for every input.
+Parsing follows the same rules: exactly four ASCII decimal octets, each at most
+255, and no leading zeros. The non-global ranges are not hard-coded. The table
+is built at import time by asking `ipaddress` about each interval between the
+boundaries of the IANA special-purpose blocks, so it follows whatever the running
+Python version considers global.
+"""
+
+import ipaddress
+from bisect import bisect_right
+
+# Superset of every block `ipaddress` treats specially (IANA IPv4 special-purpose registry plus multicast/reserved).
+_SPECIAL_BLOCKS = (
+    "0.0.0.0/8", "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16", "172.16.0.0/12",
+    "192.0.0.0/24", "192.0.0.0/29", "192.0.0.8/32", "192.0.0.9/32", "192.0.0.10/32", "192.0.0.170/31",
+    "192.0.2.0/24", "192.31.196.0/24", "192.52.193.0/24", "192.88.99.0/24", "192.168.0.0/16", "192.175.48.0/24",
+    "198.18.0.0/15", "198.51.100.0/24", "203.0.113.0/24", "224.0.0.0/4", "240.0.0.0/4", "255.255.255.255/32",
+)
+
+
+def _build_non_global_table():
+    boundaries = {0, 1 << 32}
+    for block in _SPECIAL_BLOCKS:
+        network = ipaddress.IPv4Network(block)
+        boundaries.add(int(network.network_address))
+        boundaries.add(int(network.broadcast_address) + 1)
+    edges = sorted(boundaries)
+    ranges = []
+    for start, end in zip(edges, edges[1:]):
+        if ipaddress.IPv4Address(start).is_global:
+            continue
+        if ranges and ranges[-1][1] == start - 1:
+            ranges[-1][1] = end - 1
+        else:
+            ranges.append([start, end - 1])
+    return [start for start, _ in ranges], [end for _, end in ranges]
+
+
+_NON_GLOBAL_STARTS, _NON_GLOBAL_ENDS = _build_non_global_table()
+
+
+def parse_ipv4(text):
+    """Return the address as an int, or None when `text` is not a valid dotted quad."""
+    parts = text.split(".")
+    if len(parts) != 4:
+        return None
+    value = 0
+    for part in parts:
+        if not 0 < len(part) <= 3 or not part.isascii() or not part.isdigit() or (part[0] == "0" and len(part) > 1):
+            return None
+        octet = int(part)
+        if octet > 255:
+            return None
+        value = value << 8 | octet
+    return value
+
+
+def is_global_ipv4(value):
+    index = bisect_right(_NON_GLOBAL_STARTS, value) - 1
+    return index < 0 or value > _NON_GLOBAL_ENDS[index]
+
+
+def normalize_ipv4(text):
+    """Stripped dotted quad, or None. Accepted input is already canonical, so no reformatting is needed."""
+    if not isinstance(text, str):
+        return None
+    text = text.strip()
+    return text if parse_ipv4(text) is not None else None
+
+
+def normalize_global_ipv4(text):
+    if not isinstance(text, str):
+        return None
+    text = text.strip()
+    value = parse_ipv4(text)
+    return text if value is not None and is_global_ipv4(value) else None
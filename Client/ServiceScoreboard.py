@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+
+class ServiceStats:
+    __slots__ = ("latency", "error_rate", "consecutive_failures", "open_until", "successes", "failures")
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.successes = 0
+        self.failures = 0
+
+
+class ServiceScoreboard:
+    """EWMA latency and error rate per lookup service, with a circuit breaker.
+
+    `order` sorts services by score (lower is better) and drops services whose
+    circuit is open. Sorting is stable, so services without samples keep the
+    order they were given in. After `failure_threshold` consecutive failures a
+    service is skipped for `cooldown_seconds`; when the cooldown ends it gets one
+    trial request, and another failure reopens the circuit straight away.
+    """
+
+    def __init__(self, alpha=0.3, failure_threshold=3, cooldown_seconds=300, failure_penalty_seconds=5.0, clock=time.monotonic):
+        self.alpha = alpha
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_seconds = cooldown_seconds
+        self.failure_penalty_seconds = failure_penalty_seconds
+        self._clock = clock
+        self._stats = {}
+
+    def _stats_for(self, service):
+        stats = self._stats.get(service)
+        if stats is None:
+            stats = self._stats[service] = ServiceStats()
+        return stats
+
+    def record_success(self, service, latency_seconds):
+        stats = self._stats_for(service)
+        stats.latency = latency_seconds if stats.latency is None else stats.latency + self.alpha * (latency_seconds - stats.latency)
+        stats.error_rate -= self.alpha * stats.error_rate
+        stats.consecutive_failures = 0
+        stats.open_until = 0.0
+        stats.successes += 1
+
+    def record_failure(self, service):
+        stats = self._stats_for(service)
+        stats.error_rate += self.alpha * (1.0 - stats.error_rate)
+        stats.consecutive_failures += 1
+        stats.failures += 1
+        if stats.consecutive_failures >= self.failure_threshold:
+            stats.open_until = self._clock() + self.cooldown_seconds
+
+    def is_open(self, service, now=None):
+        stats = self._stats.get(service)
+        return stats is not None and stats.open_until > (self._clock() if now is None else now)
+
+    def score(self, service):
+        stats = self._stats.get(service)
+        if stats is None:
+            return 0.0
+        return (stats.latency or 0.0) + stats.error_rate * self.failure_penalty_seconds
+
+    def order(self, services):
+        """Healthy services by score; when every circuit is open, all of them so a lookup is still tried."""
+        now = self._clock()
+        closed = [service for service in services if not self.is_open(service, now)]
+        return sorted(closed or list(services), key=self.score)
+
+    def snapshot(self, services=None):
+        now = self._clock()
+        rows = []
+        for service in services if services is not None else list(self._stats):
+            stats = self._stats.get(service) or ServiceStats()
+            rows.append({"service": service, "latency_ms": round(stats.latency * 1000) if stats.latency is not None else None, "error_rate": round(stats.error_rate, 3), "successes": stats.successes, "failures": stats.failures, "open": stats.open_until > now})
+        return rows
+
+    def format(self, services=None):
+        parts = []
+        for row in self.snapshot(services):
+            latency_text = f"{row['latency_ms']}ms" if row["latency_ms"] is not None else "-"
+            parts.append(f"{row['service']}={latency_text}/err={row['error_rate']:.2f}{'/open' if row['open'] else ''}")
+        return " ".join(parts)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+class CachedSource:
+    __slots__ = ("etag", "last_modified", "ip", "json_key", "not_modified_count")
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.ip = None
+        self.json_key = None
+        self.not_modified_count = 0
+
+
+class SourceCache:
+    """Per-URL HTTP validators and the IP parsed from the last full response.
+
+    `request_headers` adds If-None-Match / If-Modified-Since when the source sent
+    ETag / Last-Modified before; on a 304 the caller takes `not_modified` instead of
+    downloading and parsing the body again. The JSON key that matched last time is
+    kept per URL so it is probed first.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def _entry(self, url):
+        entry = self._entries.get(url)
+        if entry is None:
+            entry = self._entries[url] = CachedSource()
+        return entry
+
+    def request_headers(self, url, headers=None):
+        request_headers = dict(headers or {})
+        entry = self._entries.get(url)
+        if entry is not None and entry.ip:
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+        return request_headers
+
+    def not_modified(self, url):
+        """Return the cached IP for a 304 answer, or None when there is nothing to reuse."""
+        entry = self._entries.get(url)
+        if entry is None or not entry.ip:
+            return None
+        entry.not_modified_count += 1
+        return entry.ip
+
+    def store(self, url, response, ip):
+        entry = self._entry(url)
+        response_headers = getattr(response, "headers", None) or {}
+        entry.etag = response_headers.get("ETag")
+        entry.last_modified = response_headers.get("Last-Modified")
+        # Validators are only worth sending when the body held a usable IP to fall back on.
+        entry.ip = ip if ip and ip != "0.0.0.0" else None
+
+    def json_key(self, url):
+        entry = self._entries.get(url)
+        return entry.json_key if entry is not None else None
+
+    def remember_json_key(self, url, key):
+        self._entry(url).json_key = key
@@ -1,22 +1,43 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hmac
 import ipaddress
 import json
 import os
+import random
 import socket
 import subprocess
-import sys
 import threading
-import time
 from datetime import datetime
 
 import requests
 
+from Clock import SystemClock
+from FastIPv4 import normalize_global_ipv4, normalize_ipv4
+from ServiceScoreboard import ServiceScoreboard
+from SourceCache import SourceCache
+from WANWebhook import start_webhook_server
+
+MAX_REPORT_DATAGRAM_BYTES = 1024
+
+
+class _PushedBody:
+    """Gives a webhook body the `text`/`json()` shape that `_extract_router_ip_from_response` reads."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
 
 class UDPClient:
-    def __init__(self, client_domain_name, server_domain_names, log_file=None):
-        self._my_domain = client_domain_name
+    def __init__(self, client_domain_name, server_domain_names, log_file=None, clock=None):
+        self._clock = clock or SystemClock()
+        # One process can serve several client domains: they share IP discovery and probing, and reports are packed per datagram.
+        self._my_domains = [value.strip() for value in client_domain_name.split(",") if value.strip()] if client_domain_name else []
+        self._my_domain = self._my_domains[0] if self._my_domains else client_domain_name
         self._target_servers = [value.strip() for value in server_domain_names.split(",") if value.strip()] if server_domain_names else []
         if log_file is None:
             script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -25,13 +46,22 @@ class UDPClient:
         self._can_connect = 0
         self._connected_server = "-"
         self._connected_server_ip = "-"
-        self._wan_ip_source_url = (os.environ.get("WAN_IP_SOURCE_URL", "") or "").strip()
+        # WAN_IP_SOURCE_URLS lists router sources in priority order; the first one is the primary source.
+        wan_ip_source_urls = [value.strip() for value in (os.environ.get("WAN_IP_SOURCE_URLS", "") or "").split(",") if value.strip()]
+        self._wan_ip_source_url = wan_ip_source_urls[0] if wan_ip_source_urls else (os.environ.get("WAN_IP_SOURCE_URL", "") or "").strip()
+        self._wan_ip_source_fallback_urls = wan_ip_source_urls[1:]
+        self._source_cache = SourceCache()
         self._wan_ip_source_token = (os.environ.get("WAN_IP_SOURCE_TOKEN", "") or "").strip()
         self._wan_ip_source_token_header = (os.environ.get("WAN_IP_SOURCE_TOKEN_HEADER", "Authorization") or "Authorization").strip()
         self._wan_ip_source_json_key = (os.environ.get("WAN_IP_SOURCE_JSON_KEY", "") or "").strip()
         self._wan_ip_source_required = (os.environ.get("WAN_IP_SOURCE_REQUIRED", "0") or "0").strip().lower() in {"1", "true", "yes"}
         self._ipv4_services = self._load_public_ip_services()
         self._public_ip_service_index = 0
+        self._service_scoreboard = ServiceScoreboard(clock=self._clock.monotonic, failure_threshold=int(os.environ.get("IP_SERVICE_FAILURE_THRESHOLD", "3")), cooldown_seconds=max(0, int(os.environ.get("IP_SERVICE_COOLDOWN_SECONDS", "300"))))
+        self._service_score_log_interval_seconds = max(60, int(os.environ.get("IP_SERVICE_SCORE_LOG_INTERVAL_SECONDS", "3600")))
+        self._ipv6_enabled = (os.environ.get("IPV6_ENABLED", "0") or "0").strip().lower() in {"1", "true", "yes"}
+        self._ipv6_services = self._load_public_ipv6_services()
+        self._last_observed_public_ipv6 = None
         self._max_log_size_bytes = 10 * 1024 * 1024
         self._log_cooldown = {}
         self._last_observed_public_ip = None
@@ -51,7 +81,30 @@ class UDPClient:
         else:
             update_interval_seconds = int(os.environ.get("UPDATE_INTERVAL_SECONDS", "60"))
         self._update_interval_seconds = max(60, update_interval_seconds)
+        # Jitter keeps containers restarted together from reporting in lockstep; a server "next,<seconds>" reply overrides the interval.
+        self._random = random.Random()
+        self._update_jitter_fraction = min(0.5, max(0.0, float(os.environ.get("UPDATE_JITTER_FRACTION", "0.1"))))
+        self._update_start_jitter_seconds = max(0, int(os.environ.get("UPDATE_START_JITTER_SECONDS", "15")))
+        self._report_hint_wait_seconds = max(0.0, float(os.environ.get("REPORT_HINT_WAIT_SECONDS", "0.5")))
+        self._min_hint_seconds = 30
+        self._max_hint_seconds = max(self._update_interval_seconds, int(os.environ.get("MAX_REPORT_HINT_SECONDS", "900")))
+        self._server_hint_seconds = None
         self._udp_port = int(os.environ.get("UDP_SERVER_PORT", "7171"))
+        # WAN_WEBHOOK_PORT opens a small HTTP listener the router can call when its WAN address changes; polling stays as the fallback.
+        self._webhook_port = int(os.environ.get("WAN_WEBHOOK_PORT", "0") or "0")
+        self._webhook_bind_address = (os.environ.get("WAN_WEBHOOK_BIND", "0.0.0.0") or "0.0.0.0").strip()
+        self._webhook_token = (os.environ.get("WAN_WEBHOOK_TOKEN", "") or "").strip()
+        self._webhook_min_interval_seconds = max(0, int(os.environ.get("WAN_WEBHOOK_MIN_INTERVAL_SECONDS", "30")))
+        self._webhook_server = None
+        self._pushed_wan_ip = None
+        self._last_push_at = None
+        self._update_requested = threading.Event()
+        self._heartbeats = {}
+        self._worker_generations = {}
+        self._workers = {}
+        self._supervise_interval_seconds = 5
+        # A worker is considered stalled when it misses its heartbeat by this long: one full cycle plus lookup timeouts.
+        self._worker_deadlines = {"ping": self._ping_interval_seconds + max(60, 15 * len(self._target_servers)), "update": self._update_interval_seconds + 120}
 
     def __log(self, message):
         with open(self._log_file, "a+") as file_handle:
@@ -60,24 +113,35 @@ class UDPClient:
             os.remove(self._log_file)
 
     def _log_with_cooldown(self, key, message, cooldown_seconds):
-        now = time.time()
+        now = self._clock.time()
         last_time = self._log_cooldown.get(key, 0)
         if now - last_time >= cooldown_seconds:
             self.__log(message)
             self._log_cooldown[key] = now
 
     def _normalize_ipv4(self, ip_text):
-        try:
-            return str(ipaddress.IPv4Address(ip_text.strip()))
-        except Exception:
-            return None
+        return normalize_ipv4(ip_text)
 
     def _normalize_global_ipv4(self, ip_text):
-        normalized_ip = self._normalize_ipv4(ip_text) if ip_text else None
-        if normalized_ip and ipaddress.IPv4Address(normalized_ip).is_global:
-            return normalized_ip
+        return normalize_global_ipv4(ip_text)
+
+    def _normalize_global_ipv6(self, ip_text):
+        try:
+            address = ipaddress.IPv6Address(ip_text.strip())
+            if address.is_global:
+                return str(address)
+        except Exception:
+            pass
         return None
 
+    def _load_public_ipv6_services(self):
+        service_text = (os.environ.get("PUBLIC_IPV6_CHECK_URLS", "") or "").strip()
+        if service_text:
+            service_list = [value.strip() for value in service_text.split(",") if value.strip()]
+            if service_list:
+                return service_list
+        return ["https://api6.ipify.org", "https://ipv6.icanhazip.com"]
+
     def _load_public_ip_services(self):
         service_text = (os.environ.get("PUBLIC_IP_CHECK_URLS", "") or "").strip()
         if service_text:
@@ -94,18 +158,47 @@ class UDPClient:
         self._public_ip_service_index = (self._public_ip_service_index + 1) % len(self._ipv4_services)
         return ordered_services
 
+    def _fetch_ip_source(self, url, parse_response, headers=None):
+        response = requests.get(url, headers=self._source_cache.request_headers(url, headers), timeout=5)
+        if response.status_code == 304:
+            cached_ip = self._source_cache.not_modified(url)
+            if cached_ip:
+                return cached_ip
+        response.raise_for_status()
+        source_ip = parse_response(response)
+        self._source_cache.store(url, response, source_ip)
+        return source_ip
+
     def _get_public_client_ip(self):
-        for url in self._public_ip_services_round_robin():
+        # Round robin spreads load among services with equal scores; the scoreboard moves slow or failing ones back.
+        for url in self._service_scoreboard.order(self._public_ip_services_round_robin()):
+            started = self._clock.monotonic()
             try:
-                response = requests.get(url, timeout=5)
-                response.raise_for_status()
-                public_ip = self._normalize_global_ipv4(response.text)
+                public_ip = self._fetch_ip_source(url, lambda response: self._normalize_global_ipv4(response.text))
                 if public_ip:
+                    self._service_scoreboard.record_success(url, self._clock.monotonic() - started)
+                    self._log_with_cooldown("public-ip-service-scores", f"[public-ip] service scores: {self._service_scoreboard.format(self._ipv4_services)}", self._service_score_log_interval_seconds)
                     return public_ip, url
             except Exception:
                 pass
+            self._service_scoreboard.record_failure(url)
         return "0.0.0.0", "public:none"
 
+    def _get_public_client_ipv6(self):
+        # Same scoreboard and conditional requests as IPv4; URLs differ, so the two families never share entries.
+        for url in self._service_scoreboard.order(self._ipv6_services):
+            started = self._clock.monotonic()
+            try:
+                public_ipv6 = self._fetch_ip_source(url, lambda response: self._normalize_global_ipv6(response.text))
+                if public_ipv6:
+                    self._service_scoreboard.record_success(url, self._clock.monotonic() - started)
+                    self._log_with_cooldown("public-ipv6-service-scores", f"[public-ipv6] service scores: {self._service_scoreboard.format(self._ipv6_services)}", self._service_score_log_interval_seconds)
+                    return public_ipv6
+            except Exception:
+                pass
+            self._service_scoreboard.record_failure(url)
+        return None
+
     def _router_api_headers(self):
         if not self._wan_ip_source_token:
             return {}
@@ -113,7 +206,7 @@ class UDPClient:
             return {"Authorization": f"Bearer {self._wan_ip_source_token}"}
         return {self._wan_ip_source_token_header: self._wan_ip_source_token}
 
-    def _extract_router_ip_from_response(self, response):
+    def _extract_router_ip_from_response(self, response, url=None):
         direct_ip = self._normalize_global_ipv4(response.text)
         if direct_ip:
             return direct_ip
@@ -127,58 +220,83 @@ class UDPClient:
         if not isinstance(payload, dict):
             return "0.0.0.0"
         candidate_keys = [self._wan_ip_source_json_key] if self._wan_ip_source_json_key else ["wan_ip", "ip", "public_ip", "address"]
+        matched_key = self._source_cache.json_key(url) if url else None
+        if matched_key in candidate_keys:
+            candidate_keys = [matched_key] + [key for key in candidate_keys if key != matched_key]
         for key in candidate_keys:
             if key and key in payload:
                 candidate_ip = self._normalize_global_ipv4(str(payload.get(key, "")).strip())
                 if candidate_ip:
+                    if url:
+                        self._source_cache.remember_json_key(url, key)
                     return candidate_ip
         return "0.0.0.0"
 
+    def _router_sources(self):
+        sources = []
+        for url in [self._wan_ip_source_url] + self._wan_ip_source_fallback_urls:
+            if url and url not in sources:
+                sources.append(url)
+        return sources
+
     def _get_router_wan_ip(self):
         if not self._wan_ip_source_url:
             return "0.0.0.0", "router:none"
-        try:
-            response = requests.get(self._wan_ip_source_url, headers=self._router_api_headers(), timeout=5)
-            response.raise_for_status()
-            router_ip = self._extract_router_ip_from_response(response)
-            if router_ip != "0.0.0.0":
-                return router_ip, self._wan_ip_source_url
-            return "0.0.0.0", self._wan_ip_source_url
-        except Exception as error:
-            self._log_with_cooldown("router-wan-ip-failed", f"[router-wan-ip] lookup failed: {error}", 300)
-            return "0.0.0.0", self._wan_ip_source_url
+        for url in self._router_sources():
+            try:
+                router_ip = self._fetch_ip_source(url, lambda response: self._extract_router_ip_from_response(response, url), headers=self._router_api_headers())
+                if router_ip != "0.0.0.0":
+                    return router_ip, url
+            except Exception as error:
+                self._log_with_cooldown(f"router-wan-ip-failed:{url}", f"[router-wan-ip] lookup failed: url={url} error={error}", 300)
+        return "0.0.0.0", self._wan_ip_source_url
 
-    def ping_server(self):
-        while True:
-            reachable = 0
-            connected_server = "-"
-            connected_server_ip = "-"
-            for server in self._target_servers:
-                try:
-                    server_ip = socket.gethostbyname(server)
-                    process = subprocess.Popen(f"ping -c 1 {server_ip}", stdout=subprocess.PIPE, universal_newlines=True, shell=True)
-                    process.wait()
-                    if process.returncode == 0:
-                        reachable = 1
-                        connected_server = server
-                        connected_server_ip = server_ip
-                        break
-                except Exception as error:
-                    self._log_with_cooldown(f"ping-error-{server}", f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}][ping] Error pinging {server}: {error}", 600)
-            stable_reachable = self._next_connectivity_state(reachable)
-            if reachable == 1:
-                stable_server = connected_server
-                stable_server_ip = connected_server_ip
-            elif stable_reachable == 1:
-                stable_server = self._connected_server
-                stable_server_ip = self._connected_server_ip
-            else:
-                stable_server = "-"
-                stable_server_ip = "-"
-            self._can_connect = stable_reachable
-            self._connected_server = stable_server
-            self._connected_server_ip = stable_server_ip
-            time.sleep(self._ping_interval_seconds)
+    def _timestamp(self):
+        return datetime.fromtimestamp(self._clock.time()).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _probe_server(self, server):
+        """Return the server's IP when it answers a ping, otherwise None."""
+        server_ip = socket.gethostbyname(server)
+        process = subprocess.Popen(f"ping -c 1 {server_ip}", stdout=subprocess.PIPE, universal_newlines=True, shell=True)
+        process.wait()
+        return server_ip if process.returncode == 0 else None
+
+    def _ping_once(self, generation=None):
+        reachable = 0
+        connected_server = "-"
+        connected_server_ip = "-"
+        for server in self._target_servers:
+            try:
+                server_ip = self._probe_server(server)
+                if server_ip:
+                    reachable = 1
+                    connected_server = server
+                    connected_server_ip = server_ip
+                    break
+            except Exception as error:
+                self._log_with_cooldown(f"ping-error-{server}", f"[{self._timestamp()}][ping] Error pinging {server}: {error}", 600)
+        # A worker retired while probing must not overwrite the state its replacement now owns.
+        if not self._worker_is_current("ping", generation):
+            return
+        stable_reachable = self._next_connectivity_state(reachable)
+        if reachable == 1:
+            stable_server = connected_server
+            stable_server_ip = connected_server_ip
+        elif stable_reachable == 1:
+            stable_server = self._connected_server
+            stable_server_ip = self._connected_server_ip
+        else:
+            stable_server = "-"
+            stable_server_ip = "-"
+        self._can_connect = stable_reachable
+        self._connected_server = stable_server
+        self._connected_server_ip = stable_server_ip
+
+    def ping_server(self, generation=None):
+        while self._worker_is_current("ping", generation):
+            self._heartbeat("ping")
+            self._ping_once(generation)
+            self._clock.sleep(self._ping_interval_seconds)
 
     def _next_connectivity_state(self, reachable):
         if reachable == 1:
@@ -190,7 +308,7 @@ class UDPClient:
             self._disconnect_start_time = None
             return 1
         if self._disconnect_start_time is None:
-            self._disconnect_start_time = time.time()
+            self._disconnect_start_time = self._clock.time()
         return 0
 
     def _format_connectivity_text(self):
@@ -198,7 +316,7 @@ class UDPClient:
             return f"connected({self._connected_server}@{self._connected_server_ip})"
         if self._disconnect_start_time is None:
             return f"disconnected(0/{self._disconnect_window_seconds})"
-        elapsed_seconds = int(max(0, time.time() - self._disconnect_start_time))
+        elapsed_seconds = int(max(0, self._clock.time() - self._disconnect_start_time))
         elapsed_seconds = min(elapsed_seconds, self._disconnect_window_seconds)
         return f"disconnected({elapsed_seconds}/{self._disconnect_window_seconds})"
 
@@ -248,54 +366,236 @@ class UDPClient:
         self._last_ip_source = f"dns:{self._my_domain if self._my_domain else '-'}"
         return dns_ip
 
-    def _format_update_log(self, client_ip, connectivity_text, source_text):
+    def _format_update_log(self, client_ip, connectivity_text, source_text, client_ipv6=None, domain_name=None):
+        domain_name = domain_name if domain_name is not None else self._my_domain
         normalized_client_ip = self._normalize_ipv4(client_ip) or client_ip
-        merged_domain = f"{self._my_domain if self._my_domain else '-'}@{normalized_client_ip if normalized_client_ip else '-'}"
-        return f"[client={normalized_client_ip if normalized_client_ip else '-'}(source={source_text if source_text else '-'})] [domain={merged_domain}] [connectivity={connectivity_text}]||"
+        merged_domain = f"{domain_name if domain_name else '-'}@{normalized_client_ip if normalized_client_ip else '-'}"
+        ipv6_text = f" [ipv6={client_ipv6}]" if client_ipv6 else ""
+        return f"[client={normalized_client_ip if normalized_client_ip else '-'}(source={source_text if source_text else '-'})] [domain={merged_domain}] [connectivity={connectivity_text}]{ipv6_text}||"
+
+    def _build_report_message(self, ip_value, ipv6_value, connectivity_payload, domain_name=None):
+        # Dual-stack hosts append the IPv6 address to the v4 report, so one datagram updates both records.
+        domain_name = domain_name if domain_name is not None else self._my_domain
+        if ip_value != "0.0.0.0":
+            message = f"{domain_name},v4,{ip_value},{connectivity_payload}"
+            return f"{message},{ipv6_value}" if ipv6_value else message
+        if ipv6_value:
+            return f"{domain_name},v6,{ipv6_value},{connectivity_payload}"
+        return None
+
+    def _build_report_datagrams(self, ip_value, ipv6_value, connectivity_payload):
+        datagrams = []
+        current = b""
+        for domain_name in self._my_domains or [self._my_domain]:
+            message = self._build_report_message(ip_value, ipv6_value, connectivity_payload, domain_name)
+            if not message:
+                continue
+            encoded = message.encode("utf-8")
+            if current and len(current) + 1 + len(encoded) > MAX_REPORT_DATAGRAM_BYTES:
+                datagrams.append(current)
+                current = b""
+            current = current + b";" + encoded if current else encoded
+        if current:
+            datagrams.append(current)
+        return datagrams
+
+    def _send_report_datagrams(self, udp_client, datagrams):
+        """Send every datagram to each target server; returns the servers that took them."""
+        sent_servers = []
+        for server in self._target_servers:
+            try:
+                addr = socket.gethostbyname(server)
+            except socket.gaierror:
+                continue
+            try:
+                for datagram in datagrams:
+                    udp_client.sendto(datagram, (addr, self._udp_port))
+                sent_servers.append(server)
+            except Exception:
+                pass
+        return sent_servers
+
+    def _parse_report_hint(self, data):
+        parts = data.decode("utf-8", "replace").strip().split(",")
+        if len(parts) != 2 or parts[0] != "next":
+            return None
+        try:
+            seconds = int(parts[1])
+        except ValueError:
+            return None
+        return min(self._max_hint_seconds, max(self._min_hint_seconds, seconds))
+
+    def _collect_report_hints(self, udp_client, expected_replies):
+        """Wait briefly for "next,<seconds>" replies; returns the longest hint, or None when no server sent one."""
+        hints = []
+        deadline = self._clock.monotonic() + self._report_hint_wait_seconds
+        while len(hints) < expected_replies:
+            remaining = deadline - self._clock.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                udp_client.settimeout(remaining)
+                data, _ = udp_client.recvfrom(64)
+            except (socket.timeout, OSError):
+                break
+            hint = self._parse_report_hint(data)
+            if hint is not None:
+                hints.append(hint)
+        return max(hints) if hints else None
+
+    def _next_update_delay(self):
+        # The hint may only lengthen the interval: the server derives it from its own REPORT_INTERVAL_SECONDS,
+        # and following a shorter one would pull slow clients up to the server's rate. No jitter on this path:
+        # the hint already places the client at its phase, and a fixed interval keeps the phases apart.
+        if self._server_hint_seconds:
+            return max(self._server_hint_seconds, self._update_interval_seconds)
+        jitter = self._update_interval_seconds * self._update_jitter_fraction
+        return self._update_interval_seconds + self._random.uniform(-jitter, jitter)
+
+    def _update_once(self, udp_client, generation=None):
+        ts = self._timestamp()
+        try:
+            connectivity_payload = str(self._can_connect)
+            connectivity_text = self._format_connectivity_text()
+            ip_value = self._select_update_ip()
+            # A push only wakes the worker; the address reported is the one the router/public sources confirm.
+            pushed_ip, self._pushed_wan_ip = self._pushed_wan_ip, None
+            if pushed_ip and pushed_ip != ip_value:
+                self.__log(f"[{ts}][webhook] pushed WAN IP {pushed_ip} not confirmed, reporting {ip_value} from {self._last_ip_source}")
+            ipv6_value = self._get_public_client_ipv6() if self._ipv6_enabled else None
+            if not self._worker_is_current("update", generation):
+                return
+            self._last_observed_public_ip = ip_value
+            self._last_observed_public_ipv6 = ipv6_value
+            datagrams = self._build_report_datagrams(ip_value, ipv6_value, connectivity_payload)
+            sent_servers = self._send_report_datagrams(udp_client, datagrams) if datagrams else []
+            if sent_servers:
+                self._last_upload_success_ip = ip_value
+                self._server_hint_seconds = self._collect_report_hints(udp_client, len(sent_servers) * len(datagrams))
+            log_lines = [f"[{ts}] {self._format_update_log(ip_value, connectivity_text, self._last_ip_source, ipv6_value, domain_name)}" for domain_name in self._my_domains or [self._my_domain]]
+            self.__log("\n".join(log_lines))
+        except Exception as error:
+            self.__log(f"[{ts}][update] cycle_error={error}")
 
-    def update_server(self):
+    def update_server(self, generation=None):
         udp_client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         udp_client.settimeout(5)
+        try:
+            self._clock.sleep(self._random.uniform(0, self._update_start_jitter_seconds))
+            while self._worker_is_current("update", generation):
+                self._heartbeat("update")
+                self._update_once(udp_client, generation)
+                if not self._worker_is_current("update", generation):
+                    break
+                delay = self._next_update_delay()
+                self._worker_deadlines["update"] = delay + 120
+                self._wait_for_next_update(delay)
+        finally:
+            # Every restart opens a new socket; a retired worker closes its own on the way out.
+            udp_client.close()
+
+    def _wait_for_next_update(self, delay):
+        """Sleep until the next report is due or a WAN IP push arrives; returns "push" or "timer"."""
+        if self._webhook_server is None:
+            self._clock.sleep(delay)
+            return "timer"
+        if not self._update_requested.wait(delay):
+            return "timer"
+        self._update_requested.clear()
+        return "push"
+
+    def _webhook_token_valid(self, params, headers):
+        # Without a token the listener only starts on loopback (see start_webhook_listener).
+        if not self._webhook_token:
+            return True
+        authorization = (headers.get("Authorization") or "").strip()
+        supplied = params.get("token") or headers.get("X-Webhook-Token") or (authorization[7:] if authorization.lower().startswith("bearer ") else "")
+        return hmac.compare_digest(supplied.strip().encode("utf-8"), self._webhook_token.encode("utf-8"))
+
+    def _handle_wan_push(self, body, params, headers, peer_ip):
+        if not self._webhook_token_valid(params, headers):
+            self._log_with_cooldown(f"webhook-unauthorized:{peer_ip}", f"[{self._timestamp()}][webhook] rejected push from {peer_ip}: bad token", 300)
+            return 401, {"error": "unauthorized"}
+        # Routers send the address as plain text, as JSON ({"wan_ip": ...}, WAN_IP_SOURCE_JSON_KEY) or as ?ip=.
+        pushed_ip = self._extract_router_ip_from_response(_PushedBody(params.get("ip") or body))
+        if pushed_ip == "0.0.0.0":
+            self._log_with_cooldown(f"webhook-invalid:{peer_ip}", f"[{self._timestamp()}][webhook] ignored push from {peer_ip}: no global IPv4 address", 300)
+            return 400, {"error": "no global IPv4 address in push"}
+        now = self._clock.monotonic()
+        if self._last_push_at is not None and now - self._last_push_at < self._webhook_min_interval_seconds:
+            self._log_with_cooldown(f"webhook-throttled:{peer_ip}", f"[{self._timestamp()}][webhook] throttled push from {peer_ip}: at most one per {self._webhook_min_interval_seconds}s", 300)
+            return 429, {"error": "too many pushes"}
+        self._last_push_at = now
+        self._pushed_wan_ip = pushed_ip
+        self.__log(f"[{self._timestamp()}][webhook] WAN IP push from {peer_ip}: {pushed_ip}, confirming and reporting now")
+        self._update_requested.set()
+        return 202, {"accepted": pushed_ip}
+
+    def _webhook_bind_is_loopback(self):
+        try:
+            return ipaddress.ip_address(self._webhook_bind_address).is_loopback
+        except ValueError:
+            return self._webhook_bind_address == "localhost"
+
+    def start_webhook_listener(self):
+        if not self._webhook_token and not self._webhook_bind_is_loopback():
+            self.__log(f"[{self._timestamp()}][webhook] not started: WAN_WEBHOOK_TOKEN is required unless WAN_WEBHOOK_BIND is a loopback address")
+            return None
+        try:
+            self._webhook_server = start_webhook_server(self._webhook_bind_address, self._webhook_port, self._handle_wan_push)
+        except Exception as error:
+            self.__log(f"[{self._timestamp()}][webhook] listen on {self._webhook_bind_address}:{self._webhook_port} failed: {error}")
+            return None
+        self.__log(f"[{self._timestamp()}][webhook] listening on {self._webhook_bind_address}:{self._webhook_server.server_port}")
+        return self._webhook_server
+
+    def _heartbeat(self, name):
+        self._heartbeats[name] = self._clock.time()
+
+    def _worker_is_current(self, name, generation):
+        return generation is None or self._worker_generations.get(name) == generation
+
+    def _start_worker(self, name):
+        generation = self._worker_generations.get(name, 0) + 1
+        self._worker_generations[name] = generation
+        self._heartbeats[name] = self._clock.time()
+        target = self.ping_server if name == "ping" else self.update_server
+        worker = threading.Thread(target=target, args=(generation,), name=f"UDPClient-{name}-{generation}", daemon=True)
+        self._workers[name] = worker
+        worker.start()
+        return worker
+
+    def _supervise_once(self):
+        # Restart only workers that died or missed their heartbeat deadline; connectivity state lives on self and is kept.
+        # A stalled thread cannot be killed, so it is retired by generation and exits at its next loop check.
+        restarted = []
+        now = self._clock.time()
+        for name, deadline in self._worker_deadlines.items():
+            worker = self._workers.get(name)
+            if worker is None:
+                self._start_worker(name)
+                continue
+            if worker.is_alive() and now - self._heartbeats.get(name, now) <= deadline:
+                continue
+            reason = "died" if not worker.is_alive() else f"stalled({int(now - self._heartbeats.get(name, now))}s)"
+            self.__log(f"[{self._timestamp()}][supervisor] restarting {name} worker: {reason}")
+            self._start_worker(name)
+            restarted.append(name)
+        return restarted
+
+    def supervise(self):
+        if self._webhook_port and self._webhook_server is None:
+            self.start_webhook_listener()
         while True:
-            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             try:
-                connectivity_payload = str(self._can_connect)
-                connectivity_text = self._format_connectivity_text()
-                ip_value = self._select_update_ip()
-                self._last_observed_public_ip = ip_value
-                should_send = True
-                if ip_value == "0.0.0.0":
-                    should_send = False
-                sent_servers = []
-                if should_send:
-                    message = f"{self._my_domain},v4,{ip_value},{connectivity_payload}"
-                    for server in self._target_servers:
-                        try:
-                            addr = socket.gethostbyname(server)
-                        except socket.gaierror:
-                            continue
-                        try:
-                            udp_client.sendto(message.encode("utf-8"), (addr, self._udp_port))
-                            sent_servers.append(server)
-                        except Exception:
-                            pass
-                    if sent_servers:
-                        self._last_upload_success_ip = ip_value
-                self.__log(f"[{ts}] {self._format_update_log(ip_value, connectivity_text, self._last_ip_source)}")
+                self._supervise_once()
             except Exception as error:
-                self.__log(f"[{ts}][update] cycle_error={error}")
-            time.sleep(self._update_interval_seconds)
+                self._log_with_cooldown("supervisor-error", f"[{self._timestamp()}][supervisor] error={error}", 60)
+            self._clock.sleep(self._supervise_interval_seconds)
 
 
 if __name__ == "__main__":
-    while True:
-        client_domain_name = (os.environ.get("CLIENT_DOMAIN_NAME_OVERRIDE") or os.environ.get("CLIENT_DOMAIN_NAME", "")).strip()
-        server_domain_names = (os.environ.get("SERVER_DOMAIN_NAME_OVERRIDE") or os.environ.get("SERVER_DOMAIN_NAME", "")).strip()
-        ddns_client = UDPClient(client_domain_name, server_domain_names)
-        threading.Thread(target=ddns_client.ping_server, daemon=True).start()
-        threading.Thread(target=ddns_client.update_server, daemon=True).start()
-        start = time.time()
-        while True:
-            time.sleep(1)
-            if time.time() - start > 600:
-                os.execv(sys.executable, ["python"] + sys.argv)
+    client_domain_name = (os.environ.get("CLIENT_DOMAIN_NAME_OVERRIDE") or os.environ.get("CLIENT_DOMAIN_NAMES") or os.environ.get("CLIENT_DOMAIN_NAME", "")).strip()
+    server_domain_names = (os.environ.get("SERVER_DOMAIN_NAME_OVERRIDE") or os.environ.get("SERVER_DOMAIN_NAME", "")).strip()
+    ddns_client = UDPClient(client_domain_name, server_domain_names)
+    ddns_client.supervise()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+MAX_BODY_BYTES = 4096
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Passes every GET/POST to `server.on_push(body, params, headers, peer_ip)` and returns its (status, payload) as JSON."""
+
+    def _dispatch(self, body):
+        params = {key: values[-1] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        try:
+            status, payload = self.server.on_push(body, params, self.headers, self.client_address[0])
+        except Exception as error:
+            status, payload = 500, {"error": str(error)}
+        reply = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def do_GET(self):
+        self._dispatch("")
+
+    def do_POST(self):
+        # A negative length would make rfile.read() block until the peer closes; a non-number is just malformed.
+        length_text = (self.headers.get("Content-Length", "0") or "0").strip()
+        if not (length_text.isascii() and length_text.isdigit()):
+            self.send_error(400)
+            return
+        length = int(length_text)
+        if length > MAX_BODY_BYTES:
+            self.send_error(413)
+            return
+        self._dispatch(self.rfile.read(length).decode("utf-8", errors="replace"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_webhook_server(bind_address, port, on_push):
+    server = HTTPServer((bind_address, port), WebhookHandler)
+    server.on_push = on_push
+    threading.Thread(target=server.serve_forever, name="WANWebhook", daemon=True).start()
+    return server
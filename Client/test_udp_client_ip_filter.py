@@ -1,11 +1,16 @@
 import os
+import socket
 import tempfile
 import unittest
-from unittest.mock import patch
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock, patch
 
 try:
+    from Client.Clock import VirtualClock
     from Client.UDPClient import UDPClient
 except ModuleNotFoundError:
+    from Clock import VirtualClock
     from UDPClient import UDPClient
 
 
@@ -106,6 +111,28 @@ class TestUDPClientDNSIP(unittest.TestCase):
         with patch(self._requests_get_patch_target(), return_value=self.MockResponse("{\"wan_ip\":\"9.9.9.9\"}", payload={"wan_ip": self.ROUTER_IP})):
             self.assertEqual(client._get_router_wan_ip(), (self.ROUTER_IP, "http://router.local/wan-ip"))
 
+    def test_router_source_reuses_parsed_ip_on_not_modified(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._wan_ip_source_url = "http://router.local/wan-ip"
+        first = self.MockResponse("{}", payload={"ip": self.ROUTER_IP})
+        first.headers = {"ETag": "\"v1\"", "Last-Modified": "Mon, 19 Oct 2026 00:00:00 GMT"}
+        with patch(self._requests_get_patch_target(), side_effect=[first, self.MockResponse("", status_code=304)]) as mock_get:
+            self.assertEqual(client._get_router_wan_ip(), (self.ROUTER_IP, "http://router.local/wan-ip"))
+            self.assertEqual(client._get_router_wan_ip(), (self.ROUTER_IP, "http://router.local/wan-ip"))
+        second_headers = mock_get.call_args_list[1].kwargs["headers"]
+        self.assertEqual(second_headers["If-None-Match"], "\"v1\"")
+        self.assertEqual(second_headers["If-Modified-Since"], "Mon, 19 Oct 2026 00:00:00 GMT")
+        self.assertEqual(client._source_cache.json_key("http://router.local/wan-ip"), "ip")
+
+    def test_router_sources_are_tried_in_priority_order(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._wan_ip_source_url = "http://router.local/wan-ip"
+        client._wan_ip_source_fallback_urls = ["http://modem.local/status"]
+        with patch(self._requests_get_patch_target(), side_effect=[self.MockResponse("", status_code=503), self.MockResponse(self.ROUTER_IP)]):
+            self.assertEqual(client._get_router_wan_ip(), (self.ROUTER_IP, "http://modem.local/status"))
+
     def test_select_update_ip_prefers_router_when_configured(self):
         client, log_file = self._build_client()
         self._remember_temp(log_file)
@@ -152,6 +179,52 @@ class TestUDPClientDNSIP(unittest.TestCase):
         self.assertEqual(client._public_ip_services_round_robin(), ["u2", "u3", "u1"])
         self.assertEqual(client._public_ip_services_round_robin(), ["u3", "u1", "u2"])
 
+    def test_public_ip_lookup_skips_service_with_open_circuit(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._ipv4_services = ["u1", "u2"]
+        for _ in range(3):
+            client._service_scoreboard.record_failure("u1")
+        with patch(self._requests_get_patch_target(), return_value=self.MockResponse(self.PUBLIC_IP)) as mock_get:
+            self.assertEqual(client._get_public_client_ip(), (self.PUBLIC_IP, "u2"))
+        self.assertEqual([call.args[0] for call in mock_get.call_args_list], ["u2"])
+
+    def test_report_hint_overrides_jittered_interval(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._random.seed(1)
+        for _ in range(20):
+            delay = client._next_update_delay()
+            self.assertGreaterEqual(delay, 54)
+            self.assertLessEqual(delay, 66)
+        client._server_hint_seconds = client._parse_report_hint(b"next,75")
+        self.assertEqual(client._next_update_delay(), 75)
+        self.assertEqual(client._parse_report_hint(b"next,5"), 30)
+        self.assertIsNone(client._parse_report_hint(b"garbage"))
+
+    def test_report_hint_never_shortens_client_interval(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._update_interval_seconds = 600
+        client._server_hint_seconds = client._parse_report_hint(b"next,75")
+        self.assertEqual(client._next_update_delay(), 600)
+        client._server_hint_seconds = client._parse_report_hint(b"next,900")
+        self.assertEqual(client._next_update_delay(), 900)
+
+    def test_collect_report_hints_takes_longest_reply(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        self.addCleanup(receiver.close)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        for reply in (b"next,70", b"next,95"):
+            sender.sendto(reply, receiver.getsockname())
+        self.assertEqual(client._collect_report_hints(receiver, 2), 95)
+        client._report_hint_wait_seconds = 0.05
+        self.assertIsNone(client._collect_report_hints(receiver, 1))
+
     def test_connectivity_turns_off_after_three_failures(self):
         client, log_file = self._build_client()
         self._remember_temp(log_file)
@@ -179,8 +252,8 @@ class TestUDPClientDNSIP(unittest.TestCase):
         client._can_connect = 0
         client._disconnect_window_seconds = 300
         client._disconnect_start_time = 1000
-        with patch(f"{UDPClient.__module__}.time.time", return_value=1005):
-            self.assertEqual(client._format_connectivity_text(), "disconnected(5/300)")
+        client._clock = VirtualClock(1005)
+        self.assertEqual(client._format_connectivity_text(), "disconnected(5/300)")
 
     def test_connectivity_text_connected_shows_target(self):
         client, log_file = self._build_client()
@@ -196,6 +269,188 @@ class TestUDPClientDNSIP(unittest.TestCase):
         message = client._format_update_log(self.DNS_IP, "connected(timov4.qinyupeng.com@54.249.229.136)", "https://api.ipify.org")
         self.assertEqual(message, f"[client={self.DNS_IP}(source=https://api.ipify.org)] [domain=client.example.com@{self.DNS_IP}] [connectivity=connected(timov4.qinyupeng.com@54.249.229.136)]||")
 
+    def test_report_message_appends_ipv6_to_v4_report(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        self.assertEqual(client._build_report_message(self.PUBLIC_IP, "2001:4860:4860::8888", "1"), "client.example.com,v4,1.1.1.1,1,2001:4860:4860::8888")
+        self.assertEqual(client._build_report_message(self.PUBLIC_IP, None, "1"), "client.example.com,v4,1.1.1.1,1")
+        self.assertEqual(client._build_report_message("0.0.0.0", "2001:4860:4860::8888", "0"), "client.example.com,v6,2001:4860:4860::8888,0")
+        self.assertIsNone(client._build_report_message("0.0.0.0", None, "1"))
+
+    def test_public_ipv6_lookup_rejects_non_global(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        with patch(self._requests_get_patch_target(), side_effect=[self.MockResponse("fe80::1"), self.MockResponse("2001:4860:4860::8888\n")]):
+            self.assertEqual(client._get_public_client_ipv6(), "2001:4860:4860::8888")
+        self.assertEqual([(row["successes"], row["failures"]) for row in client._service_scoreboard.snapshot(client._ipv6_services)], [(0, 1), (1, 0)])
+
+    def test_update_log_includes_ipv6_when_present(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        message = client._format_update_log(self.DNS_IP, "connected(a@b)", "https://api.ipify.org", "2001:4860:4860::8888")
+        self.assertTrue(message.endswith("[connectivity=connected(a@b)] [ipv6=2001:4860:4860::8888]||"))
+
+    def test_multi_domain_reports_share_one_datagram(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._my_domains = ["a.example.com", "b.example.com"]
+        self.assertEqual(client._build_report_datagrams(self.PUBLIC_IP, None, "1"), [b"a.example.com,v4,1.1.1.1,1;b.example.com,v4,1.1.1.1,1"])
+
+    def test_multi_domain_reports_split_at_datagram_limit(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._my_domains = [f"client-{index:03d}.example.com" for index in range(100)]
+        datagrams = client._build_report_datagrams(self.PUBLIC_IP, None, "1")
+        self.assertGreater(len(datagrams), 1)
+        self.assertTrue(all(len(datagram) <= 1024 for datagram in datagrams))
+        self.assertEqual(sum(len(datagram.split(b";")) for datagram in datagrams), 100)
+
+    def test_client_domain_list_is_parsed(self):
+        log_file = tempfile.NamedTemporaryFile(delete=False).name
+        self._remember_temp(log_file)
+        client = UDPClient("a.example.com, b.example.com", "server.example.com", log_file=log_file)
+        self.assertEqual(client._my_domains, ["a.example.com", "b.example.com"])
+        self.assertEqual(client._my_domain, "a.example.com")
+
+    def test_supervisor_restarts_dead_worker_and_keeps_state(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._connect_fail_count = 2
+        client._last_upload_success_ip = self.PUBLIC_IP
+        with patch.object(client, "ping_server"), patch.object(client, "update_server"):
+            self.assertEqual(client._supervise_once(), [])
+            for worker in client._workers.values():
+                worker.join(1)
+            self.assertEqual(sorted(client._supervise_once()), ["ping", "update"])
+        self.assertEqual(client._worker_generations, {"ping": 2, "update": 2})
+        self.assertEqual(client._connect_fail_count, 2)
+        self.assertEqual(client._last_upload_success_ip, self.PUBLIC_IP)
+
+    def test_supervisor_retires_stalled_worker_by_generation(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+
+        class AliveWorker:
+            def is_alive(self):
+                return True
+
+        client._workers = {"ping": AliveWorker(), "update": AliveWorker()}
+        client._worker_generations = {"ping": 1, "update": 1}
+        client._heartbeats = {"ping": 1000, "update": 1000 + client._worker_deadlines["ping"]}
+        client._clock = VirtualClock(1001 + client._worker_deadlines["ping"])
+        with patch.object(client, "_start_worker") as mock_start:
+            self.assertEqual(client._supervise_once(), ["ping"])
+            mock_start.assert_called_once_with("ping")
+        client._worker_generations["ping"] = 2
+        self.assertFalse(client._worker_is_current("ping", 1))
+        self.assertTrue(client._worker_is_current("ping", 2))
+        self.assertTrue(client._worker_is_current("ping", None))
+
+    def test_retired_workers_discard_results_and_close_socket(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._clock = VirtualClock(1000)
+        client._worker_generations = {"ping": 2, "update": 2}
+        client._can_connect = 0
+        client._connect_fail_count = 3
+        with patch.object(client, "_probe_server", return_value="9.9.9.9"):
+            client._ping_once(1)
+        self.assertEqual((client._can_connect, client._connect_fail_count), (0, 3))
+        client._last_observed_public_ip = None
+        udp_client = MagicMock()
+        with patch.object(client, "_select_update_ip", return_value=self.PUBLIC_IP), patch.object(client, "_send_report_datagrams") as mock_send:
+            client._update_once(udp_client, 1)
+        mock_send.assert_not_called()
+        self.assertIsNone(client._last_observed_public_ip)
+        client._update_start_jitter_seconds = 0
+        client._worker_generations["update"] = 1
+
+        def retire(udp_client, generation):
+            client._worker_generations["update"] = 2
+
+        with patch(f"{UDPClient.__module__}.socket.socket", return_value=udp_client), patch.object(client, "_update_once", side_effect=retire):
+            client.update_server(1)
+        udp_client.close.assert_called_once_with()
+
+    def _push(self, port, body=b"", path="/", headers=None):
+        request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=body, headers=headers or {}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=2) as response:
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def test_webhook_push_wakes_report_confirmed_by_sources(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._webhook_bind_address = "127.0.0.1"
+        client._webhook_token = "secret"
+        client._webhook_min_interval_seconds = 0
+        self.assertIsNotNone(client.start_webhook_listener())
+        self.addCleanup(client._webhook_server.server_close)
+        self.addCleanup(client._webhook_server.shutdown)
+        port = client._webhook_server.server_port
+        self.assertEqual(self._push(port, b'{"wan_ip": "9.9.9.9"}'), 401)
+        self.assertEqual(self._push(port, b"192.168.1.1", headers={"Authorization": "Bearer secret"}), 400)
+        self.assertFalse(client._update_requested.is_set())
+        self.assertEqual(self._push(port, b'{"wan_ip": "9.9.9.9"}', headers={"Authorization": "Bearer secret", "Content-Type": "application/json"}), 202)
+        self.assertEqual(client._wait_for_next_update(60), "push")
+        # The pushed address is only a wake-up; the report uses what the sources confirm.
+        with patch.object(client, "_get_public_client_ip", return_value=(self.PUBLIC_IP, "public:test")):
+            self.assertEqual(client._select_update_ip(), self.PUBLIC_IP)
+        self.assertEqual(client._last_ip_source, "public:test")
+        self.assertEqual(self._push(port, path="/?ip=208.67.222.222&token=secret"), 202)
+        self.assertEqual(client._pushed_wan_ip, self.PUBLIC_FALLBACK_IP)
+
+    def test_webhook_rejects_bad_content_length(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._webhook_bind_address = "127.0.0.1"
+        client._webhook_token = "secret"
+        self.assertIsNotNone(client.start_webhook_listener())
+        self.addCleanup(client._webhook_server.server_close)
+        self.addCleanup(client._webhook_server.shutdown)
+        for length in ("-1", "abc"):
+            with socket.create_connection(("127.0.0.1", client._webhook_server.server_port), timeout=2) as connection:
+                connection.sendall(f"POST /?token=secret HTTP/1.0\r\nContent-Length: {length}\r\n\r\n9.9.9.9".encode())
+                self.assertTrue(connection.recv(64).startswith(b"HTTP/1.0 400"))
+        self.assertFalse(client._update_requested.is_set())
+
+    def test_pushes_are_rate_limited(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._clock = VirtualClock(1000)
+        client._webhook_min_interval_seconds = 30
+        self.assertEqual(client._handle_wan_push(self.ROUTER_IP, {}, {}, "192.168.1.1")[0], 202)
+        client._update_requested.clear()
+        client._clock.advance(29)
+        self.assertEqual(client._handle_wan_push(self.ROUTER_IP, {}, {}, "192.168.1.1")[0], 429)
+        self.assertFalse(client._update_requested.is_set())
+        client._clock.advance(1)
+        self.assertEqual(client._handle_wan_push(self.ROUTER_IP, {}, {}, "192.168.1.1")[0], 202)
+        self.assertTrue(client._update_requested.is_set())
+
+    def test_webhook_without_token_only_listens_on_loopback(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._webhook_port = 0
+        client._webhook_token = ""
+        client._webhook_bind_address = "0.0.0.0"
+        self.assertIsNone(client.start_webhook_listener())
+        with open(log_file) as f:
+            self.assertIn("WAN_WEBHOOK_TOKEN is required", f.read())
+        client._webhook_bind_address = "127.0.0.1"
+        self.assertIsNotNone(client.start_webhook_listener())
+        self.addCleanup(client._webhook_server.server_close)
+        self.addCleanup(client._webhook_server.shutdown)
+
+    def test_timer_wait_without_webhook(self):
+        client, log_file = self._build_client()
+        self._remember_temp(log_file)
+        client._clock = VirtualClock(1000)
+        self.assertEqual(client._wait_for_next_update(30), "timer")
+        self.assertEqual(client._clock.time(), 1030)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import socket
+import struct
+
+NETLINK_ROUTE = 0
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+_NLMSGHDR = struct.Struct("=IHHII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTATTR = struct.Struct("=HH")
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_address_events(data):
+    """Return (event, ifindex, address) for each RTM_NEWADDR/RTM_DELADDR message in a netlink datagram."""
+    events = []
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        msg_len, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if msg_len < _NLMSGHDR.size or offset + msg_len > len(data):
+            break
+        if msg_type in (RTM_NEWADDR, RTM_DELADDR) and msg_len >= _NLMSGHDR.size + _IFADDRMSG.size:
+            family, _, _, _, ifindex = _IFADDRMSG.unpack_from(data, offset + _NLMSGHDR.size)
+            attributes = {}
+            attr_offset = offset + _NLMSGHDR.size + _IFADDRMSG.size
+            while attr_offset + _RTATTR.size <= offset + msg_len:
+                attr_len, attr_type = _RTATTR.unpack_from(data, attr_offset)
+                if attr_len < _RTATTR.size:
+                    break
+                attributes[attr_type] = data[attr_offset + _RTATTR.size:attr_offset + attr_len]
+                attr_offset += _align(attr_len)
+            raw = attributes.get(IFA_LOCAL) or attributes.get(IFA_ADDRESS)
+            address = ""
+            if raw and family in (socket.AF_INET, socket.AF_INET6):
+                try:
+                    address = socket.inet_ntop(family, raw)
+                except ValueError:
+                    address = ""
+            events.append(("new" if msg_type == RTM_NEWADDR else "del", ifindex, address))
+        offset += _align(msg_len)
+    return events
+
+
+class AddressWatcher:
+    """Listens for kernel interface address changes over an rtnetlink socket.
+
+    `run` blocks and calls `on_change(event, ifindex, address)` for every added or
+    removed address. Only Linux has rtnetlink; `open` returns False elsewhere and
+    callers keep polling.
+    """
+
+    def __init__(self, on_change):
+        self._on_change = on_change
+        self._sock = None
+
+    def open(self):
+        if not hasattr(socket, "AF_NETLINK"):
+            return False
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        except OSError:
+            return False
+        self._sock = sock
+        return True
+
+    def run(self):
+        while self._sock is not None:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                return
+            for event, ifindex, address in parse_address_events(data):
+                self._on_change(event, ifindex, address)
+
+    def close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
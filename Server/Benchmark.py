@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks for the server's per-datagram hot paths.
+
+    python Benchmark.py                     # run and compare with benchmark_baselines.json
+    python Benchmark.py --update-baselines  # run and record new baselines
+
+Each case reports the median of `--repeat` runs in microseconds per call.
+Recording baselines runs the whole suite `--rounds` times. The baseline is the
+median of the rounds, and each case also gets its own tolerance: twice the
+round-to-round spread ((max - min) / median), never less than `--tolerance`.
+Microsecond-scale cases drift more between runs than the slow ones, so a flat
+threshold would flag noise. A case slower than its baseline by more than its
+tolerance is flagged and makes the run exit with status 1. Baselines depend on the
+machine, so record them on the host you compare on.
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+from unittest.mock import patch
+
+from FastIPv4 import normalize_global_ipv4
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+SAMPLE_IPS = ["8.8.8.8", "192.168.1.10", "100.64.3.4", "203.0.113.9", "1.1.1.1", "not-an-ip", "256.0.0.1", "45.76.12.200"]
+SAMPLE_DATAGRAM = b"a.example.com,v4,8.8.8.8,1;b.example.com,v4,1.1.1.1,1,2001:4860:4860::8888;c.example.com,v6,2001:db8::1,0"
+
+
+def _ipaddress_normalize_global(text):
+    try:
+        normalized_ip = str(ipaddress.IPv4Address(text.strip()))
+        if ipaddress.IPv4Address(normalized_ip).is_global:
+            return normalized_ip
+    except Exception:
+        pass
+    return None
+
+
+def build_cases(log_dir):
+    with patch("UDPServer.LightSail"):
+        from UDPServer import UDPServer
+
+        server = UDPServer(port=0, log_file=os.path.join(log_dir, "benchmark.log"))
+    for listener in server._listeners:
+        listener.close()
+    server._write_log_line = lambda formatted_msg: None
+    file_server = UDPServer.__new__(UDPServer)
+    file_server.__dict__.update(server.__dict__)
+    file_server.log_file = os.path.join(log_dir, "benchmark_file.log")
+    file_server._write_log_line = lambda formatted_msg: UDPServer._write_log_line(file_server, formatted_msg)
+    # handle_datagram runs the whole per-datagram pipeline with DNS answering "match" and the lambda unreachable,
+    # and a rate limit high enough that the token bucket is charged but never drops the benchmark sender.
+    server._rate_limit_per_minute = 10 ** 9
+    server._domains_point_to_ips = lambda pairs, record_type="A": {(domain_name, target_ip): (True, target_ip, "match") for domain_name, target_ip in pairs}
+    server.update_client_ip_via_lambda = lambda *args, **kwargs: False
+    record = server._decision_record("8.8.8.8", "a.example.com", "8.8.8.8", "not_updated", "dns_already_matches")
+
+    def quiet_file_log():
+        # _write_log_line prints every line; the benchmark measures the file write and size check.
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                file_server.log("benchmark line")
+            finally:
+                sys.stdout = stdout
+
+    return {
+        "handle_datagram": lambda: server._handle_datagram(SAMPLE_DATAGRAM, "203.0.113.50", 40000),
+        "validate_ipv4_fast": lambda: [normalize_global_ipv4(text) for text in SAMPLE_IPS],
+        "validate_ipv4_ipaddress": lambda: [_ipaddress_normalize_global(text) for text in SAMPLE_IPS],
+        "format_decision_record": lambda: server._format_decision_record(record),
+        "log_formatting_only": lambda: server.log("benchmark line"),
+        "log_to_file": quiet_file_log,
+    }
+
+
+def run(repeat, number):
+    log_dir = tempfile.mkdtemp(prefix="udp_benchmark_")
+    try:
+        cases = build_cases(log_dir)
+        return {name: round(statistics.median(timeit.repeat(case, repeat=repeat, number=number)) / number * 1e6, 3) for name, case in cases.items()}
+    finally:
+        for file_name in os.listdir(log_dir):
+            os.remove(os.path.join(log_dir, file_name))
+        os.rmdir(log_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark server hot paths against recorded baselines.")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--number", type=int, default=3000)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="minimum allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--baselines", default=BASELINES_FILE)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--rounds", type=int, default=5, help="independent runs used to record baselines and tolerances")
+    args = parser.parse_args(argv)
+
+    if args.update_baselines:
+        rounds = [run(args.repeat, args.number) for _ in range(max(1, args.rounds))]
+        results = {name: round(statistics.median(values[name] for values in rounds), 3) for name in rounds[0]}
+        tolerances = {name: round(max(args.tolerance, 2 * (max(values[name] for values in rounds) - min(values[name] for values in rounds)) / results[name]), 3) for name in results}
+        with open(args.baselines, "w") as f:
+            json.dump({"unit": "us_per_call", "python": sys.version.split()[0], "results": results, "tolerances": tolerances}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines written to {args.baselines}")
+    else:
+        results = run(args.repeat, args.number)
+    baselines = {}
+    tolerances = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            recorded = json.load(f)
+        baselines = recorded.get("results", {})
+        tolerances = recorded.get("tolerances", {})
+    regressions = []
+    for name, value in results.items():
+        baseline = baselines.get(name)
+        tolerance = max(args.tolerance, tolerances.get(name, 0.0))
+        ratio_text = f"{value / baseline:.2f}x" if baseline else "-"
+        flag = ""
+        if baseline and value > baseline * (1 + tolerance):
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:26s} {value:10.3f} us  baseline={baseline if baseline is not None else '-'}  {ratio_text}  tolerance={tolerance:.0%}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+
+class SystemClock:
+    """Wall clock, monotonic clock and sleep; the default for real runs."""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Clock that only moves when told to, for deterministic tests and simulations.
+
+    `sleep` advances the clock instead of blocking, so code written against the
+    clock interface runs through hours of timeouts and cooldowns instantly.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def set(self, now):
+        self.now = max(self.now, float(now))
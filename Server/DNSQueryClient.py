@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import select
+import struct
+import time
+from socket import AF_INET, AF_INET6, SOCK_DGRAM, inet_ntop, inet_pton, socket
+
+RECORD_TYPES = {"A": 1, "NS": 2, "CNAME": 5, "SOA": 6, "AAAA": 28}
+RECORD_NAMES = {value: key for key, value in RECORD_TYPES.items()}
+
+
+def encode_name(name):
+    encoded = b""
+    for label in name.rstrip(".").split("."):
+        raw = label.encode("idna")
+        if not raw or len(raw) > 63:
+            raise ValueError(f"invalid label in {name!r}")
+        encoded += bytes([len(raw)]) + raw
+    return encoded + b"\x00"
+
+
+def build_query(query_id, name, record_type, recursion_desired=False):
+    flags = 0x0100 if recursion_desired else 0
+    return struct.pack("!HHHHHH", query_id, flags, 1, 0, 0, 0) + encode_name(name) + struct.pack("!HH", RECORD_TYPES[record_type], 1)
+
+
+def _read_name(data, offset):
+    labels = []
+    end_offset = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end_offset is None:
+                end_offset = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), end_offset if end_offset is not None else offset
+        labels.append(data[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    raise ValueError("name compression loop")
+
+
+def parse_response(data):
+    """Return (query_id, rcode, answers, authority) where records are (name, type, ttl, value) tuples."""
+    query_id, flags, question_count, answer_count, authority_count, _ = struct.unpack_from("!HHHHHH", data, 0)
+    offset = 12
+    for _ in range(question_count):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    sections = []
+    for count in (answer_count, authority_count):
+        records = []
+        for _ in range(count):
+            name, offset = _read_name(data, offset)
+            record_type, _, ttl, length = struct.unpack_from("!HHIH", data, offset)
+            offset += 10
+            rdata_offset = offset
+            offset += length
+            if record_type == 1 and length == 4:
+                value = inet_ntop(AF_INET, data[rdata_offset:offset])
+            elif record_type == 28 and length == 16:
+                value = inet_ntop(AF_INET6, data[rdata_offset:offset])
+            elif record_type in (2, 5):
+                value, _ = _read_name(data, rdata_offset)
+            else:
+                value = None
+            records.append((name.lower(), RECORD_NAMES.get(record_type, record_type), ttl, value))
+        sections.append(records)
+    return query_id, flags & 0x000F, sections[0], sections[1]
+
+
+def _same_host(address, server):
+    if address == server:
+        return True
+    family = AF_INET6 if ":" in server else AF_INET
+    try:
+        return inet_pton(family, address.split("%")[0]) == inet_pton(family, server)
+    except (OSError, ValueError):
+        return False
+
+
+def system_resolvers(path="/etc/resolv.conf"):
+    resolvers = []
+    try:
+        with open(path) as file_handle:
+            for line in file_handle:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver" and ":" not in parts[1]:
+                    resolvers.append(parts[1])
+    except OSError:
+        pass
+    return resolvers or ["8.8.8.8"]
+
+
+class DNSQueryClient:
+    """Minimal DNS client that asks authoritative nameservers directly.
+
+    Queries for many names are pipelined over one UDP socket and matched back by
+    query id. A response is only accepted from the server the query went to and
+    when it repeats the question, so a stray or spoofed packet with a guessed id
+    is dropped. Checking N domains costs one round trip instead of N. Zone
+    nameservers come from `nameservers` when configured, otherwise they are
+    discovered once per zone through the bootstrap resolvers and cached; a failed
+    discovery is remembered for `negative_cache_seconds` so reports do not wait
+    out the bootstrap timeouts again and again.
+    """
+
+    def __init__(self, nameservers=None, bootstrap_resolvers=None, timeout=2.0, port=53, nameserver_cache_seconds=3600, negative_cache_seconds=60):
+        self.nameservers = [value for value in nameservers or [] if value]
+        self.bootstrap_resolvers = bootstrap_resolvers or system_resolvers()
+        self.timeout = timeout
+        self.port = port
+        self.nameserver_cache_seconds = nameserver_cache_seconds
+        self.negative_cache_seconds = negative_cache_seconds
+        self._zone_nameservers = {}
+        self._failed_discoveries = {}
+
+    def query_many(self, questions, servers, recursion_desired=False):
+        """Send every (name, type) question and return {question: (rcode, answers, authority)}; unanswered ones are missing."""
+        questions = list(dict.fromkeys(questions))
+        family = AF_INET6 if servers and ":" in servers[0] else AF_INET
+        servers = [server for server in servers if (":" in server) == (family == AF_INET6)]
+        if not questions or not servers:
+            return {}
+        results = {}
+        sock = socket(family, SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            pending = {}
+            used_ids = random.sample(range(1, 65536), len(questions))
+            for index, (question, query_id) in enumerate(zip(questions, used_ids)):
+                server = servers[index % len(servers)]
+                try:
+                    query = build_query(query_id, question[0], question[1], recursion_desired)
+                    sock.sendto(query, (server, self.port))
+                except (OSError, ValueError, UnicodeError):
+                    continue
+                # Names compare case-insensitively; length, type and class bytes are never ASCII letters.
+                pending[query_id] = (question, server, query[12:].lower())
+            deadline = time.monotonic() + self.timeout
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    break
+                try:
+                    data, addr = sock.recvfrom(4096)
+                    query_id, rcode, answers, authority = parse_response(data)
+                except (OSError, ValueError, IndexError, struct.error):
+                    continue
+                entry = pending.get(query_id)
+                if entry is None:
+                    continue
+                question, server, question_section = entry
+                if addr[1] != self.port or not _same_host(addr[0], server) or struct.unpack_from("!H", data, 4)[0] != 1 or data[12:12 + len(question_section)].lower() != question_section:
+                    continue
+                del pending[query_id]
+                results[question] = (rcode, answers, authority)
+        finally:
+            sock.close()
+        return results
+
+    def _discover_nameservers(self, domain_name):
+        labels = domain_name.rstrip(".").lower().split(".")
+        candidates = [".".join(labels[index:]) for index in range(len(labels) - 1)]
+        now = time.time()
+        for zone in candidates:
+            cached = self._zone_nameservers.get(zone)
+            if cached and cached[1] > now:
+                return cached[0]
+        domain_key = ".".join(labels)
+        if self._failed_discoveries.get(domain_key, 0) > now:
+            return []
+        responses = self.query_many([(zone, "NS") for zone in candidates], self.bootstrap_resolvers, recursion_desired=True)
+        for zone in candidates:
+            _, answers, _ = responses.get((zone, "NS"), (None, [], []))
+            ns_names = [value for name, record_type, _, value in answers if record_type == "NS" and name == zone and value]
+            if not ns_names:
+                continue
+            addresses = self.query_many([(ns_name, "A") for ns_name in ns_names], self.bootstrap_resolvers, recursion_desired=True)
+            ns_ips = [value for _, answers, _ in addresses.values() for _, record_type, _, value in answers if record_type == "A"]
+            if ns_ips:
+                self._zone_nameservers[zone] = (ns_ips, now + self.nameserver_cache_seconds)
+                return ns_ips
+        if len(self._failed_discoveries) >= 1024:
+            self._failed_discoveries = {key: expires for key, expires in self._failed_discoveries.items() if expires > now}
+        self._failed_discoveries[domain_key] = now + self.negative_cache_seconds
+        return []
+
+    def nameservers_for(self, domain_name):
+        return self.nameservers or self._discover_nameservers(domain_name)
+
+    def resolve_many(self, questions):
+        """Resolve (domain, "A"|"AAAA") pairs; returns {question: (addresses, ttl, status)}."""
+        by_servers = {}
+        results = {}
+        for question in questions:
+            servers = self.nameservers_for(question[0])
+            if not servers:
+                results[question] = ([], 0, "no_nameserver")
+                continue
+            by_servers.setdefault(tuple(servers), []).append(question)
+        for servers, group in by_servers.items():
+            responses = self.query_many(group, list(servers))
+            missing = [question for question in group if question not in responses]
+            if missing and len(servers) > 1:
+                responses.update(self.query_many(missing, list(servers[1:]) + [servers[0]]))
+            for question in group:
+                name = question[0].rstrip(".").lower()
+                if question not in responses:
+                    results[question] = ([], 0, "timeout")
+                    continue
+                rcode, answers, _ = responses[question]
+                records = [(ttl, value) for record_name, record_type, ttl, value in answers if record_type == question[1] and record_name == name]
+                if records:
+                    results[question] = ([value for _, value in records], min(ttl for ttl, _ in records), "ok")
+                elif any(record_type == "CNAME" for _, record_type, _, _ in answers):
+                    results[question] = ([], 0, "cname")
+                elif rcode == 3:
+                    results[question] = ([], 0, "nxdomain")
+                else:
+                    results[question] = ([], 0, "no_record")
+        return results
+
+    def resolve(self, domain_name, record_type="A"):
+        return self.resolve_many([(domain_name, record_type)])[(domain_name, record_type)]
+
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+DNSChange = namedtuple("DNSChange", ["domain_name", "ip", "connectivity", "ipv6"], defaults=[None])
+
+
+class DNSUpdateBackend:
+    """Applies DNS record changes. `update_records` returns one (change, ok, detail) per change."""
+
+    name = "base"
+
+    def update_records(self, changes):
+        raise NotImplementedError
+
+
+class LambdaDNSBackend(DNSUpdateBackend):
+    """One call per record through the existing per-domain update function."""
+
+    name = "lambda"
+
+    def __init__(self, update_one):
+        self._update_one = update_one
+
+    def update_records(self, changes):
+        results = []
+        for change in changes:
+            extra = {"client_ipv6": change.ipv6} if change.ipv6 else {}
+            results.append((change, self._update_one(change.ip, change.connectivity, domain_name=change.domain_name, **extra), ""))
+        return results
+
+
+class BatchDNSBackend(DNSUpdateBackend):
+    """Sends all changes for a hosted zone as one UPSERT change batch.
+
+    The endpoint receives {"zone_name", "hosted_zone_id", "change_batch"} and answers
+    with {"hosted_zone_id", "results": [{"name", "type", "status", "error"}]}; "type" may be
+    omitted when the endpoint answers per name. The zone id it
+    returns is cached so later batches skip the hosted-zone lookup.
+    """
+
+    name = "batch"
+
+    def __init__(self, url, zone_names=None, ttl=60, timeout=10):
+        self.url = url
+        self.zone_names = sorted((zone.strip().rstrip(".").lower() for zone in zone_names or [] if zone.strip()), key=len, reverse=True)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.zone_ids = {}
+
+    def zone_for(self, domain_name):
+        domain_name = domain_name.rstrip(".").lower()
+        for zone_name in self.zone_names:
+            if domain_name == zone_name or domain_name.endswith("." + zone_name):
+                return zone_name
+        return ".".join(domain_name.split(".")[-2:])
+
+    def _records(self, change):
+        return [(record_type, value) for record_type, value in (("A", change.ip), ("AAAA", change.ipv6)) if value]
+
+    def _change_batch(self, changes):
+        return {"Changes": [{"Action": "UPSERT", "ResourceRecordSet": {"Name": f"{change.domain_name.rstrip('.')}.", "Type": record_type, "TTL": self.ttl, "ResourceRecords": [{"Value": value}]}} for change in changes for record_type, value in self._records(change)]}
+
+    def _submit_zone(self, zone_name, changes):
+        payload = {"zone_name": zone_name, "hosted_zone_id": self.zone_ids.get(zone_name), "change_batch": self._change_batch(changes)}
+        try:
+            response = requests.post(self.url, json=payload, timeout=self.timeout)
+            if response.status_code >= 400:
+                return [(change, False, f"status={response.status_code}") for change in changes]
+            body = response.json()
+        except Exception as e:
+            return [(change, False, str(e)) for change in changes]
+        if body.get("hosted_zone_id"):
+            self.zone_ids[zone_name] = body["hosted_zone_id"]
+        statuses = {}
+        for result in body.get("results", []):
+            if isinstance(result, dict):
+                statuses[(str(result.get("name", "")).rstrip(".").lower(), result.get("type"))] = result
+        results = []
+        for change in changes:
+            name = change.domain_name.rstrip(".").lower()
+            record_results = [statuses.get((name, record_type)) or statuses.get((name, None)) for record_type, _ in self._records(change)]
+            if any(result is None for result in record_results):
+                results.append((change, False, "missing_result"))
+            else:
+                errors = [str(result.get("error", "")) for result in record_results if result.get("status") != "ok"]
+                results.append((change, not errors, ";".join(errors)))
+        return results
+
+    def update_records(self, changes):
+        by_zone = {}
+        for change in changes:
+            by_zone.setdefault(self.zone_for(change.domain_name), []).append(change)
+        results = []
+        for zone_name, zone_changes in by_zone.items():
+            results.extend(self._submit_zone(zone_name, zone_changes))
+        return results
+
+
+class DNSUpdateBatcher:
+    """Collects changes for `window_seconds` and applies them with one backend call.
+
+    A newer change for a domain that is still pending replaces the older one.
+    """
+
+    def __init__(self, backend, window_seconds, on_result, sleep=time.sleep):
+        self.backend = backend
+        self.window_seconds = window_seconds
+        self._sleep = sleep
+        self._on_result = on_result
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def submit(self, change):
+        with self._lock:
+            self._pending[change.domain_name] = change
+        self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    def flush(self):
+        with self._lock:
+            changes = list(self._pending.values())
+            self._pending = {}
+        if not changes:
+            return []
+        results = self.backend.update_records(changes)
+        for change, ok, detail in results:
+            self._on_result(change, ok, detail)
+        return results
+
+    def run(self):
+        while True:
+            self._wakeup.wait()
+            self._sleep(self.window_seconds)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from array import array
+from socket import inet_aton, inet_ntoa
+
+
+class DomainHistory:
+    """Per-domain ring buffers of (timestamp, reported IP, connectivity, decision).
+
+    Events live in flat typed arrays sized once from `memory_budget_bytes`, so the
+    history never grows past its budget; the least recently reported domain is
+    evicted when every slot is taken. A report that repeats the previous event is
+    only stored again after `heartbeat_seconds`, which keeps quiet domains cheap.
+    The receive thread and the DNS batch thread both record, so every access to the
+    arrays and the slot table holds `_lock`.
+    """
+
+    EVENT_BYTES = 8 + 4 + 1 + 1
+
+    def __init__(self, events_per_domain=256, memory_budget_bytes=4 * 1024 * 1024, heartbeat_seconds=3600):
+        self._capacity = max(2, events_per_domain)
+        self._max_domains = max(1, memory_budget_bytes // (self._capacity * self.EVENT_BYTES))
+        self._heartbeat_seconds = heartbeat_seconds
+        size = self._max_domains * self._capacity
+        self._times = array("d", bytes(8 * size))
+        self._ips = array("I", bytes(4 * size))
+        self._connectivity = bytearray(size)
+        self._decisions = bytearray(size)
+        self._heads = array("I", bytes(4 * self._max_domains))
+        self._counts = array("I", bytes(4 * self._max_domains))
+        self._last_recorded = array("d", bytes(8 * self._max_domains))
+        self._slots = {}
+        self._free_slots = list(range(self._max_domains - 1, -1, -1))
+        self._decision_names = []
+        self._decision_codes = {}
+        self._lock = threading.Lock()
+
+    def memory_bytes(self):
+        return self._max_domains * self._capacity * self.EVENT_BYTES
+
+    def _decision_code(self, decision):
+        code = self._decision_codes.get(decision)
+        if code is None:
+            if len(self._decision_names) >= 255:
+                return 255
+            code = len(self._decision_names)
+            self._decision_names.append(decision)
+            self._decision_codes[decision] = code
+        return code
+
+    def _slot_for(self, domain_name):
+        slot = self._slots.get(domain_name)
+        if slot is not None:
+            return slot
+        if not self._free_slots:
+            oldest_domain = min(self._slots, key=lambda name: self._last_recorded[self._slots[name]])
+            self._free_slots.append(self._slots.pop(oldest_domain))
+        slot = self._free_slots.pop()
+        self._heads[slot] = 0
+        self._counts[slot] = 0
+        self._slots[domain_name] = slot
+        return slot
+
+    def _indexes_newest_first(self, slot):
+        base = slot * self._capacity
+        head = self._heads[slot]
+        for offset in range(1, self._counts[slot] + 1):
+            yield base + (head - offset) % self._capacity
+
+    def record(self, domain_name, timestamp, ip, connectivity, decision):
+        try:
+            ip_value = int.from_bytes(inet_aton(ip), "big") if ip and ip.count(".") == 3 else 0
+        except OSError:
+            ip_value = 0
+        connectivity_value = 1 if connectivity == "1" else 0 if connectivity == "0" else 255
+        with self._lock:
+            decision_code = self._decision_code(decision)
+            slot = self._slot_for(domain_name)
+            if self._counts[slot]:
+                last = next(self._indexes_newest_first(slot))
+                repeated = self._ips[last] == ip_value and self._connectivity[last] == connectivity_value and self._decisions[last] == decision_code
+                if repeated and timestamp - self._times[last] < self._heartbeat_seconds:
+                    self._last_recorded[slot] = timestamp
+                    return False
+            index = slot * self._capacity + self._heads[slot]
+            self._times[index] = timestamp
+            self._ips[index] = ip_value
+            self._connectivity[index] = connectivity_value
+            self._decisions[index] = decision_code
+            self._heads[slot] = (self._heads[slot] + 1) % self._capacity
+            self._counts[slot] = min(self._counts[slot] + 1, self._capacity)
+            self._last_recorded[slot] = timestamp
+            return True
+
+    def _event(self, index):
+        decision_code = self._decisions[index]
+        connectivity_value = self._connectivity[index]
+        return {
+            "timestamp": self._times[index],
+            "ip": inet_ntoa(self._ips[index].to_bytes(4, "big")) if self._ips[index] else "-",
+            "connectivity": str(connectivity_value) if connectivity_value != 255 else "-",
+            "decision": self._decision_names[decision_code] if decision_code < len(self._decision_names) else "-",
+        }
+
+    def domains(self):
+        with self._lock:
+            return list(self._slots)
+
+    def last_events(self, domain_name, limit=10):
+        with self._lock:
+            slot = self._slots.get(domain_name)
+            if slot is None:
+                return []
+            events = []
+            for index in self._indexes_newest_first(slot):
+                if len(events) >= limit:
+                    break
+                events.append(self._event(index))
+            return events
+
+    def ip_changes(self, domain_name, since):
+        """Timestamps of reported IP changes at or after `since`, oldest first."""
+        with self._lock:
+            slot = self._slots.get(domain_name)
+            if slot is None:
+                return []
+            changes = []
+            newer_ip = None
+            newer_time = None
+            for index in self._indexes_newest_first(slot):
+                ip_value = self._ips[index]
+                if not ip_value:
+                    continue
+                if newer_ip is not None and ip_value != newer_ip and newer_time >= since:
+                    changes.append(newer_time)
+                if self._times[index] < since:
+                    break
+                newer_ip = ip_value
+                newer_time = self._times[index]
+        changes.reverse()
+        return changes
+
+    def change_rate(self, domain_name, window_seconds, now):
+        """IP changes per hour over the last `window_seconds`."""
+        return len(self.ip_changes(domain_name, now - window_seconds)) * 3600 / max(1, window_seconds)
+
+    def is_flapping(self, domain_name, window_seconds, now, min_changes=3):
+        """True when the IP changed `min_changes` times in the window or returned to an address it just left."""
+        with self._lock:
+            return self._is_flapping(domain_name, window_seconds, now, min_changes)
+
+    def _is_flapping(self, domain_name, window_seconds, now, min_changes):
+        slot = self._slots.get(domain_name)
+        if slot is None:
+            return False
+        sequence = []
+        for index in self._indexes_newest_first(slot):
+            if now - self._times[index] > window_seconds:
+                break
+            ip_value = self._ips[index]
+            if ip_value and (not sequence or sequence[-1] != ip_value):
+                sequence.append(ip_value)
+        if len(sequence) - 1 >= min_changes:
+            return True
+        return any(sequence[i] == sequence[i + 2] for i in range(len(sequence) - 2))
+
+    def flapping_domains(self, window_seconds, now, min_changes=3):
+        with self._lock:
+            return [domain_name for domain_name in self._slots if self._is_flapping(domain_name, window_seconds, now, min_changes)]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ipaddress
+from bisect import bisect_right
+
+from FastIPv4 import parse_ipv4
+
+
+def parse_exclusion_targets(text):
+    """Split a comma-separated list into (networks, domains); single IPs become /32 or /128 networks."""
+    networks = []
+    domains = []
+    for value in (text or "").split(","):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(value, strict=False))
+        except ValueError:
+            domains.append(value.lower())
+    return networks, domains
+
+
+class ExclusionIndex:
+    """Immutable lookup table of excluded IPv4/IPv6 ranges.
+
+    Networks are turned into integer intervals, merged and sorted per address
+    family, so `contains` is a single bisect regardless of how many entries the
+    exclusion list has.
+    """
+
+    def __init__(self, networks=()):
+        intervals = {4: [], 6: []}
+        for network in networks:
+            intervals[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        self._starts = {}
+        self._ends = {}
+        for version, ranges in intervals.items():
+            merged = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __len__(self):
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def contains(self, ip_text):
+        if not isinstance(ip_text, str):
+            return False
+        ip_text = ip_text.strip()
+        value, version = parse_ipv4(ip_text), 4
+        if value is None:
+            try:
+                value, version = int(ipaddress.IPv6Address(ip_text)), 6
+            except ValueError:
+                return False
+        index = bisect_right(self._starts[version], value) - 1
+        return index >= 0 and value <= self._ends[version][index]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+
+
+class FleetHealth:
+    """Per-client reachability samples kept in fixed-size ring buffers.
+
+    Every client owns one slot of `samples_per_client` entries inside flat typed
+    arrays, so memory stays constant no matter how long the server runs. A client
+    is a reporting host; the reports it packs into one datagram arrive within
+    `coalesce_seconds` with the same state and are stored as one sample.
+    """
+
+    def __init__(self, window_seconds=300, active_seconds=900, samples_per_client=32, max_clients=1024, coalesce_seconds=1.0):
+        self.window_seconds = window_seconds
+        self.active_seconds = active_seconds
+        self.coalesce_seconds = coalesce_seconds
+        self._capacity = max(2, samples_per_client)
+        self._max_clients = max(1, max_clients)
+        self._slots = {}
+        self._free_slots = list(range(self._max_clients - 1, -1, -1))
+        self._times = array("d", bytes(8 * self._max_clients * self._capacity))
+        self._states = bytearray(self._max_clients * self._capacity)
+        self._heads = array("I", bytes(4 * self._max_clients))
+        self._counts = array("I", bytes(4 * self._max_clients))
+        self._last_seen = array("d", bytes(8 * self._max_clients))
+
+    def _slot_for(self, client, now):
+        slot = self._slots.get(client)
+        if slot is not None:
+            return slot
+        if not self._free_slots:
+            self.prune(now)
+        if not self._free_slots:
+            return None
+        slot = self._free_slots.pop()
+        self._heads[slot] = 0
+        self._counts[slot] = 0
+        self._slots[client] = slot
+        return slot
+
+    def record(self, client, reachable, now):
+        slot = self._slot_for(client, now)
+        if slot is None:
+            return False
+        state = 1 if reachable else 0
+        if self._counts[slot]:
+            newest = slot * self._capacity + (self._heads[slot] - 1) % self._capacity
+            if self._states[newest] == state and 0 <= now - self._times[newest] < self.coalesce_seconds:
+                self._last_seen[slot] = now
+                return True
+        index = slot * self._capacity + self._heads[slot]
+        self._times[index] = now
+        self._states[index] = state
+        self._heads[slot] = (self._heads[slot] + 1) % self._capacity
+        self._counts[slot] = min(self._counts[slot] + 1, self._capacity)
+        self._last_seen[slot] = now
+        return True
+
+    def _samples_newest_first(self, slot):
+        base = slot * self._capacity
+        head = self._heads[slot]
+        for offset in range(1, self._counts[slot] + 1):
+            index = base + (head - offset) % self._capacity
+            yield self._times[index], self._states[index]
+
+    def is_disconnected(self, client, now):
+        """True when the client's latest samples are an unbroken run of 0 spanning the window."""
+        slot = self._slots.get(client)
+        if slot is None:
+            return False
+        run_start = None
+        for sample_time, state in self._samples_newest_first(slot):
+            if state:
+                break
+            run_start = sample_time
+        return run_start is not None and now - run_start >= self.window_seconds
+
+    def reachability(self, client, now):
+        slot = self._slots.get(client)
+        if slot is None:
+            return None
+        total = 0
+        reachable = 0
+        for sample_time, state in self._samples_newest_first(slot):
+            if now - sample_time > self.window_seconds:
+                break
+            total += 1
+            reachable += state
+        return reachable / total if total else None
+
+    def prune(self, now):
+        for client, slot in list(self._slots.items()):
+            if now - self._last_seen[slot] > self.active_seconds:
+                del self._slots[client]
+                self._free_slots.append(slot)
+
+    def quorum(self, now):
+        """Return (disconnected, active) client counts for the fleet."""
+        self.prune(now)
+        disconnected = sum(1 for client in self._slots if self.is_disconnected(client, now))
+        return disconnected, len(self._slots)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Replay a day of fleet behaviour against the real client and server decision code.
+
+Clients and the server share a VirtualClock, and every network call goes through a
+small override: pings, report datagrams, DNS lookups, lambda calls and IP
+replacement. A 24 hour scenario therefore runs in seconds and is fully determined
+by its seed.
+
+    python FleetSimulation.py --clients 20 --hours 24 --loss 0.02 --lambda-failure 0.1 --block-at 6,18
+"""
+
+import argparse
+import heapq
+import ipaddress
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+CLIENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Client")
+if CLIENT_DIR not in sys.path:
+    # Appended, so modules that exist in both directories still come from Server/.
+    sys.path.append(CLIENT_DIR)
+
+from Clock import VirtualClock
+from UDPClient import UDPClient
+from UDPServer import UDPServer
+
+SERVER_NAME = "server.sim"
+
+
+class SimulatedServer(UDPServer):
+    def __init__(self, fleet, clock, log_file):
+        self.fleet = fleet
+        super().__init__(port=0, log_file=log_file, clock=clock)
+        self.server_socket.close()
+        self.excluded_domains = []
+
+    def _write_log_line(self, formatted_msg):
+        self.fleet.server_log_lines += 1
+
+    def _domains_point_to_ips(self, pairs, record_type="A"):
+        results = {}
+        for domain_name, target_ip in pairs:
+            dns_ip = self.fleet.dns.get(domain_name, "")
+            results[(domain_name, target_ip)] = (dns_ip == target_ip, dns_ip, "match" if dns_ip == target_ip else "mismatch")
+        return results
+
+    def update_client_ip_via_lambda(self, client_ip, connectivity, domain_name=None, client_ipv6=None):
+        return self.fleet.lambda_update(domain_name, client_ip)
+
+    def replace_instance_ip(self):
+        self.fleet.replace_server_ip()
+
+
+class SimulatedClient(UDPClient):
+    def __init__(self, fleet, domain_name, clock, log_file):
+        self.fleet = fleet
+        super().__init__(domain_name, SERVER_NAME, log_file=log_file, clock=clock)
+        self._random = random.Random(fleet.rng.random())
+
+    def _select_update_ip(self):
+        self._last_ip_source = "sim"
+        return self.fleet.client_ips[self._my_domain]
+
+    def _probe_server(self, server):
+        return self.fleet.probe()
+
+    def _send_report_datagrams(self, udp_client, datagrams):
+        for datagram in datagrams:
+            self.fleet.deliver(self._my_domain, datagram)
+        return [SERVER_NAME]
+
+    def _collect_report_hints(self, udp_client, expected_replies):
+        reply = self.fleet.replies.pop(self._my_domain, None)
+        return self._parse_report_hint(reply) if reply else None
+
+
+class FleetSimulation:
+    def __init__(self, clients=10, hours=24, seed=1, loss=0.0, lambda_failure=0.0, ip_changes_per_day=1.0, block_at_hours=()):
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock(1_700_000_000)
+        self.start_time = self.clock.time()
+        self.end_time = self.start_time + hours * 3600
+        self.loss = loss
+        self.lambda_failure = lambda_failure
+        self.ip_changes_per_day = ip_changes_per_day
+        self.block_at_hours = sorted(block_at_hours)
+        self.dns = {}
+        self.replies = {}
+        self.reports_per_second = {}
+        self.client_ips = {}
+        self.blocked_since = None
+        self.server_log_lines = 0
+        self.counters = {"reports_sent": 0, "reports_lost": 0, "pings": 0, "pings_lost": 0, "ip_changes": 0, "lambda_calls": 0, "lambda_failures": 0, "dns_updates": 0, "replacements": 0}
+        self.pending_changes = {}
+        self.update_latencies = []
+        self.block_latencies = []
+        self._next_address = int(ipaddress.IPv4Address("45.0.0.1"))
+        self._events = []
+        self._sequence = 0
+        self._log_dir = tempfile.mkdtemp(prefix="fleet_sim_")
+        self.server = SimulatedServer(self, self.clock, os.path.join(self._log_dir, "server.log"))
+        self.clients = []
+        for index in range(clients):
+            domain_name = f"c{index}.sim"
+            self.client_ips[domain_name] = self.dns[domain_name] = self._new_address()
+            self.clients.append(SimulatedClient(self, domain_name, self.clock, os.path.join(self._log_dir, f"{domain_name}.log")))
+
+    def _new_address(self):
+        address = str(ipaddress.IPv4Address(self._next_address))
+        self._next_address += 1
+        return address
+
+    def _schedule(self, when, action, *args):
+        if when <= self.end_time:
+            heapq.heappush(self._events, (when, self._sequence, action, args))
+            self._sequence += 1
+
+    def probe(self):
+        self.counters["pings"] += 1
+        if self.blocked_since is not None:
+            return None
+        if self.rng.random() < self.loss:
+            self.counters["pings_lost"] += 1
+            return None
+        return "203.0.113.10"
+
+    def deliver(self, domain_name, datagram):
+        self.counters["reports_sent"] += 1
+        second = int(self.clock.time())
+        self.reports_per_second[second] = self.reports_per_second.get(second, 0) + 1
+        if self.rng.random() < self.loss:
+            self.counters["reports_lost"] += 1
+            return
+        hint_seconds = self.server._handle_datagram(datagram, self.client_ips[domain_name], 40000)
+        self.server._run_pending_remediation()
+        if hint_seconds and self.rng.random() >= self.loss:
+            self.replies[domain_name] = f"next,{hint_seconds}".encode("utf-8")
+
+    def lambda_update(self, domain_name, client_ip):
+        self.counters["lambda_calls"] += 1
+        if self.rng.random() < self.lambda_failure:
+            self.counters["lambda_failures"] += 1
+            return False
+        if self.dns.get(domain_name) != client_ip:
+            self.counters["dns_updates"] += 1
+        self.dns[domain_name] = client_ip
+        changed_at = self.pending_changes.get(domain_name)
+        if changed_at is not None and self.client_ips[domain_name] == client_ip:
+            self.update_latencies.append(self.clock.time() - changed_at)
+            del self.pending_changes[domain_name]
+        return True
+
+    def replace_server_ip(self):
+        self.counters["replacements"] += 1
+        if self.blocked_since is not None:
+            self.block_latencies.append(self.clock.time() - self.blocked_since)
+            self.blocked_since = None
+
+    def _change_client_ip(self, client):
+        domain_name = client._my_domain
+        self.client_ips[domain_name] = self._new_address()
+        self.counters["ip_changes"] += 1
+        self.pending_changes.setdefault(domain_name, self.clock.time())
+        self._schedule_ip_change(client)
+
+    def _schedule_ip_change(self, client):
+        if self.ip_changes_per_day > 0:
+            self._schedule(self.clock.time() + self.rng.expovariate(self.ip_changes_per_day / 86400), self._change_client_ip, client)
+
+    def _block_server(self):
+        if self.blocked_since is None:
+            self.blocked_since = self.clock.time()
+
+    def _ping(self, client):
+        client._ping_once()
+        self._schedule(self.clock.time() + client._ping_interval_seconds, self._ping, client)
+
+    def _update(self, client):
+        client._update_once(None)
+        self._schedule(self.clock.time() + client._next_update_delay(), self._update, client)
+
+    def run(self):
+        for client in self.clients:
+            self._schedule(self.start_time + self.rng.uniform(0, client._ping_interval_seconds), self._ping, client)
+            self._schedule(self.start_time + self.rng.uniform(0, client._update_interval_seconds), self._update, client)
+            self._schedule_ip_change(client)
+        for hour in self.block_at_hours:
+            self._schedule(self.start_time + hour * 3600, self._block_server)
+        while self._events:
+            when, _, action, args = heapq.heappop(self._events)
+            self.clock.set(when)
+            action(*args)
+        return self.report()
+
+    def report(self):
+        def summary(values):
+            if not values:
+                return {"count": 0}
+            ordered = sorted(values)
+            return {"count": len(ordered), "mean_seconds": round(sum(ordered) / len(ordered), 1), "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1), "max_seconds": round(ordered[-1], 1)}
+
+        result = dict(self.counters)
+        result["simulated_hours"] = round((self.end_time - self.start_time) / 3600, 2)
+        result["ip_change_detection"] = summary(self.update_latencies)
+        result["ip_changes_undetected"] = len(self.pending_changes)
+        result["block_detection"] = summary(self.block_latencies)
+        result["blocked_at_end"] = self.blocked_since is not None
+        result["peak_reports_per_second"] = max(self.reports_per_second.values(), default=0)
+        result["server_log_lines"] = self.server_log_lines
+        return result
+
+    def close(self):
+        shutil.rmtree(self._log_dir, ignore_errors=True)
+
+
+def run_simulation(**kwargs):
+    simulation = FleetSimulation(**kwargs)
+    try:
+        return simulation.run()
+    finally:
+        simulation.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate client/server behaviour on a virtual clock.")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--loss", type=float, default=0.0, help="probability that a ping or report datagram is lost")
+    parser.add_argument("--lambda-failure", type=float, default=0.0, help="probability that a lambda update call fails")
+    parser.add_argument("--ip-changes-per-day", type=float, default=1.0, help="mean IP changes per client per day")
+    parser.add_argument("--block-at", default="", help="comma-separated hours at which the server stops answering pings until replaced")
+    args = parser.parse_args(argv)
+    block_at_hours = [float(value) for value in args.block_at.split(",") if value.strip()]
+    result = run_simulation(clients=args.clients, hours=args.hours, seed=args.seed, loss=args.loss, lambda_failure=args.lambda_failure, ip_changes_per_day=args.ip_changes_per_day, block_at_hours=block_at_hours)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import time
+import traceback
+from array import array
+from collections import Counter
+
+
+class _Span:
+    __slots__ = ("_recorder", "_stage", "_started")
+
+    def __init__(self, recorder, stage):
+        self._recorder = recorder
+        self._stage = stage
+
+    def __enter__(self):
+        self._started = self._recorder.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._recorder.record(self._stage, self._started, self._recorder.clock() - self._started)
+        return False
+
+
+class FlightRecorder:
+    """Fixed-size ring buffer of timed pipeline stages.
+
+    Each span is three slots in flat typed arrays (start, duration, stage id), so
+    recording never allocates and memory stays at `capacity` spans. Once full, the
+    oldest spans are overwritten. The receive, IP-monitor and remediation threads
+    all record, so writes and snapshots share one lock.
+    """
+
+    def __init__(self, capacity=4096, clock=time.perf_counter):
+        self.capacity = max(1, capacity)
+        self.clock = clock
+        self._starts = array("d", bytes(8 * self.capacity))
+        self._durations = array("d", bytes(8 * self.capacity))
+        self._stage_ids = array("H", bytes(2 * self.capacity))
+        self._stage_names = []
+        self._stage_index = {}
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _stage_id(self, stage):
+        # Called with self._lock held.
+        stage_id = self._stage_index.get(stage)
+        if stage_id is None:
+            stage_id = self._stage_index[stage] = len(self._stage_names)
+            self._stage_names.append(stage)
+        return stage_id
+
+    def span(self, stage):
+        return _Span(self, stage)
+
+    def record(self, stage, started, duration):
+        with self._lock:
+            head = self._head
+            self._starts[head] = started
+            self._durations[head] = duration
+            self._stage_ids[head] = self._stage_id(stage)
+            self._head = (head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+    def spans(self):
+        """Recorded (stage, start, duration) tuples, oldest first."""
+        with self._lock:
+            first = (self._head - self._count) % self.capacity
+            return [(self._stage_names[self._stage_ids[index]], self._starts[index], self._durations[index]) for index in ((first + offset) % self.capacity for offset in range(self._count))]
+
+    def summary(self):
+        durations = {}
+        for stage, _, duration in self.spans():
+            durations.setdefault(stage, []).append(duration)
+        result = {}
+        for stage, values in durations.items():
+            values.sort()
+            result[stage] = {"count": len(values), "mean_ms": round(sum(values) / len(values) * 1000, 3), "p50_ms": round(values[len(values) // 2] * 1000, 3), "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3), "max_ms": round(values[-1] * 1000, 3)}
+        return result
+
+    def format_summary(self):
+        return " ".join(f"{stage}:n={row['count']},p50={row['p50_ms']}ms,p95={row['p95_ms']}ms,max={row['max_ms']}ms" for stage, row in sorted(self.summary().items()))
+
+    def dump(self):
+        spans = self.spans()
+        origin = spans[0][1] if spans else 0.0
+        return [f"+{(started - origin) * 1000:.3f}ms {stage} {duration * 1000:.3f}ms" for stage, started, duration in spans]
+
+
+class SamplingProfiler:
+    """Samples every thread's current stack at a fixed interval while running.
+
+    Counts are kept per innermost `depth` frames, so a stall shows up as the stack
+    that keeps being sampled. It is meant to be switched on for a minute while a
+    problem is happening, not left running.
+    """
+
+    def __init__(self, interval_seconds=0.01, depth=6):
+        self.interval_seconds = interval_seconds
+        self.depth = depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return False
+        self.samples = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop.set()
+        self._thread.join()
+        return True
+
+    def sample_once(self):
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = traceback.extract_stack(frame, limit=self.depth)
+            self.samples[(names.get(ident, str(ident)), " <- ".join(f"{entry.name}:{entry.lineno}" for entry in reversed(stack)))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.sample_once()
+
+    def top(self, limit=10):
+        return [{"thread": thread_name, "stack": stack, "samples": count} for (thread_name, stack), count in self.samples.most_common(limit)]
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import mmap
+import re
+import sys
+from collections import Counter, deque
+
+SERVER_LINE = re.compile(rb"\[([^\]]*)\] \[client=([^\]]*)\] \[domain=([^@\]]*)@([^\]]*)\] -> \[server=([^\]]*)\] \[action=([^:\]]*):([^\]]*)\]\|\|")
+CLIENT_LINE = re.compile(rb"\[([^\]]*)\] \[client=([^(\]]*)\(source=([^\]]*)\)\] \[domain=([^@\]]*)@([^\]]*)\] \[connectivity=([a-z]+)[^\]]*\](?: \[ipv6=[^\]]*\])?\|\|")
+
+
+class DomainStats:
+    __slots__ = ("lines", "actions", "updates", "lambda_failures", "ip_changes", "last_ip", "first_seen", "last_seen", "timeline", "last_state")
+
+    def __init__(self, timeline_limit):
+        self.lines = 0
+        self.actions = Counter()
+        self.updates = 0
+        self.lambda_failures = 0
+        self.ip_changes = 0
+        self.last_ip = None
+        self.first_seen = None
+        self.last_seen = None
+        self.timeline = deque(maxlen=timeline_limit)
+        self.last_state = None
+
+    def observe(self, timestamp, ip):
+        self.lines += 1
+        if self.first_seen is None:
+            self.first_seen = timestamp
+        self.last_seen = timestamp
+        if ip and ip != "-":
+            if self.last_ip is not None and ip != self.last_ip:
+                self.ip_changes += 1
+            self.last_ip = ip
+
+    def to_dict(self):
+        attempts = self.updates + self.lambda_failures
+        return {
+            "lines": self.lines,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "updates": self.updates,
+            "lambda_failures": self.lambda_failures,
+            "lambda_failure_rate": round(self.lambda_failures / attempts, 4) if attempts else 0.0,
+            "ip_changes": self.ip_changes,
+            "last_ip": self.last_ip,
+            "actions": dict(self.actions),
+            "connectivity_timeline": list(self.timeline),
+        }
+
+
+class LogAnalyzer:
+    """Single-pass aggregation over udp_server.log / udp_client.log.
+
+    Files are memory-mapped and matched line by line in place, so memory use
+    depends on the number of domains and `timeline_limit`, not on file size.
+    """
+
+    def __init__(self, timeline_limit=50):
+        self.timeline_limit = timeline_limit
+        self.domains = {}
+        self.actions = Counter()
+        self.total_lines = 0
+        self.unparsed_lines = 0
+
+    def _stats(self, domain_name):
+        stats = self.domains.get(domain_name)
+        if stats is None:
+            stats = self.domains[domain_name] = DomainStats(self.timeline_limit)
+        return stats
+
+    def _handle_server_line(self, match):
+        timestamp, client_ip, domain_name, _domain_ip, _server, action, reason = (value.decode("utf-8", "replace") for value in match.groups())
+        stats = self._stats(domain_name)
+        # ip_changes/last_ip track the reported client address in every log format, never the DNS answer.
+        stats.observe(timestamp, client_ip)
+        key = f"{action}:{reason}"
+        stats.actions[key] += 1
+        self.actions[key] += 1
+        if action == "updated":
+            stats.updates += 1
+        elif reason == "lambda_call_failed":
+            stats.lambda_failures += 1
+
+    def _handle_json_line(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return False
+        if not isinstance(entry, dict) or "action" not in entry or "domain" not in entry:
+            return False
+        stats = self._stats(entry["domain"] or "-")
+        stats.observe(entry.get("ts"), entry.get("client"))
+        key = f"{entry['action']}:{entry.get('reason', '-')}"
+        stats.actions[key] += 1
+        self.actions[key] += 1
+        if entry["action"] == "updated":
+            stats.updates += 1
+        elif entry.get("reason") == "lambda_call_failed":
+            stats.lambda_failures += 1
+        return True
+
+    def _handle_client_line(self, match):
+        timestamp, client_ip, _source, domain_name, _domain_ip, state = (value.decode("utf-8", "replace") for value in match.groups())
+        stats = self._stats(domain_name)
+        stats.observe(timestamp, client_ip)
+        stats.actions[f"report:{state}"] += 1
+        self.actions[f"report:{state}"] += 1
+        if state != stats.last_state:
+            stats.timeline.append((timestamp, state))
+            stats.last_state = state
+
+    def feed(self, buffer, start=0, end=None):
+        end = len(buffer) if end is None else end
+        position = start
+        while position < end:
+            line_end = buffer.find(b"\n", position, end)
+            if line_end < 0:
+                line_end = end
+            if line_end > position:
+                self.total_lines += 1
+                if buffer[position:position + 1] == b"{":
+                    if not self._handle_json_line(buffer[position:line_end]):
+                        self.unparsed_lines += 1
+                    position = line_end + 1
+                    continue
+                match = SERVER_LINE.match(buffer, position, line_end)
+                if match:
+                    self._handle_server_line(match)
+                else:
+                    match = CLIENT_LINE.match(buffer, position, line_end)
+                    if match:
+                        self._handle_client_line(match)
+                    else:
+                        self.unparsed_lines += 1
+            position = line_end + 1
+
+    def analyze_file(self, path):
+        with open(path, "rb") as file_handle:
+            try:
+                mapped = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return
+            with mapped:
+                self.feed(mapped)
+
+    def report(self):
+        return {
+            "total_lines": self.total_lines,
+            "unparsed_lines": self.unparsed_lines,
+            "actions": dict(self.actions),
+            "domains": {domain_name: stats.to_dict() for domain_name, stats in sorted(self.domains.items())},
+        }
+
+
+def format_report(report):
+    lines = [f"lines={report['total_lines']} unparsed={report['unparsed_lines']}"]
+    for key, count in sorted(report["actions"].items(), key=lambda item: -item[1]):
+        lines.append(f"[action={key}] count={count}")
+    for domain_name, stats in report["domains"].items():
+        lines.append(f"[domain={domain_name}] lines={stats['lines']} updates={stats['updates']} lambda_failures={stats['lambda_failures']} lambda_failure_rate={stats['lambda_failure_rate']:.2%} ip_changes={stats['ip_changes']} last_ip={stats['last_ip']} span={stats['first_seen']}..{stats['last_seen']}")
+        for timestamp, state in stats["connectivity_timeline"]:
+            lines.append(f"  [{timestamp}] {state}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize udp_server.log / udp_client.log in one streaming pass.")
+    parser.add_argument("paths", nargs="+", help="log files to analyze")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--timeline-limit", type=int, default=50, help="connectivity transitions kept per domain")
+    args = parser.parse_args(argv)
+    analyzer = LogAnalyzer(timeline_limit=args.timeline_limit)
+    for path in args.paths:
+        analyzer.analyze_file(path)
+    report = analyzer.report()
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+
+def parse_peer_addresses(text, default_port):
+    """Parse "host[:port],..." into (host, port) pairs; IPv6 hosts use "[addr]:port"."""
+    peers = []
+    for value in (text or "").split(","):
+        value = value.strip()
+        if not value:
+            continue
+        host, port = value, default_port
+        if value.startswith("["):
+            host, _, rest = value[1:].partition("]")
+            if rest.startswith(":"):
+                port = int(rest[1:])
+        elif value.count(":") == 1:
+            host, port_text = value.split(":")
+            port = int(port_text)
+        peers.append((host, port))
+    return peers
+
+
+class PeerCoordinator:
+    """Per-domain update leases shared between servers that receive the same reports.
+
+    Servers announce themselves with heartbeats. Among the servers heard from within
+    `peer_timeout_seconds`, the lease for a domain goes to the highest rendezvous hash
+    of (server id, domain). Every server computes the same owner without extra
+    messages, and when the owner goes silent its domains move to the next server by
+    themselves. The owner announces every update it applies ("handled"), and the
+    other servers treat that change as done. A non-owner that keeps seeing a mismatch
+    for `handoff_grace_seconds` updates anyway, in case the owner never got the report.
+
+    Every message carries a wall-clock timestamp and an HMAC-SHA256 of its JSON
+    body keyed with the shared `secret`. Unsigned, forged and stale messages
+    (older than `max_message_age_seconds`) are ignored, so an outsider cannot
+    silence a domain or win leases with made-up server ids.
+    """
+
+    def __init__(self, server_id, secret, heartbeat_seconds=5, peer_timeout_seconds=15, handled_ttl_seconds=300, handoff_grace_seconds=30, max_message_age_seconds=60, clock=time.monotonic, wall_clock=time.time):
+        if not secret:
+            raise ValueError("peer coordination needs a shared secret")
+        self.server_id = server_id
+        self._key = secret.encode("utf-8")
+        self.max_message_age_seconds = max_message_age_seconds
+        self._wall_clock = wall_clock
+        self.heartbeat_seconds = heartbeat_seconds
+        self.peer_timeout_seconds = peer_timeout_seconds
+        self.handled_ttl_seconds = handled_ttl_seconds
+        self.handoff_grace_seconds = handoff_grace_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_heard = {}
+        self._handled = {}
+        self._deferred = {}
+
+    def live_members(self, now=None):
+        now = self._clock() if now is None else now
+        with self._lock:
+            peers = [peer_id for peer_id, heard in self._last_heard.items() if now - heard <= self.peer_timeout_seconds]
+        return sorted(set(peers) | {self.server_id})
+
+    def owner(self, domain_name, now=None):
+        return max(self.live_members(now), key=lambda member: hashlib.sha1(f"{member}|{domain_name.lower()}".encode("utf-8")).digest())
+
+    def should_update(self, domain_name, value, now=None):
+        """Return (proceed, reason) for a DNS change of `domain_name` to `value`."""
+        now = self._clock() if now is None else now
+        key = domain_name.lower()
+        with self._lock:
+            handled = self._handled.get(key)
+            if handled and handled[0] == value and handled[1] != self.server_id and now - handled[2] <= self.handled_ttl_seconds:
+                return False, f"handled_by_peer:{handled[1]}"
+        owner = self.owner(domain_name, now)
+        if owner == self.server_id:
+            return True, "lease_held"
+        with self._lock:
+            first_deferred = self._deferred.setdefault((key, value), now)
+            if now - first_deferred < self.handoff_grace_seconds:
+                return False, f"deferred_to_peer:{owner}"
+            del self._deferred[(key, value)]
+        return True, "lease_handoff_grace_expired"
+
+    def handled_message(self, domain_name, value, now=None):
+        """Record a change this server applied and return the datagram announcing it."""
+        now = self._clock() if now is None else now
+        key = domain_name.lower()
+        with self._lock:
+            self._handled[key] = (value, self.server_id, now)
+            self._deferred = {deferred: since for deferred, since in self._deferred.items() if deferred[0] != key}
+        return self._sign({"type": "handled", "id": self.server_id, "domain": key, "value": value})
+
+    def heartbeat_message(self):
+        return self._sign({"type": "heartbeat", "id": self.server_id})
+
+    def _mac(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).hexdigest().encode("ascii")
+
+    def _sign(self, body):
+        body["ts"] = round(self._wall_clock(), 3)
+        payload = json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return self._mac(payload) + b" " + payload
+
+    def _verify(self, data):
+        mac, _, payload = data.partition(b" ")
+        if not payload or not hmac.compare_digest(mac, self._mac(payload)):
+            return None
+        message = json.loads(payload.decode("utf-8"))
+        if abs(self._wall_clock() - float(message["ts"])) > self.max_message_age_seconds:
+            return None
+        return message
+
+    def handle_message(self, data, now=None):
+        """Apply a peer datagram; returns the sender id, or None when the datagram is not a peer message."""
+        now = self._clock() if now is None else now
+        try:
+            message = self._verify(data)
+            if message is None:
+                return None
+            peer_id = str(message["id"])
+            message_type = message["type"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+        if peer_id == self.server_id:
+            return None
+        with self._lock:
+            self._last_heard[peer_id] = now
+            if message_type == "handled" and message.get("domain"):
+                key = str(message["domain"]).lower()
+                self._handled[key] = (message.get("value"), peer_id, now)
+                self._deferred = {deferred: since for deferred, since in self._deferred.items() if deferred[0] != key}
+        return peer_id
+
+    def prune(self, now=None):
+        now = self._clock() if now is None else now
+        with self._lock:
+            self._handled = {key: handled for key, handled in self._handled.items() if now - handled[2] <= self.handled_ttl_seconds}
+            self._deferred = {deferred: since for deferred, since in self._deferred.items() if now - since <= self.handled_ttl_seconds}
+            self._last_heard = {peer_id: heard for peer_id, heard in self._last_heard.items() if now - heard <= self.handled_ttl_seconds}
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Re-send captured datagrams to a server, at recorded pace, N times faster or flat out.
+
+    # against a running server (started with IPV4_DOMAIN_UPDATE_LAMBDA=http://127.0.0.1:9400/)
+    python ReplayCapture.py capture.bin --target 127.0.0.1:7171 --speed 10 --stub-lambda 9400
+
+    # in this process: builds a UDPServer whose lambda is the stub and feeds it directly
+    python ReplayCapture.py capture.bin --in-process --speed 0
+
+`--speed 1` keeps the recorded gaps, `--speed N` divides them by N and `--speed 0`
+sends as fast as possible. The stub lambda answers every update with 200 and counts
+the calls, so a replay never touches real DNS records.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+from TrafficCapture import read_capture
+
+
+class StubLambdaHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0") or "0"))
+        self.server.calls += 1
+        body = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_lambda(port=0):
+    stub = HTTPServer(("127.0.0.1", port), StubLambdaHandler)
+    stub.calls = 0
+    threading.Thread(target=stub.serve_forever, name="StubLambda", daemon=True).start()
+    return stub
+
+
+def paced(records, speed):
+    """Yield (sender_ip, sender_port, payload), sleeping so gaps match the capture divided by `speed`."""
+    first_capture_time = None
+    started = time.monotonic()
+    for timestamp, sender_ip, sender_port, payload in records:
+        if speed > 0:
+            if first_capture_time is None:
+                first_capture_time = timestamp
+            delay = (timestamp - first_capture_time) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        yield sender_ip, sender_port, payload
+
+
+def replay_to_socket(records, target, speed):
+    sender = socket.socket(socket.AF_INET6 if ":" in target[0] else socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    try:
+        for _, _, payload in paced(records, speed):
+            sender.sendto(payload, target)
+            sent += 1
+    finally:
+        sender.close()
+    return sent
+
+
+def replay_in_process(records, speed, lambda_url):
+    # The replay server only handles datagrams: no bound socket, no background threads, no instance replacement.
+    with patch("UDPServer.LightSail"):
+        from UDPServer import UDPServer
+
+        log_dir = tempfile.mkdtemp(prefix="replay_")
+        server = UDPServer(port=0, log_file=os.path.join(log_dir, "replay.log"))
+    server.server_socket.close()
+    server.lambda_url = lambda_url
+    server.replace_instance_ip = lambda: None
+    handled = 0
+    try:
+        for sender_ip, sender_port, payload in paced(records, speed):
+            try:
+                server._handle_datagram(payload, sender_ip, sender_port)
+            except Exception as e:
+                server._log_with_cooldown("replay-error", f"[replay] datagram failed: {e}", 60)
+            handled += 1
+    finally:
+        for file_name in os.listdir(log_dir):
+            os.remove(os.path.join(log_dir, file_name))
+        os.rmdir(log_dir)
+    return handled, server._flight_recorder.summary()
+
+
+def load_records(paths):
+    records = []
+    for path in paths:
+        records.extend(read_capture(path))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a datagram capture against a UDP server.")
+    parser.add_argument("captures", nargs="+", help="capture files, e.g. capture.bin.2 capture.bin.1 capture.bin")
+    parser.add_argument("--target", default="127.0.0.1:7171", help="host:port of the server to send to")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = recorded pace, N = N times faster, 0 = as fast as possible")
+    parser.add_argument("--stub-lambda", type=int, default=None, metavar="PORT", help="serve a stub lambda on 127.0.0.1:PORT during the replay")
+    parser.add_argument("--in-process", action="store_true", help="feed a UDPServer in this process instead of sending over UDP")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.captures)
+    stub = start_stub_lambda(args.stub_lambda or 0) if args.stub_lambda is not None or args.in_process else None
+    started = time.monotonic()
+    try:
+        if args.in_process:
+            count, stages = replay_in_process(records, args.speed, f"http://127.0.0.1:{stub.server_port}/")
+        else:
+            host, _, port = args.target.rpartition(":")
+            count, stages = replay_to_socket(records, (host.strip("[]"), int(port)), args.speed), None
+        elapsed = time.monotonic() - started
+    finally:
+        if stub:
+            stub.shutdown()
+            stub.server_close()
+    result = {"datagrams": count, "elapsed_seconds": round(elapsed, 3), "datagrams_per_second": round(count / elapsed, 1) if elapsed > 0 else None}
+    if stub:
+        result["lambda_calls"] = stub.calls
+    if stages is not None:
+        result["stages"] = stages
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import threading
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+
+MAGIC = b"UDPCAP1\n"
+# Record header: receive time, sender port, sender address length (4 or 16), payload length.
+_RECORD = struct.Struct("!dHBH")
+
+
+def encode_record(timestamp, sender_ip, sender_port, payload):
+    # Link-local senders arrive as "fe80::1%eth0"; the scope is not part of the address.
+    sender_ip = sender_ip.partition("%")[0]
+    address = inet_pton(AF_INET6 if ":" in sender_ip else AF_INET, sender_ip)
+    return _RECORD.pack(timestamp, sender_port, len(address), len(payload)) + address + payload
+
+
+class CaptureWriter:
+    """Appends received datagrams to a length-prefixed binary file.
+
+    When the next record would push the file past `max_bytes`, it is renamed to
+    `<path>.1` (older files shift to `.2` ... `.<backups>`, the oldest is dropped)
+    and a new file is started.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=3):
+        self.path = path
+        self.max_bytes = max(len(MAGIC) + _RECORD.size + 1024, max_bytes)
+        self.backups = max(0, backups)
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(MAGIC)
+            self._size = len(MAGIC)
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write(self, timestamp, sender_ip, sender_port, payload):
+        record = encode_record(timestamp, sender_ip, sender_port, payload)
+        with self._lock:
+            if self._file is None:
+                return
+            if self._size + len(record) > self.max_bytes:
+                self._rotate()
+            self._file.write(record)
+            self._size += len(record)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(path):
+    """Yield (timestamp, sender_ip, sender_port, payload) from a capture file; a truncated last record is ignored."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            timestamp, sender_port, address_length, payload_length = _RECORD.unpack(header)
+            body = f.read(address_length + payload_length)
+            if len(body) < address_length + payload_length:
+                return
+            sender_ip = inet_ntop(AF_INET6 if address_length == 16 else AF_INET, body[:address_length])
+            yield timestamp, sender_ip, sender_port, body[address_length:]
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ipaddress
+from socket import AF_INET, AF_INET6, IPPROTO_IPV6, IPV6_V6ONLY, SOCK_DGRAM, socket
+
+
+def _parse_listen_address(value, default_port):
+    host, port = value, default_port
+    if value.startswith("["):
+        host, _, rest = value[1:].partition("]")
+        if rest.startswith(":"):
+            port = int(rest[1:])
+    elif value.count(":") == 1:
+        host, port_text = value.split(":")
+        port = int(port_text)
+    if not 0 <= port <= 65535:
+        raise ValueError(f"port {port} out of range")
+    family = AF_INET
+    if host:
+        try:
+            family = AF_INET6 if ipaddress.ip_address(host).version == 6 else AF_INET
+        except ValueError:
+            raise ValueError(f"{host!r} is not an IP address (host names are not resolved)") from None
+    return family, host, port
+
+
+def parse_listen_addresses(text, default_port):
+    """Parse "host[:port],..." into (family, host, port); IPv6 hosts use "[addr]:port", an empty host means any IPv4 address.
+
+    Raises ValueError naming the offending entry.
+    """
+    listeners = []
+    for value in (text or "").split(","):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            listeners.append(_parse_listen_address(value, default_port))
+        except ValueError as e:
+            raise ValueError(f"invalid LISTEN_ADDRESSES entry {value!r}: {e}") from None
+    return listeners
+
+
+class Listener:
+    """One bound UDP socket and its counters; every listener feeds the same server pipeline."""
+
+    __slots__ = ("family", "host", "port", "socket", "bound", "datagrams", "bytes", "hints", "errors")
+
+    def __init__(self, family, host, port):
+        self.family = family
+        self.host = host
+        self.port = port
+        self.socket = socket(family, SOCK_DGRAM)
+        if family == AF_INET6:
+            # "[::]" and "0.0.0.0" on the same port are separate listeners, so IPv6 sockets never take IPv4 traffic.
+            self.socket.setsockopt(IPPROTO_IPV6, IPV6_V6ONLY, 1)
+        self.bound = False
+        self.datagrams = 0
+        self.bytes = 0
+        self.hints = 0
+        self.errors = 0
+
+    @property
+    def label(self):
+        host = self.host or ("::" if self.family == AF_INET6 else "0.0.0.0")
+        return f"[{host}]:{self.port}" if self.family == AF_INET6 else f"{host}:{self.port}"
+
+    def bind(self):
+        self.socket.bind((self.host, self.port))
+        self.port = self.socket.getsockname()[1]
+        self.bound = True
+
+    def close(self):
+        self.bound = False
+        self.socket.close()
+
+    def snapshot(self):
+        return {"address": self.label, "bound": self.bound, "datagrams": self.datagrams, "bytes": self.bytes, "hints": self.hints, "errors": self.errors}
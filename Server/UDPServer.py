@@ -1,30 +1,91 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
+import hmac
+import json
 import os
+import selectors
+import signal
 import threading
 import time
 import ipaddress
+from array import array
+from collections import deque
 from datetime import datetime
-from socket import AF_INET, AF_INET6, SOCK_DGRAM, getaddrinfo, gethostbyname, socket
+from socket import AF_INET, AF_INET6, IPPROTO_IPV6, IPV6_V6ONLY, SOCK_DGRAM, getaddrinfo, gethostbyname, gethostname, socket
 
 import pytz
 import requests
 
+from AddressWatcher import AddressWatcher
+from Clock import SystemClock
+from DNSQueryClient import DNSQueryClient
+from DNSUpdateBackend import BatchDNSBackend, DNSChange, DNSUpdateBatcher, LambdaDNSBackend
+from DomainHistory import DomainHistory
+from FastIPv4 import normalize_global_ipv4, normalize_ipv4
+from ExclusionIndex import ExclusionIndex, parse_exclusion_targets
+from FleetHealth import FleetHealth
+from FlightRecorder import FlightRecorder, SamplingProfiler
 from LightSailManager import LightSail
+from PeerCoordinator import PeerCoordinator, parse_peer_addresses
+from ServiceScoreboard import ServiceScoreboard
+from TrafficCapture import CaptureWriter
+from UDPListeners import Listener, parse_listen_addresses
+
+DECISION_FIELDS = ("client", "domain", "domain_ip", "server", "server_ip", "action", "reason")
+
+
+def _int_at_least(minimum):
+    def parse(text):
+        value = int(text)
+        if value < minimum:
+            raise ValueError(f"must be >= {minimum}")
+        return value
+    return parse
+
+
+def _fraction(text):
+    value = float(text)
+    if not 0.0 <= value <= 1.0:
+        raise ValueError("must be between 0 and 1")
+    return value
+
+
+def _url_list(text):
+    urls = [value.strip() for value in text.split(",") if value.strip()]
+    if not urls or any(not url.startswith(("http://", "https://")) for url in urls):
+        raise ValueError("expected a comma-separated list of http(s) URLs")
+    return urls
+
+
+def _non_empty(text):
+    if not text.strip():
+        raise ValueError("must not be empty")
+    return text.strip()
 
 
 class UDPServer:
-    def __init__(self, port=7171, log_file=None):
+    def __init__(self, port=7171, log_file=None, clock=None):
+        self._clock = clock or SystemClock()
+        self._startup_started = self._clock.monotonic()
+        self._startup_phases = []
         self.port = port
-        self.server_socket = socket(AF_INET, SOCK_DGRAM)
+        # LISTEN_ADDRESSES opens more entry points, e.g. "0.0.0.0:7171,[::]:7171,0.0.0.0:443"; the default is IPv4 on `port`.
+        self._listen_addresses = parse_listen_addresses(os.environ.get("LISTEN_ADDRESSES", ""), port) or [(AF_INET, "", port)]
+        self._listeners = [Listener(*address) for address in self._listen_addresses]
+        self.server_socket = self._listeners[0].socket
+        self._server_socket_bound = False
         if not log_file:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             log_file = os.path.join(script_dir, "udp_server.log")
         self.log_file = log_file
+        self._log_json = (os.environ.get("LOG_FORMAT", "text") or "text").strip().lower() == "json"
         self._max_log_size_bytes = 20 * 1024 * 1024
         self._log_cooldown = {}
         self._log_state = {}
+        # Dictionary to track the last logged state for invalid-format fallback logs.
+        self.last_logged_states = {}
         self._receive_log_interval_seconds = max(1, int(os.environ.get("RECEIVE_LOG_INTERVAL_SECONDS", "5")))
         ip_monitor_interval_minutes = os.environ.get("IP_MONITOR_INTERVAL_MINUTES")
         if ip_monitor_interval_minutes is not None:
@@ -35,24 +96,154 @@ class UDPServer:
         else:
             ip_monitor_interval_seconds = int(os.environ.get("IP_MONITOR_INTERVAL_SECONDS", "60"))
         self._ip_monitor_interval_seconds = max(60, ip_monitor_interval_seconds)
+        # With a netlink address watcher running the HTTP checks only confirm events and catch NAT changes.
+        self._address_watch_enabled = (os.environ.get("ADDRESS_WATCH_ENABLED", "1") or "1").strip().lower() in {"1", "true", "yes"}
+        # Netlink never sees a public-IP change behind 1:1 NAT (LightSail), so the HTTP check keeps its normal pace unless raised explicitly.
+        self._ip_monitor_fallback_seconds = max(self._ip_monitor_interval_seconds, int(os.environ.get("IP_MONITOR_FALLBACK_SECONDS", str(self._ip_monitor_interval_seconds))))
+        self._address_event_settle_seconds = max(0, int(os.environ.get("ADDRESS_EVENT_SETTLE_SECONDS", "2")))
+        self._address_changed = threading.Event()
+        self._address_watcher = None
         self.timezone = pytz.timezone("Asia/Shanghai")
         self.lambda_url = os.environ.get("IPV4_DOMAIN_UPDATE_LAMBDA", "")
         if not self.lambda_url:
             self.log("IPV4_DOMAIN_UPDATE_LAMBDA not set.")
         self.running = True
         self._ipv4_services = ["https://checkip.amazonaws.com", "https://api.ipify.org", "https://ifconfig.me/ip", "https://ipinfo.io/ip"]
+        self._ipv6_enabled = (os.environ.get("IPV6_ENABLED", "0") or "0").strip().lower() in {"1", "true", "yes"}
         self._ipv6_services = ["https://api6.ipify.org", "https://ifconfig.co/ip", "https://ipv6.icanhazip.com", "https://ip6.seeip.org"]
-        self.log(f"Initial IPv4={self.get_ipv4()}, Initial IPv6={self.get_ipv6()}")
+        self._service_scoreboard = ServiceScoreboard(clock=self._clock.monotonic, failure_threshold=int(os.environ.get("IP_SERVICE_FAILURE_THRESHOLD", "3")), cooldown_seconds=max(0, int(os.environ.get("IP_SERVICE_COOLDOWN_SECONDS", "300"))))
+        self._service_score_log_interval_seconds = max(60, int(os.environ.get("IP_SERVICE_SCORE_LOG_INTERVAL_SECONDS", "3600")))
         self.__light_sail = LightSail()
-        self.excluded_domains = ["la.qinyupeng.com", "timov4.qyp.life"]
+        self._lightsail_region = (os.environ.get("LIGHTSAIL_REGION", "ap-northeast-1") or "ap-northeast-1").strip()
+        self._lightsail_instance_name = (os.environ.get("LIGHTSAIL_INSTANCE_NAME", "Debian-1") or "Debian-1").strip()
+        # Per-sender token bucket on incoming datagrams; 0 disables the limit.
+        self._rate_limit_per_minute = max(0, int(os.environ.get("RATE_LIMIT_REPORTS_PER_MINUTE", "0")))
+        self._sender_buckets = {}
+        self._rate_limit_hinted = {}
+        # Replies "next,<seconds>" to each report so clients spread over the interval and back off under load.
+        self._report_hints_enabled = (os.environ.get("REPORT_HINTS_ENABLED", "1") or "1").strip().lower() in {"1", "true", "yes"}
+        self._report_interval_seconds = max(30, int(os.environ.get("REPORT_INTERVAL_SECONDS", "60")))
+        self._max_report_interval_seconds = max(self._report_interval_seconds, int(os.environ.get("MAX_REPORT_INTERVAL_SECONDS", "600")))
+        self._report_capacity_per_second = max(1.0, float(os.environ.get("REPORT_CAPACITY_PER_SECOND", "50")))
+        self._arrival_counts = array("I", bytes(4 * 60))
+        self._arrival_seconds = array("q", bytes(8 * 60))
+        # EXCLUDED_TARGETS accepts domains, single IPs and CIDR ranges; domains are re-resolved in the background.
+        self._excluded_networks, self.excluded_domains = parse_exclusion_targets(os.environ.get("EXCLUDED_TARGETS", "la.qinyupeng.com,timov4.qyp.life"))
+        self._excluded_refresh_seconds = max(30, int(os.environ.get("EXCLUDED_REFRESH_SECONDS", "300")))
         self.excluded_ips_cache = {"ips": set(), "last_updated": 0}
+        self._exclusion_refresh_wakeup = threading.Event()
+        self._exclusion_index = ExclusionIndex(self._excluded_networks)
         self._server_domain_name = (os.environ.get("SERVER_DOMAIN_NAME", "") or "").strip()
         self._server_ip_snapshot = "-"
+        self._remediation_cooldown_seconds = max(0, int(os.environ.get("REMEDIATION_COOLDOWN_SECONDS", "1800")))
+        self._remediation_lock = threading.Lock()
+        self._remediation_wakeup = threading.Event()
+        self._remediation_pending = []
+        self._remediation_in_flight = False
+        self._remediation_merged = 0
+        self._remediation_last_finished = 0
+        self._replace_quorum_fraction = min(1.0, max(0.0, float(os.environ.get("REPLACE_QUORUM_FRACTION", "0.5"))))
+        self._replace_quorum_min_clients = max(1, int(os.environ.get("REPLACE_QUORUM_MIN_CLIENTS", "1")))
+        self._fleet_health = FleetHealth(window_seconds=max(1, int(os.environ.get("DISCONNECT_WINDOW_SECONDS", "300"))))
+        self._domain_history = DomainHistory(events_per_domain=max(2, int(os.environ.get("HISTORY_EVENTS_PER_DOMAIN", "256"))), memory_budget_bytes=max(1024, int(os.environ.get("HISTORY_MEMORY_BUDGET_BYTES", str(4 * 1024 * 1024)))))
+        self._dns_query_client = None
+        if (os.environ.get("DNS_CHECK_MODE", "system") or "system").strip().lower() == "authoritative":
+            nameservers = [value.strip() for value in (os.environ.get("AUTHORITATIVE_NAMESERVERS", "") or "").split(",") if value.strip()]
+            self._dns_query_client = DNSQueryClient(nameservers=nameservers, timeout=max(0.2, float(os.environ.get("AUTHORITATIVE_DNS_TIMEOUT_SECONDS", "2"))))
+        self._dns_record_ttl = {}
+        self._dns_prefetched = {}
+        # After a successful update, repeat reports for the same domain and IP are not re-sent while resolvers may still
+        # serve the old record: for the record's TTL when it is known, PROPAGATION_WINDOW_SECONDS otherwise.
+        self._propagation_window_seconds = max(0, int(os.environ.get("PROPAGATION_WINDOW_SECONDS", "60")))
+        self._max_propagation_window_seconds = max(1, int(os.environ.get("MAX_PROPAGATION_WINDOW_SECONDS", "600")))
+        self._propagating = {}
+        # The update lambda historically only handled A records; AAAA changes are sent only when it is declared to support them.
+        self._lambda_supports_ipv6 = (os.environ.get("LAMBDA_SUPPORTS_IPV6", "0") or "0").strip().lower() in {"1", "true", "yes"}
+        # Updates go through a DNSUpdateBackend; the lambda backend looks the method up per call so subclasses and tests can replace it.
+        self._dns_backend = LambdaDNSBackend(lambda *args, **kwargs: self.update_client_ip_via_lambda(*args, **kwargs))
+        self._dns_batcher = None
+        if (os.environ.get("DNS_UPDATE_BACKEND", "lambda") or "lambda").strip().lower() == "batch":
+            # The per-domain lambda does not understand change batches, so batching needs its own endpoint.
+            batch_url = (os.environ.get("DNS_BATCH_UPDATE_URL", "") or "").strip()
+            if batch_url:
+                zone_names = [value for value in (os.environ.get("DNS_ZONE_NAMES", "") or "").split(",") if value.strip()]
+                backend = BatchDNSBackend(batch_url, zone_names=zone_names, ttl=max(1, int(os.environ.get("DNS_RECORD_TTL", "60"))))
+                self._dns_batcher = DNSUpdateBatcher(backend, max(0.0, float(os.environ.get("DNS_BATCH_WINDOW_SECONDS", "2"))), self._on_dns_batch_result, sleep=self._clock.sleep)
+            else:
+                self.log("DNS_UPDATE_BACKEND=batch ignored: DNS_BATCH_UPDATE_URL is not set, updating records one by one through the lambda.")
+        # PEER_SERVERS lists the other servers receiving the same reports; only one of them updates a given domain.
+        self._peer_port = int(os.environ.get("PEER_PORT", "7172"))
+        self._peer_addresses = parse_peer_addresses(os.environ.get("PEER_SERVERS", ""), self._peer_port)
+        self._peer_sockets = {}
+        self._peer_targets = []
+        self._peer_sources = frozenset()
+        self._peer_resolved_at = None
+        self._peer_resolve_seconds = 300
+        self._peer_coordinator = None
+        peer_secret = (os.environ.get("PEER_SECRET", "") or "").strip()
+        if self._peer_addresses and not peer_secret:
+            self.log("PEER_SERVERS ignored: PEER_SECRET is not set, updating every domain locally.")
+        elif self._peer_addresses:
+            server_id = (os.environ.get("SERVER_ID", "") or "").strip() or self._server_domain_name or gethostname()
+            heartbeat_seconds = max(1, int(os.environ.get("PEER_HEARTBEAT_SECONDS", "5")))
+            self._peer_coordinator = PeerCoordinator(server_id, peer_secret, heartbeat_seconds=heartbeat_seconds, peer_timeout_seconds=max(heartbeat_seconds * 2, int(os.environ.get("PEER_TIMEOUT_SECONDS", "15"))), handoff_grace_seconds=max(0, int(os.environ.get("PEER_HANDOFF_GRACE_SECONDS", "30"))), clock=self._clock.monotonic, wall_clock=self._clock.time)
+        # Span timings of the receive and IP monitor stages; SIGUSR1 dumps them, SIGUSR2 toggles the sampling profiler.
+        self._flight_recorder = FlightRecorder(capacity=max(16, int(os.environ.get("FLIGHT_RECORDER_SPANS", "4096"))))
+        self._profiler = SamplingProfiler(interval_seconds=max(0.001, float(os.environ.get("PROFILER_INTERVAL_SECONDS", "0.01"))))
+        # CAPTURE_FILE records every received datagram for ReplayCapture.py; off unless set.
+        self._capture_max_bytes = max(1024 * 1024, int(os.environ.get("CAPTURE_MAX_BYTES", str(64 * 1024 * 1024))))
+        self._capture_backups = max(0, int(os.environ.get("CAPTURE_BACKUPS", "3")))
+        self._capture = None
+        # "capture start <name>" may only write inside this directory; CAPTURE_FILE comes from the operator and is used as given.
+        self._capture_dir = os.path.realpath((os.environ.get("CAPTURE_DIR", "") or "").strip() or os.path.join(os.path.dirname(os.path.abspath(self.log_file)), "captures"))
+        capture_file = (os.environ.get("CAPTURE_FILE", "") or "").strip()
+        if capture_file:
+            self._capture = CaptureWriter(capture_file, self._capture_max_bytes, self._capture_backups)
+        self._admin_port = int(os.environ.get("ADMIN_PORT", "0") or "0")
+        # With ADMIN_TOKEN set every admin datagram starts with the token; without it, commands that change state are refused.
+        self._admin_token = (os.environ.get("ADMIN_TOKEN", "") or "").strip()
+        self._admin_privileged_commands = {"set", "capture"}
+        # Settings that the admin "set" command may change at runtime: name -> (attribute, parser).
+        self._config_fields = {
+            "ip_monitor_interval_seconds": ("_ip_monitor_interval_seconds", _int_at_least(60)),
+            "ip_monitor_fallback_seconds": ("_ip_monitor_fallback_seconds", _int_at_least(60)),
+            "receive_log_interval_seconds": ("_receive_log_interval_seconds", _int_at_least(1)),
+            "excluded_refresh_seconds": ("_excluded_refresh_seconds", _int_at_least(30)),
+            "excluded_targets": (None, parse_exclusion_targets),
+            "ipv4_services": ("_ipv4_services", _url_list),
+            "ipv6_services": ("_ipv6_services", _url_list),
+            "remediation_cooldown_seconds": ("_remediation_cooldown_seconds", _int_at_least(0)),
+            "replace_quorum_fraction": ("_replace_quorum_fraction", _fraction),
+            "replace_quorum_min_clients": ("_replace_quorum_min_clients", _int_at_least(1)),
+            "rate_limit_per_minute": ("_rate_limit_per_minute", _int_at_least(0)),
+            "propagation_window_seconds": ("_propagation_window_seconds", _int_at_least(0)),
+            "lightsail_region": ("_lightsail_region", _non_empty),
+            "lightsail_instance_name": ("_lightsail_instance_name", _non_empty),
+        }
+        self._config_lock = threading.Lock()
+        self._config_audit = deque(maxlen=100)
+        self._admin_commands = {"history": self._admin_history, "rate": self._admin_rate, "flapping": self._admin_flapping, "services": self._admin_services, "peers": self._admin_peers, "trace": self._admin_trace, "profile": self._admin_profile, "config": self._admin_config, "set": self._admin_set, "capture": self._admin_capture, "listeners": self._admin_listeners}
+        self._mark_startup_phase("init")
+
+    def _mark_startup_phase(self, name):
+        self._startup_phases.append((name, (self._clock.monotonic() - self._startup_started) * 1000))
+
+    def _format_startup_phases(self):
+        return " ".join(f"{name}={elapsed_ms:.0f}ms" for name, elapsed_ms in self._startup_phases)
 
     def log(self, msg):
-        ts = datetime.now(self.timezone).strftime("%Y-%m-%d %H:%M:%S")
-        formatted_msg = f"[{ts}] {msg}"
+        ts = datetime.fromtimestamp(self._clock.time(), self.timezone).strftime("%Y-%m-%d %H:%M:%S")
+        self._write_log_line(json.dumps({"ts": ts, "msg": msg}) if self._log_json else f"[{ts}] {msg}")
 
+    def _log_decision_record(self, record):
+        if not self._log_json:
+            self.log(self._format_decision_record(record))
+            return
+        entry = {"ts": datetime.fromtimestamp(self._clock.time(), self.timezone).strftime("%Y-%m-%d %H:%M:%S")}
+        entry.update(zip(DECISION_FIELDS, record))
+        self._write_log_line(json.dumps(entry))
+
+    def _write_log_line(self, formatted_msg):
         # Print log message to console
         print(formatted_msg)
 
@@ -64,7 +255,7 @@ class UDPServer:
             os.remove(self.log_file)
 
     def _log_with_cooldown(self, key, msg, cooldown_seconds):
-        now = time.time()
+        now = self._clock.time()
         last_time = self._log_cooldown.get(key, 0)
         if now - last_time >= cooldown_seconds:
             self.log(msg)
@@ -75,32 +266,35 @@ class UDPServer:
             self.log(msg)
             self._log_state[key] = msg
 
-    def _log_periodic_state(self, key, msg, interval_seconds):
-        now = time.time()
-        if self._log_state.get(key) != msg:
-            self.log(msg)
-            self._log_state[key] = msg
-            self._log_cooldown[key] = now
-            return
-        if now - self._log_cooldown.get(key, 0) >= interval_seconds:
-            self.log(msg)
+    def _log_periodic_state(self, key, state, interval_seconds, write=None):
+        # `state` is only rendered by `write` when a line is actually emitted, so callers can pass cheap tuples.
+        now = self._clock.time()
+        if self._log_state.get(key) != state or now - self._log_cooldown.get(key, 0) >= interval_seconds:
+            (write or self.log)(state)
+            self._log_state[key] = state
             self._log_cooldown[key] = now
 
     def _normalize_global_ipv4(self, ip_value):
+        return normalize_global_ipv4(ip_value)
+
+    def _normalize_global_ipv6(self, ip_value):
         try:
-            normalized_ip = str(ipaddress.IPv4Address(ip_value.strip()))
-            if ipaddress.IPv4Address(normalized_ip).is_global:
-                return normalized_ip
+            address = ipaddress.IPv6Address(ip_value.strip())
+            if address.is_global:
+                return str(address)
         except Exception:
             pass
         return None
 
-    def _normalize_ipv4(self, ip_value):
+    def _normalize_ipv6(self, ip_value):
         try:
-            return str(ipaddress.IPv4Address(ip_value.strip()))
+            return str(ipaddress.IPv6Address(ip_value.strip().split("%")[0]))
         except Exception:
             return None
 
+    def _normalize_ipv4(self, ip_value):
+        return normalize_ipv4(ip_value)
+
     def _resolve_domain_ipv4(self, domain_name):
         if not domain_name:
             return "", "domain_not_set"
@@ -114,25 +308,158 @@ class UDPServer:
         except Exception:
             return "", "dns_resolve_failed"
 
-    def _domain_points_to_ip(self, domain_name, target_ip):
-        normalized_target = self._normalize_ipv4(target_ip)
-        if not normalized_target:
-            return False, "", "target_ip_invalid"
-        dns_ip, dns_status = self._resolve_domain_ipv4(domain_name)
-        if dns_status != "ok":
-            return False, dns_ip, dns_status
-        return dns_ip == normalized_target, dns_ip, "match" if dns_ip == normalized_target else "mismatch"
+    def _resolve_domain_ipv6(self, domain_name):
+        if not domain_name:
+            return "", "domain_not_set"
+        try:
+            infos = getaddrinfo(domain_name, None, AF_INET6)
+            for info in infos:
+                resolved_ip = self._normalize_ipv6(info[4][0])
+                if resolved_ip:
+                    return resolved_ip, "ok"
+            return "", "no_ipv6_record"
+        except Exception:
+            return "", "dns_resolve_failed"
+
+    def _domain_points_to_ip(self, domain_name, target_ip, record_type="A"):
+        return self._domains_point_to_ips([(domain_name, target_ip)], record_type)[(domain_name, target_ip)]
+
+    def _domains_point_to_ips(self, pairs, record_type="A"):
+        # With DNS_CHECK_MODE=authoritative every query goes to the zone's nameservers in one pipelined batch;
+        # the system resolver is only used when the authoritative lookup gives no usable answer.
+        normalize = self._normalize_ipv4 if record_type == "A" else self._normalize_ipv6
+        resolve = self._resolve_domain_ipv4 if record_type == "A" else self._resolve_domain_ipv6
+        answers = {}
+        if self._dns_query_client:
+            questions = [(domain_name, record_type) for domain_name, _ in pairs if domain_name]
+            now = self._clock.time()
+            for question in questions:
+                prefetched = self._dns_prefetched.get(question)
+                if prefetched and prefetched[1] > now:
+                    answers[question] = prefetched[0]
+            try:
+                answers.update(self._dns_query_client.resolve_many([question for question in questions if question not in answers]))
+            except Exception as e:
+                self._log_with_cooldown("authoritative-dns-failed", f"[dns] authoritative lookup failed: {e}", 600)
+        results = {}
+        for domain_name, target_ip in pairs:
+            normalized_target = normalize(target_ip)
+            if not normalized_target:
+                results[(domain_name, target_ip)] = (False, "", "target_ip_invalid")
+                continue
+            addresses, ttl, status = answers.get((domain_name, record_type), ([], 0, "not_queried"))
+            if status == "ok":
+                self._dns_record_ttl[domain_name] = ttl
+                dns_match = normalized_target in [normalize(address) for address in addresses]
+                results[(domain_name, target_ip)] = (dns_match, normalized_target if dns_match else addresses[0], "match" if dns_match else "mismatch")
+                continue
+            if status in ("nxdomain", "no_record"):
+                results[(domain_name, target_ip)] = (False, "", "no_ipv4_record" if record_type == "A" else "no_ipv6_record")
+                continue
+            dns_ip, dns_status = resolve(domain_name)
+            if dns_status != "ok":
+                results[(domain_name, target_ip)] = (False, dns_ip, dns_status)
+            else:
+                results[(domain_name, target_ip)] = (dns_ip == normalized_target, dns_ip, "match" if dns_ip == normalized_target else "mismatch")
+        return results
+
+    def _prefetch_dns(self, reports):
+        # Resolve every record a packed datagram will check in one pipelined round trip; the answers are reused for one second.
+        if not self._dns_query_client:
+            return
+        questions = []
+        for msg in reports:
+            if len(msg) >= 4 and msg[0]:
+                protocol = msg[1].lower()
+                if protocol == "v4":
+                    questions.append((msg[0], "A"))
+                if protocol == "v6" or (protocol == "v4" and len(msg) >= 5 and msg[4]):
+                    questions.append((msg[0], "AAAA"))
+        try:
+            answers = self._dns_query_client.resolve_many(questions)
+        except Exception as e:
+            self._log_with_cooldown("authoritative-dns-failed", f"[dns] authoritative lookup failed: {e}", 600)
+            return
+        expires = self._clock.time() + 1
+        self._dns_prefetched = {question: (answer, expires) for question, answer in answers.items()}
 
     def _select_update_ipv4(self, reported_ip):
         return self._normalize_global_ipv4(reported_ip)
 
-    def _format_client_server_update_log(self, _client_ip, client_location_ip, domain_name, domain_ip, action, reason):
+    def _decide_update(self, domain_name, update_ip, update_ipv6, connectivity):
+        """Check the A and/or AAAA record and send at most one combined update; returns (domain_ip, dns_status, action, reason)."""
+        if update_ipv6 and not (self._dns_batcher or self._lambda_supports_ipv6):
+            # Posting AAAA to a lambda that ignores it would never converge and re-post on every report.
+            self._log_with_cooldown("ipv6-update-unsupported", "[ipv6] AAAA updates skipped: set LAMBDA_SUPPORTS_IPV6=1 once the update lambda handles client_ipv6, or use DNS_UPDATE_BACKEND=batch.", 3600)
+            update_ipv6 = None
+            if not update_ip:
+                return "-", "-", "not_updated", "ipv6_update_unsupported"
+        needs_update = False
+        dns_ips = []
+        dns_statuses = []
+        with self._flight_recorder.span("dns"):
+            for record_type, target_ip in (("A", update_ip), ("AAAA", update_ipv6)):
+                if not target_ip:
+                    continue
+                dns_match, dns_ip, dns_status = self._domain_points_to_ip(domain_name, target_ip, record_type)
+                needs_update = needs_update or not dns_match
+                dns_ips.append(dns_ip)
+                dns_statuses.append(dns_status)
+        domain_ip = dns_ips[0] if len(dns_ips) == 1 else ",".join(dns_ip or "-" for dns_ip in dns_ips)
+        dns_status = ",".join(dns_statuses)
+        if not needs_update:
+            self._propagating.pop(domain_name, None)
+            return domain_ip, dns_status, "not_updated", "dns_already_matches"
+        if self._update_propagating(domain_name, update_ip, update_ipv6):
+            return domain_ip, dns_status, "not_updated", "update_propagating"
+        # The server's own domain is only ever reported here, so it needs no lease.
+        if self._peer_coordinator and domain_name != self._server_domain_name:
+            proceed, lease_reason = self._peer_coordinator.should_update(domain_name, self._lease_value(update_ip, update_ipv6))
+            if not proceed:
+                return domain_ip, dns_status, "not_updated", lease_reason
+        if self._dns_batcher:
+            self._dns_batcher.submit(DNSChange(domain_name, update_ip, connectivity, update_ipv6))
+            return domain_ip, dns_status, "queued", "dns_not_match_update_queued"
+        with self._flight_recorder.span("lambda"):
+            _, updated, _ = self._dns_backend.update_records([DNSChange(domain_name, update_ip, connectivity, update_ipv6)])[0]
+        if updated:
+            self._start_propagation_window(domain_name, update_ip, update_ipv6)
+            self._announce_handled(domain_name, update_ip, update_ipv6)
+            return domain_ip, dns_status, "updated", "dns_not_match_update_sent"
+        return domain_ip, dns_status, "not_updated", "lambda_call_failed"
+
+    def _start_propagation_window(self, domain_name, update_ip, update_ipv6):
+        if self._propagation_window_seconds <= 0:
+            return
+        window_seconds = min(self._max_propagation_window_seconds, self._dns_record_ttl.get(domain_name) or self._propagation_window_seconds)
+        self._propagating[domain_name] = (self._lease_value(update_ip, update_ipv6), self._clock.monotonic() + window_seconds)
+
+    def _update_propagating(self, domain_name, update_ip, update_ipv6):
+        """True while an update to the same address(es) is still within its propagation window."""
+        entry = self._propagating.get(domain_name)
+        if entry is None:
+            return False
+        value, expires = entry
+        if self._clock.monotonic() >= expires:
+            self._propagating.pop(domain_name, None)
+            return False
+        return value == self._lease_value(update_ip, update_ipv6)
+
+    def _decision_record(self, client_location_ip, domain_name, domain_ip, action, reason):
+        return (client_location_ip, domain_name, domain_ip, self._server_domain_name, self._server_ip_snapshot, action, reason)
+
+    def _format_decision_record(self, record):
+        client_location_ip, domain_name, domain_ip, server_domain_name, server_ip, action, reason = record
         normalized_location_ip = self._normalize_ipv4(client_location_ip) or client_location_ip
         merged_domain = f"{domain_name if domain_name else '-'}@{domain_ip if domain_ip else '-'}"
-        merged_server = f"{self._server_domain_name if self._server_domain_name else '-'}@{self._server_ip_snapshot if self._server_ip_snapshot else '-'}"
+        merged_server = f"{server_domain_name if server_domain_name else '-'}@{server_ip if server_ip else '-'}"
         merged_action = f"{action}:{reason}"
         return f"[client={normalized_location_ip if normalized_location_ip else '-'}] [domain={merged_domain}] -> [server={merged_server}] [action={merged_action}]||"
 
+    def _log_decision(self, key, client_location_ip, domain_name, domain_ip, action, reason):
+        record = self._decision_record(client_location_ip, domain_name, domain_ip, action, reason)
+        self._log_periodic_state(key, record, self._receive_log_interval_seconds, self._log_decision_record)
+
     def _request_ip(self, url):
         try:
             r = requests.get(url, timeout=5)
@@ -146,12 +473,16 @@ class UDPServer:
 
     def _get_public_ip(self, services, label):
         errors = []
-        for url in services:
+        for url in self._service_scoreboard.order(services):
+            started = self._clock.monotonic()
             ip, error = self._request_ip(url)
             if ip:
+                self._service_scoreboard.record_success(url, self._clock.monotonic() - started)
+                self._log_with_cooldown(f"{label}-service-scores", f"[IP lookup] {label} service scores: {self._service_scoreboard.format(services)}", self._service_score_log_interval_seconds)
                 if errors:
                     self._log_on_change(f"{label}-lookup-state", f"[IP lookup] {label} recovered via {url}")
                 return ip
+            self._service_scoreboard.record_failure(url)
             if error:
                 errors.append(f"{url}:{error}")
         if errors:
@@ -195,34 +526,134 @@ class UDPServer:
     def replace_instance_ip(self):
         self.log("Ping failed. Replacing instance IP...")
         try:
-            self.__light_sail.replace_ip("ap-northeast-1", "Debian-1")
+            # Region and instance name change together through "set"; read them as one pair.
+            with self._config_lock:
+                region, instance_name = self._lightsail_region, self._lightsail_instance_name
+            self.__light_sail.replace_ip(region, instance_name)
         except Exception as e:
             self.log(f"Error replacing instance IP: {e}")
 
+    def request_instance_ip_replacement(self, reason):
+        # Single flight: triggers arriving while a replacement is pending or running join it instead of queueing another one.
+        with self._remediation_lock:
+            if self._remediation_pending or self._remediation_in_flight:
+                self._remediation_merged += 1
+                return False
+            remaining = self._remediation_cooldown_seconds - (self._clock.time() - self._remediation_last_finished)
+            if self._remediation_last_finished and remaining > 0:
+                self._log_with_cooldown("remediation-cooldown", f"[remediation] skip trigger={reason}, cooldown {int(remaining)}s left", 60)
+                return False
+            self._remediation_pending.append(reason)
+        self._remediation_wakeup.set()
+        return True
+
+    def _run_pending_remediation(self):
+        with self._remediation_lock:
+            if not self._remediation_pending:
+                return False
+            reasons = self._remediation_pending
+            self._remediation_pending = []
+            self._remediation_in_flight = True
+            self._remediation_merged = 0
+        started = self._clock.time()
+        try:
+            self.log(f"[remediation] replacement started, trigger={','.join(reasons)}")
+            self.replace_instance_ip()
+        finally:
+            with self._remediation_lock:
+                self._remediation_in_flight = False
+                self._remediation_last_finished = self._clock.time()
+                merged = self._remediation_merged
+            self.log(f"[remediation] replacement finished in {self._clock.time() - started:.1f}s, merged_triggers={merged}, cooldown={self._remediation_cooldown_seconds}s")
+            # The new public IP is invisible to the address watcher; check it now so the server's own record follows at once.
+            self._address_changed.set()
+        return True
+
+    def remediation_loop(self):
+        while True:
+            self._remediation_wakeup.wait()
+            self._remediation_wakeup.clear()
+            try:
+                self._run_pending_remediation()
+            except Exception as e:
+                self.log(f"[remediation] worker error: {e}")
+
+    def start_remediation_thread(self):
+        t = threading.Thread(target=self.remediation_loop, name="RemediationThread")
+        t.daemon = True
+        t.start()
+        self.log("Remediation thread started.")
+        return t
+
+    def _check_fleet_quorum(self, client, domain_name=None):
+        now = self._clock.time()
+        if not self._fleet_health.is_disconnected(client, now):
+            return False
+        label = f"{client}({domain_name})" if domain_name and domain_name != client else client
+        disconnected, active = self._fleet_health.quorum(now)
+        if active >= self._replace_quorum_min_clients and disconnected >= self._replace_quorum_fraction * active:
+            return self.request_instance_ip_replacement(f"quorum:{disconnected}/{active}:{label}")
+        self._log_with_cooldown(f"fleet-quorum-not-met:{client}", f"[fleet-health] {label} disconnected, quorum not met ({disconnected}/{active} < {self._replace_quorum_fraction:.0%})", 600)
+        return False
+
     def _get_excluded_ips(self):
-        now = time.time()
-        # Update cache every 5 minutes (300 seconds)
-        if now - self.excluded_ips_cache["last_updated"] > 300:
-            previous_ips = set(self.excluded_ips_cache["ips"])
+        now = self._clock.time()
+        # Update cache every EXCLUDED_REFRESH_SECONDS (default 5 minutes)
+        if now - self.excluded_ips_cache["last_updated"] > self._excluded_refresh_seconds:
+            domains = self.excluded_domains
             current_ips = set()
-            for domain in self.excluded_domains:
+            for domain in domains:
                 try:
                     ip = gethostbyname(domain)
                     current_ips.add(ip)
                 except Exception as e:
                     self._log_with_cooldown(f"excluded-resolve-{domain}", f"Error resolving excluded domain {domain}: {e}", 600)
-            self.excluded_ips_cache["ips"] = current_ips
-            self.excluded_ips_cache["last_updated"] = now
+            with self._config_lock:
+                # The admin "set" command may have replaced the domain list while we were resolving; the old answers are stale then.
+                if self.excluded_domains is not domains:
+                    return self.excluded_ips_cache["ips"]
+                previous_ips = self.excluded_ips_cache["ips"]
+                self.excluded_ips_cache = {"ips": current_ips, "last_updated": now}
+                if current_ips != previous_ips:
+                    self._exclusion_index = ExclusionIndex(self._excluded_networks + [ipaddress.ip_network(ip) for ip in current_ips])
             if current_ips != previous_ips:
                 self.log(f"Updated excluded IPs: {current_ips}")
         return self.excluded_ips_cache["ips"]
 
-    def update_client_ip_via_lambda(self, client_ip, connectivity, domain_name=None):
+    def _exclusion_reason(self, sender_ip, *reported_ips):
+        exclusion_index = self._exclusion_index
+        if exclusion_index.contains(sender_ip):
+            return "excluded_sender_ip"
+        if any(exclusion_index.contains(reported_ip) for reported_ip in reported_ips if reported_ip):
+            return "excluded_reported_ip"
+        return None
+
+    def exclusion_refresh_loop(self):
+        while True:
+            try:
+                self._get_excluded_ips()
+            except Exception as e:
+                self._log_with_cooldown("excluded-refresh-failed", f"[exclusion] refresh failed: {e}", 600)
+            if self._exclusion_refresh_wakeup.wait(self._excluded_refresh_seconds):
+                self._exclusion_refresh_wakeup.clear()
+
+    def start_exclusion_refresh_thread(self):
+        t = threading.Thread(target=self.exclusion_refresh_loop, name="ExclusionRefreshThread")
+        t.daemon = True
+        t.start()
+        return t
+
+    def update_client_ip_via_lambda(self, client_ip, connectivity, domain_name=None, client_ipv6=None):
         if not self.lambda_url:
             self._log_with_cooldown("lambda-url-missing", "Skip lambda update because IPV4_DOMAIN_UPDATE_LAMBDA is empty.", 600)
             return False
         try:
+            # A dual-stack update carries both addresses in one call; an IPv6-only update omits client_ip.
             payload = {"client_ip": client_ip, "connectivity": connectivity, "domain_name": domain_name}
+            if client_ipv6:
+                payload["client_ipv6"] = client_ipv6
+                if not client_ip:
+                    del payload["client_ip"]
             response = requests.post(self.lambda_url, json=payload, timeout=10)
             if response.status_code >= 400:
                 self.log(f"Lambda update failed: status={response.status_code}, body={response.text}")
@@ -240,90 +671,357 @@ class UDPServer:
             self.log(f"Error calling lambda: {e}")
             return False
 
+    def _on_dns_batch_result(self, change, ok, detail):
+        action, reason = ("updated", "dns_batch_update_applied") if ok else ("not_updated", "dns_batch_update_failed")
+        if ok:
+            self._start_propagation_window(change.domain_name, change.ip, change.ipv6)
+            self._announce_handled(change.domain_name, change.ip, change.ipv6)
+        if not ok:
+            self._log_with_cooldown(f"dns-batch-failed:{change.domain_name}", f"[dns-batch] {change.domain_name}@{change.ip or change.ipv6} failed: {detail}", 60)
+        reported_ip = change.ip or change.ipv6
+        self._log_decision(f"dns-update:{change.domain_name}", reported_ip, change.domain_name, reported_ip if ok else "-", action, reason)
+        self._domain_history.record(change.domain_name, self._clock.time(), change.ip, change.connectivity, f"{action}:{reason}")
+
+    def dns_batch_loop(self):
+        while True:
+            try:
+                self._dns_batcher.run()
+            except Exception as e:
+                self.log(f"[dns-batch] worker error: {e}")
+                self._clock.sleep(1)
+
+    def start_dns_batch_thread(self):
+        t = threading.Thread(target=self.dns_batch_loop, name="DNSBatchThread")
+        t.daemon = True
+        t.start()
+        self.log(f"DNS batch thread started (window={self._dns_batcher.window_seconds}s).")
+        return t
+
+    def _lease_value(self, update_ip, update_ipv6):
+        return f"{update_ip or '-'},{update_ipv6 or '-'}"
+
+    def _resolve_peers(self):
+        """Resolve PEER_SERVERS to (family, address) targets; peer datagrams are only accepted from these addresses."""
+        targets = []
+        for host, port in self._peer_addresses:
+            try:
+                infos = getaddrinfo(host, port, 0, SOCK_DGRAM)
+            except Exception as e:
+                self._log_with_cooldown(f"peer-resolve-failed:{host}", f"[peers] cannot resolve {host}: {e}", 300)
+                continue
+            for family, _, _, _, sockaddr in infos:
+                if family in (AF_INET, AF_INET6):
+                    targets.append((family, sockaddr[:2]))
+                    break
+        self._peer_targets = targets
+        self._peer_sources = frozenset(ipaddress.ip_address(address[0]) for _, address in targets)
+        self._peer_resolved_at = self._clock.monotonic()
+        return targets
+
+    def _is_peer_source(self, sender_ip):
+        try:
+            return ipaddress.ip_address(sender_ip.split("%")[0]) in self._peer_sources
+        except ValueError:
+            return False
+
+    def _send_to_peers(self, message):
+        for family, address in self._peer_targets:
+            peer_socket = self._peer_sockets.get(family)
+            if peer_socket is None:
+                self._log_with_cooldown(f"peer-no-socket:{family}", f"[peers] no {'IPv6' if family == AF_INET6 else 'IPv4'} peer socket for {address[0]}", 300)
+                continue
+            try:
+                peer_socket.sendto(message, address)
+            except Exception as e:
+                self._log_with_cooldown(f"peer-send-failed:{address[0]}", f"[peers] send to {address[0]}:{address[1]} failed: {e}", 300)
+
+    def _announce_handled(self, domain_name, update_ip, update_ipv6):
+        if self._peer_coordinator and domain_name != self._server_domain_name:
+            self._send_to_peers(self._peer_coordinator.handled_message(domain_name, self._lease_value(update_ip, update_ipv6)))
+
+    def _handle_peer_datagram(self, data, sender_ip):
+        """Apply a datagram from the peer port; returns the peer id, or None when it was dropped."""
+        if not self._is_peer_source(sender_ip):
+            self._log_with_cooldown(f"peer-unknown-source:{sender_ip}", f"[peers] dropped datagram from {sender_ip}: not in PEER_SERVERS", 300)
+            return None
+        peer_id = self._peer_coordinator.handle_message(data)
+        if peer_id is None:
+            self._log_with_cooldown(f"peer-bad-message:{sender_ip}", f"[peers] dropped message from {sender_ip}: bad signature, stale or malformed", 300)
+        return peer_id
+
+    def peer_receive_loop(self):
+        members = None
+        selector = selectors.DefaultSelector()
+        for peer_socket in self._peer_sockets.values():
+            selector.register(peer_socket, selectors.EVENT_READ)
+        while True:
+            try:
+                ready = [key.fileobj.recvfrom(1024) for key, _ in selector.select()]
+            except Exception as e:
+                self._log_with_cooldown("peer-receive-error", f"[peers] receive error: {e}", 60)
+                self._clock.sleep(1)
+                continue
+            for data, addr in ready:
+                if self._handle_peer_datagram(data, addr[0]) is None:
+                    continue
+                current_members = self._peer_coordinator.live_members()
+                if current_members != members:
+                    members = current_members
+                    self.log(f"[peers] live servers: {','.join(members)}")
+
+    def peer_heartbeat_loop(self):
+        while True:
+            if self._clock.monotonic() - self._peer_resolved_at >= self._peer_resolve_seconds:
+                self._resolve_peers()
+            self._send_to_peers(self._peer_coordinator.heartbeat_message())
+            self._peer_coordinator.prune()
+            self._clock.sleep(self._peer_coordinator.heartbeat_seconds)
+
+    def _open_peer_sockets(self):
+        # One socket per address family the peers resolve to; IPv4 is always opened so peers that resolve later can reach us.
+        families = {AF_INET} | {family for family, _ in self._peer_targets}
+        for family in sorted(families):
+            peer_socket = socket(family, SOCK_DGRAM)
+            try:
+                if family == AF_INET6:
+                    peer_socket.setsockopt(IPPROTO_IPV6, IPV6_V6ONLY, 1)
+                peer_socket.bind(("::" if family == AF_INET6 else "", self._peer_port))
+            except Exception as e:
+                peer_socket.close()
+                self.log(f"Failed to bind {'IPv6' if family == AF_INET6 else 'IPv4'} peer port {self._peer_port}: {e}")
+                continue
+            self._peer_sockets[family] = peer_socket
+        return self._peer_sockets
+
+    def start_peer_threads(self):
+        self._resolve_peers()
+        if not self._open_peer_sockets():
+            self.log("No peer socket could be bound; updating every domain locally.")
+            self._peer_coordinator = None
+            return None
+        for target, name in ((self.peer_receive_loop, "PeerReceiveThread"), (self.peer_heartbeat_loop, "PeerHeartbeatThread")):
+            t = threading.Thread(target=target, name=name)
+            t.daemon = True
+            t.start()
+        self.log(f"Peer coordination started as {self._peer_coordinator.server_id} on port {self._peer_port} with {len(self._peer_targets)}/{len(self._peer_addresses)} resolved peer(s).")
+        return self._peer_sockets
+
     def restart_udp_server(self):
         self.log("Restarting UDP server...")
         self.running = False
-        try:
-            self.server_socket.close()
-        except Exception as e:
-            self.log(f"Error closing socket: {e}")
-        time.sleep(2)
-        self.server_socket = socket(AF_INET, SOCK_DGRAM)
+        for listener in self._listeners:
+            try:
+                listener.close()
+            except Exception as e:
+                self.log(f"Error closing socket {listener.label}: {e}")
+        self._clock.sleep(2)
+        self._listeners = [Listener(*address) for address in self._listen_addresses]
+        self.server_socket = self._listeners[0].socket
+        self._server_socket_bound = False
         self.running = True
         self.start_receive_thread()
         self.log("UDP server restarted.")
 
-    def receive_loop(self):
-        # Dictionary to store the start time of continuous "0" connectivity per domain
-        self.connectivity_0_start_time = {}
-        # Dictionary to track the last logged state for non-v4 fallback logs.
-        self.last_logged_states = {}
+    def _handle_report(self, msg, sender_ip, sender_port):
+        if len(msg) < 4:
+            invalid_log_msg = f"Invalid message format from {sender_ip}:{sender_port}: {msg}"
+            log_key = f"{sender_ip}:invalid"
+            if log_key not in self.last_logged_states or self.last_logged_states[log_key] != invalid_log_msg:
+                self.log(invalid_log_msg)
+                self.last_logged_states[log_key] = invalid_log_msg
+            return
+
+        domain_name = msg[0]
+        protocol = msg[1].lower()  # e.g., "v4" or "v6"
+        reported_ip = msg[2]
+        connectivity = msg[3]
+
+        reported_ipv6 = msg[4] if protocol == "v4" and len(msg) >= 5 else ""
+        with self._flight_recorder.span("validate"):
+            excluded_reason = self._exclusion_reason(sender_ip, reported_ip, reported_ipv6)
+        if excluded_reason:
+            self._log_decision(f"dns-update:{domain_name}", reported_ip, domain_name, "-", "not_updated", excluded_reason)
+            return
+
+        match protocol:
+            case "v4" | "v6":
+                # "v4" may carry the IPv6 address as a fifth field, so dual-stack hosts need one report.
+                if protocol == "v4":
+                    update_ip = self._select_update_ipv4(reported_ip)
+                    update_ipv6 = self._normalize_global_ipv6(reported_ipv6) if reported_ipv6 else None
+                else:
+                    update_ip = None
+                    update_ipv6 = self._normalize_global_ipv6(reported_ip)
+                if not update_ip and not update_ipv6:
+                    dns_ip, action, reason = "-", "not_updated", "invalid_reported_non_global_ip"
+                else:
+                    dns_ip, _, action, reason = self._decide_update(domain_name, update_ip, update_ipv6, connectivity)
+                with self._flight_recorder.span("log"):
+                    self._log_decision(f"dns-update:{domain_name}", reported_ip, domain_name, dns_ip, action, reason)
+                self._domain_history.record(domain_name, self._clock.time(), update_ip, connectivity, f"{action}:{reason}")
+                if not update_ip and not update_ipv6:
+                    return
+
+                # Health is per reporting host: one client process reporting many domains must count once toward the quorum.
+                self._fleet_health.record(sender_ip, connectivity != "0", self._clock.time())
+                if connectivity == "0":
+                    self._check_fleet_quorum(sender_ip, domain_name)
+            case _:
+                self._log_decision(f"unknown-protocol:{sender_ip}:{domain_name}", reported_ip, domain_name, "-", "not_updated", "unknown_protocol")
 
+    def _allow_sender(self, sender_ip):
+        limit = self._rate_limit_per_minute
+        if not limit:
+            return True
+        now = self._clock.monotonic()
+        tokens, last = self._sender_buckets.get(sender_ip, (limit, now))
+        tokens = min(limit, tokens + (now - last) * limit / 60.0)
+        if len(self._sender_buckets) > 10000:
+            # Senders whose bucket has refilled carry no state worth keeping.
+            self._sender_buckets = {ip: bucket for ip, bucket in self._sender_buckets.items() if now - bucket[1] < 60}
+        if tokens < 1:
+            self._sender_buckets[sender_ip] = (tokens, now)
+            return False
+        self._sender_buckets[sender_ip] = (tokens - 1, now)
+        return True
+
+    def _rate_limit_hint(self, sender_ip):
+        # One "wait the maximum" reply per sender per minute: a spoofed flood must not be reflected back at full rate.
+        if not self._report_hints_enabled:
+            return None
+        now = self._clock.monotonic()
+        last = self._rate_limit_hinted.get(sender_ip)
+        if last is not None and now - last < 60:
+            return None
+        if len(self._rate_limit_hinted) > 10000:
+            self._rate_limit_hinted = {ip: hinted for ip, hinted in self._rate_limit_hinted.items() if now - hinted < 60}
+        self._rate_limit_hinted[sender_ip] = now
+        return self._max_report_interval_seconds
+
+    def _record_arrival(self):
+        second = int(self._clock.monotonic())
+        slot = second % len(self._arrival_counts)
+        if self._arrival_seconds[slot] != second:
+            self._arrival_seconds[slot] = second
+            self._arrival_counts[slot] = 0
+        self._arrival_counts[slot] += 1
+
+    def _report_load_per_second(self):
+        now = int(self._clock.monotonic())
+        window = len(self._arrival_counts)
+        return sum(count for count, second in zip(self._arrival_counts, self._arrival_seconds) if now - second < window) / window
+
+    def _next_report_hint(self, key):
+        """Seconds until `key` should report again.
+
+        Each key gets a fixed phase inside the interval (from a hash, so every server
+        agrees), and the hint points at the next occurrence of that phase at least half
+        an interval away. Reports therefore spread evenly over the interval. When the
+        arrival rate exceeds REPORT_CAPACITY_PER_SECOND the interval is stretched in
+        proportion, up to MAX_REPORT_INTERVAL_SECONDS.
+        """
+        load = self._report_load_per_second()
+        interval = self._report_interval_seconds
+        if load > self._report_capacity_per_second:
+            interval = min(self._max_report_interval_seconds, int(interval * load / self._report_capacity_per_second))
+        phase = int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:4], "big") % interval
+        now = int(self._clock.time())
+        next_time = now - now % interval + phase
+        while next_time - now < interval / 2:
+            next_time += interval
+        return next_time - now
+
+    def _handle_datagram(self, data, sender_ip, sender_port):
+        """Process one datagram; returns the "next report" hint in seconds, or None when hints are off."""
+        self._record_arrival()
+        if not self._allow_sender(sender_ip):
+            self._log_with_cooldown(f"rate-limited:{sender_ip}", f"[rate-limit] dropping datagrams from {sender_ip}, limit={self._rate_limit_per_minute}/min", 60)
+            return self._rate_limit_hint(sender_ip)
+        with self._flight_recorder.span("datagram"):
+            # A multi-domain client packs several reports into one datagram, separated by ";".
+            with self._flight_recorder.span("decode"):
+                reports = [report.split(",") for report in data.decode("utf-8").strip().split(";") if report.strip()]
+            if len(reports) > 1:
+                with self._flight_recorder.span("dns_prefetch"):
+                    self._prefetch_dns(reports)
+            for msg in reports or [[]]:
+                self._handle_report(msg, sender_ip, sender_port)
+        if not self._report_hints_enabled or not reports or len(reports[0]) < 4:
+            return None
+        return self._next_report_hint(reports[0][0])
+
+    def _send_report_hint(self, seconds, sender_ip, sender_port, listener=None):
+        # The reply leaves through the socket the report came in on, so it passes the same NAT/firewall path back.
+        listener = listener or self._listeners[0]
         try:
-            self.server_socket.bind(("", self.port))
-            self.log(f"UDP server started on port {self.port}.")
+            listener.socket.sendto(f"next,{seconds}".encode("utf-8"), (sender_ip, sender_port))
+            listener.hints += 1
         except Exception as e:
-            self.log(f"Failed to bind on port {self.port}: {e}")
-            return
+            self._log_with_cooldown("report-hint-failed", f"[report-hint] reply to {sender_ip}:{sender_port} failed: {e}", 600)
 
-        while self.running:
+    def _bind_server_socket(self):
+        for listener in self._listeners:
+            if listener.bound:
+                continue
             try:
-                data, addr = self.server_socket.recvfrom(1024)
-                sender_ip, sender_port = addr
-                msg = data.decode("utf-8").strip().split(",")
-                log_key = f"{sender_ip}:invalid"
-
-                if len(msg) >= 4:
-                    domain_name = msg[0]
-                    protocol = msg[1].lower()  # e.g., "v4" or "v6"
-                    reported_ip = msg[2]
-                    connectivity = msg[3]
-
-                    match protocol:
-                        case "v4":
-                            update_ip = self._select_update_ipv4(reported_ip)
-                            decision_key = f"dns-update:{domain_name}"
-                            if not update_ip:
-                                invalid_msg = self._format_client_server_update_log(sender_ip, reported_ip, domain_name, "-", "not_updated", "invalid_reported_non_global_ip")
-                                self._log_periodic_state(decision_key, invalid_msg, self._receive_log_interval_seconds)
-                                continue
-
-                            dns_match, dns_ip, _ = self._domain_points_to_ip(domain_name, update_ip)
-                            if dns_match:
-                                no_update_msg = self._format_client_server_update_log(sender_ip, reported_ip, domain_name, dns_ip, "not_updated", "dns_already_matches")
-                                self._log_periodic_state(decision_key, no_update_msg, self._receive_log_interval_seconds)
-                            else:
-                                updated = self.update_client_ip_via_lambda(update_ip, connectivity, domain_name=domain_name)
-                                if updated:
-                                    update_msg = self._format_client_server_update_log(sender_ip, reported_ip, domain_name, dns_ip, "updated", "dns_not_match_update_sent")
-                                    self._log_periodic_state(decision_key, update_msg, self._receive_log_interval_seconds)
-                                else:
-                                    failed_msg = self._format_client_server_update_log(sender_ip, reported_ip, domain_name, dns_ip, "not_updated", "lambda_call_failed")
-                                    self._log_periodic_state(decision_key, failed_msg, self._receive_log_interval_seconds)
-                            if connectivity == "0":
-                                if domain_name not in self.connectivity_0_start_time:
-                                    self.connectivity_0_start_time[domain_name] = time.time()
-                                else:
-                                    elapsed = time.time() - self.connectivity_0_start_time[domain_name]
-                                    if elapsed >= 300:
-                                        self.replace_instance_ip()
-                                        self.connectivity_0_start_time[domain_name] = time.time()
-                            else:
-                                self.connectivity_0_start_time.pop(domain_name, None)
-                        case "v6":
-                            pass  # No need to log or handle
-                        case _:
-                            unknown_log_msg = self._format_client_server_update_log(sender_ip, reported_ip, domain_name, "-", "not_updated", "unknown_protocol")
-                            self._log_periodic_state(f"unknown-protocol:{sender_ip}:{domain_name}", unknown_log_msg, self._receive_log_interval_seconds)
-                else:
-                    invalid_log_msg = f"Invalid message format from {sender_ip}:{sender_port}: {msg}"
-                    if log_key not in self.last_logged_states or self.last_logged_states[log_key] != invalid_log_msg:
-                        self.log(invalid_log_msg)
-                        self.last_logged_states[log_key] = invalid_log_msg
+                listener.bind()
+                self.log(f"UDP server started on {listener.label}.")
+            except Exception as e:
+                self.log(f"Failed to bind on {listener.label}: {e}")
+        self._server_socket_bound = any(listener.bound for listener in self._listeners)
+        return self._server_socket_bound
 
+    def _receive_from(self, listener):
+        # Drain a bounded number of datagrams per wakeup so one busy listener cannot starve the others.
+        for _ in range(64):
+            try:
+                data, addr = listener.socket.recvfrom(1024)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                listener.errors += 1
+                self._log_with_cooldown(f"receive-error:{listener.label}", f"[receive] {listener.label}: {e}", 60)
+                return
+            sender_ip, sender_port = addr[0], addr[1]
+            listener.datagrams += 1
+            listener.bytes += len(data)
+            capture = self._capture
+            if capture:
+                try:
+                    capture.write(self._clock.time(), sender_ip, sender_port, data)
+                except Exception as e:
+                    # A full disk or unwritable capture must not stop report handling; stop capturing instead.
+                    self._capture = None
+                    capture.close()
+                    self._log_with_cooldown("capture-write-failed", f"[capture] write to {capture.path} failed, capture stopped: {e}", 600)
+            try:
+                hint_seconds = self._handle_datagram(data, sender_ip, sender_port)
+                if hint_seconds:
+                    self._send_report_hint(hint_seconds, sender_ip, sender_port, listener)
             except Exception as e:
-                self.log(f"Error handling message: {e}")
-                time.sleep(1)
+                listener.errors += 1
+                self.log(f"Error handling message on {listener.label}: {e}")
+
+    def receive_loop(self):
+        if not self._server_socket_bound and not self._bind_server_socket():
+            return
+
+        # One thread serves every listener; the pipeline state behind _handle_datagram is shared.
+        selector = selectors.DefaultSelector()
+        for listener in self._listeners:
+            if listener.bound:
+                listener.socket.setblocking(False)
+                selector.register(listener.socket, selectors.EVENT_READ, listener)
+        try:
+            while self.running:
+                try:
+                    for key, _ in selector.select(timeout=1):
+                        self._receive_from(key.data)
+                except Exception as e:
+                    self.log(f"Error handling message: {e}")
+                    self._clock.sleep(1)
+        finally:
+            selector.close()
 
     def start_receive_thread(self):
         t = threading.Thread(target=self.receive_loop, name="UDPServerThread")
@@ -332,12 +1030,51 @@ class UDPServer:
         self.log("UDP server receive thread started.")
         return t
 
+    def _on_address_event(self, event, ifindex, address):
+        self.log(f"[address-watch] {event} address={address if address else '-'} ifindex={ifindex}")
+        self._address_changed.set()
+
+    def address_watch_loop(self):
+        self._address_watcher.run()
+        self._address_watcher = None
+        self.log("[address-watch] watcher stopped, falling back to periodic IP checks.")
+
+    def start_address_watch_thread(self):
+        watcher = AddressWatcher(self._on_address_event)
+        if not watcher.open():
+            self.log(f"[address-watch] netlink unavailable, checking IP every {self._ip_monitor_interval_seconds}s.")
+            return None
+        self._address_watcher = watcher
+        t = threading.Thread(target=self.address_watch_loop, name="AddressWatchThread")
+        t.daemon = True
+        t.start()
+        self.log(f"[address-watch] watching interface addresses, HTTP fallback every {self._ip_monitor_fallback_seconds}s.")
+        return t
+
+    def _wait_for_ip_check(self):
+        """Sleep until the next IP check; returns "address_event" or "timer"."""
+        timeout = max(self._ip_monitor_interval_seconds, self._ip_monitor_fallback_seconds) if self._address_watcher else self._ip_monitor_interval_seconds
+        if not self._address_changed.wait(timeout):
+            return "timer"
+        # Address changes arrive in bursts (DAD, DHCP renew); let them settle before asking the HTTP services.
+        self._clock.sleep(self._address_event_settle_seconds)
+        self._address_changed.clear()
+        return "address_event"
+
     def ip_monitor_loop(self):
         last_ip = None
+        trigger = "startup"
         server_domain_name = self._server_domain_name
         while True:
-            current_ip = self.get_ipv4()
-            update_ip = self._normalize_global_ipv4(current_ip)
+            with self._flight_recorder.span("ip_lookup"):
+                current_ip = self.get_ipv4()
+                update_ip = self._normalize_global_ipv4(current_ip)
+                update_ipv6 = self._normalize_global_ipv6(self.get_ipv6()) if self._ipv6_enabled else None
+            if last_ip is None:
+                # Initial discovery runs here, after the socket is already receiving, instead of in __init__.
+                self._mark_startup_phase("ip_discovery")
+                self.log(f"Initial IPv4={current_ip}, Initial IPv6={update_ipv6 if update_ipv6 else '-'}")
+                self.log(f"[startup] {self._format_startup_phases()}")
             if update_ip:
                 self._server_ip_snapshot = update_ip
                 if last_ip is None:
@@ -345,21 +1082,211 @@ class UDPServer:
                 elif update_ip != last_ip:
                     ip_reason = f"ip_changed({last_ip}->{update_ip})"
                 else:
-                    ip_reason = "periodic_refresh"
-                dns_match, dns_ip, dns_status = self._domain_points_to_ip(server_domain_name, update_ip)
-                if dns_match:
-                    action = "not_updated"
-                    reason = "dns_already_matches"
-                else:
-                    updated = self.update_client_ip_via_lambda(update_ip, "1", domain_name=server_domain_name)
-                    action = "updated" if updated else "not_updated"
-                    reason = "dns_not_match_update_sent" if updated else "lambda_call_failed"
+                    ip_reason = "address_event_no_change" if trigger == "address_event" else "periodic_refresh"
+                dns_ip, dns_status, action, reason = self._decide_update(server_domain_name, update_ip, update_ipv6, "1")
                 if action != "not_updated" or reason != "dns_already_matches":
-                    self.log(f"[server domain={server_domain_name if server_domain_name else '-'} ip={update_ip}] [action={action}] [reason={reason}] [ip_reason={ip_reason}] [domain_ip={dns_ip if dns_ip else '-'}] [dns_status={dns_status}]")
+                    ipv6_text = f" ipv6={update_ipv6}" if update_ipv6 else ""
+                    self.log(f"[server domain={server_domain_name if server_domain_name else '-'} ip={update_ip}{ipv6_text}] [action={action}] [reason={reason}] [ip_reason={ip_reason}] [domain_ip={dns_ip if dns_ip else '-'}] [dns_status={dns_status}]")
                 last_ip = update_ip
             else:
                 self._log_with_cooldown("server-monitor-invalid-ip", f"server_domain={server_domain_name if server_domain_name else '-'} ip={current_ip} action=not_updated reason=invalid_non_global_ip", self._ip_monitor_interval_seconds)
-            time.sleep(self._ip_monitor_interval_seconds)
+            trigger = self._wait_for_ip_check()
+
+    def _admin_history(self, args):
+        if not args:
+            return {"error": "usage: history <domain> [limit]"}
+        limit = int(args[1]) if len(args) > 1 else 10
+        return {"domain": args[0], "events": self._domain_history.last_events(args[0], limit)}
+
+    def _admin_rate(self, args):
+        if not args:
+            return {"error": "usage: rate <domain> [window_seconds]"}
+        window_seconds = int(args[1]) if len(args) > 1 else 7 * 24 * 3600
+        now = self._clock.time()
+        return {"domain": args[0], "window_seconds": window_seconds, "ip_changes": len(self._domain_history.ip_changes(args[0], now - window_seconds)), "changes_per_hour": self._domain_history.change_rate(args[0], window_seconds, now)}
+
+    def _admin_flapping(self, args):
+        window_seconds = int(args[0]) if args else 3600
+        min_changes = int(args[1]) if len(args) > 1 else 3
+        return {"window_seconds": window_seconds, "domains": self._domain_history.flapping_domains(window_seconds, self._clock.time(), min_changes)}
+
+    def _admin_peers(self, args):
+        if not self._peer_coordinator:
+            return {"enabled": False}
+        members = self._peer_coordinator.live_members()
+        response = {"enabled": True, "server_id": self._peer_coordinator.server_id, "live": members}
+        if args:
+            response["owner"] = {domain_name: self._peer_coordinator.owner(domain_name) for domain_name in args}
+        return response
+
+    def _admin_listeners(self, args):
+        return {"listeners": [listener.snapshot() for listener in self._listeners]}
+
+    def _admin_services(self, args):
+        return {"ipv4": self._service_scoreboard.snapshot(self._ipv4_services), "ipv6": self._service_scoreboard.snapshot(self._ipv6_services)}
+
+    def _admin_trace(self, args):
+        response = {"capacity": self._flight_recorder.capacity, "stages": self._flight_recorder.summary()}
+        if args and args[0] == "spans":
+            response["spans"] = self._flight_recorder.dump()[-int(args[1]) if len(args) > 1 else -100:]
+        return response
+
+    def _admin_profile(self, args):
+        command = args[0] if args else "status"
+        if command == "start":
+            return {"started": self._profiler.start(), "running": self._profiler.running}
+        if command == "stop":
+            return {"stopped": self._profiler.stop(), "running": self._profiler.running, "top": self._profiler.top(int(args[1]) if len(args) > 1 else 10)}
+        return {"running": self._profiler.running, "top": self._profiler.top(int(args[1]) if len(args) > 1 else 10)}
+
+    def dump_flight_recorder(self):
+        dump_path = f"{os.path.splitext(self.log_file)[0]}.trace"
+        with open(dump_path, "w") as f:
+            f.write("\n".join(self._flight_recorder.dump()) + "\n")
+            for row in self._profiler.top(20):
+                f.write(f"profile {row['samples']} {row['thread']} {row['stack']}\n")
+        self.log(f"[trace] {self._flight_recorder.format_summary()}")
+        self.log(f"[trace] spans written to {dump_path}")
+        return dump_path
+
+    def toggle_profiler(self):
+        if self._profiler.running:
+            self._profiler.stop()
+            for row in self._profiler.top(10):
+                self.log(f"[profile] {row['samples']} {row['thread']} {row['stack']}")
+        else:
+            self._profiler.start()
+            self.log(f"[profile] sampling every {self._profiler.interval_seconds}s")
+
+    def install_signal_handlers(self):
+        # Signal handlers can only be installed from the main thread, and SIGUSR1/2 do not exist on Windows.
+        if threading.current_thread() is not threading.main_thread() or not hasattr(signal, "SIGUSR1"):
+            return False
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump_flight_recorder())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.toggle_profiler())
+        return True
+
+    def _config_value(self, name):
+        if name == "excluded_targets":
+            return ",".join([str(network) for network in self._excluded_networks] + self.excluded_domains)
+        return getattr(self, self._config_fields[name][0])
+
+    def _apply_excluded_targets(self, targets):
+        networks, domains = targets
+        self._excluded_networks = networks
+        self.excluded_domains = domains
+        # Addresses resolved for the old domain list no longer apply; the refresh thread resolves the new list right away.
+        self.excluded_ips_cache = {"ips": set(), "last_updated": 0}
+        self._exclusion_index = ExclusionIndex(networks)
+        self._exclusion_refresh_wakeup.set()
+
+    def apply_config(self, changes, source="admin"):
+        """Validate every change first, then apply them together; returns (applied, errors)."""
+        errors = {}
+        parsed = {}
+        for name, text in changes.items():
+            if name not in self._config_fields:
+                errors[name] = "unknown setting"
+                continue
+            try:
+                parsed[name] = self._config_fields[name][1](text)
+            except (ValueError, TypeError) as e:
+                errors[name] = str(e)
+        if errors or not parsed:
+            return {}, errors or {"": "no changes given"}
+        applied = {}
+        with self._config_lock:
+            for name, value in parsed.items():
+                old_value = self._config_value(name)
+                if name == "excluded_targets":
+                    self._apply_excluded_targets(value)
+                else:
+                    setattr(self, self._config_fields[name][0], value)
+                applied[name] = {"old": old_value, "new": self._config_value(name)}
+        for name, change in applied.items():
+            self._config_audit.append({"ts": self._clock.time(), "source": source, "setting": name, "old": change["old"], "new": change["new"]})
+            self.log(f"[config] {name}: {change['old']} -> {change['new']} (source={source})")
+        return applied, {}
+
+    def _admin_config(self, args):
+        if args and args[0] == "audit":
+            return {"audit": list(self._config_audit)}
+        return {name: self._config_value(name) for name in sorted(self._config_fields)}
+
+    def _admin_set(self, args):
+        changes = {}
+        for arg in args:
+            name, separator, value = arg.partition("=")
+            if not separator:
+                return {"error": "usage: set name=value [name=value ...]"}
+            changes[name] = value
+        applied, errors = self.apply_config(changes)
+        return {"applied": applied} if not errors else {"error": "nothing applied", "invalid": errors}
+
+    def _capture_path(self, name):
+        """Resolve an admin-supplied capture file name under CAPTURE_DIR; returns None when it points outside."""
+        path = os.path.realpath(os.path.join(self._capture_dir, name))
+        if os.path.dirname(path) != self._capture_dir:
+            return None
+        return path
+
+    def _admin_capture(self, args):
+        if args and args[0] == "start" and len(args) > 1:
+            if self._capture:
+                return {"error": f"already capturing to {self._capture.path}"}
+            path = self._capture_path(args[1])
+            if path is None:
+                return {"error": f"capture files must be plain names inside {self._capture_dir}"}
+            os.makedirs(self._capture_dir, exist_ok=True)
+            self._capture = CaptureWriter(path, self._capture_max_bytes, self._capture_backups)
+            self.log(f"[capture] writing datagrams to {path}")
+        elif args and args[0] == "stop":
+            capture, self._capture = self._capture, None
+            if capture:
+                capture.close()
+                self.log(f"[capture] stopped writing to {capture.path}")
+        elif args:
+            return {"error": "usage: capture [start <name>|stop]"}
+        return {"capturing": self._capture.path if self._capture else None}
+
+    def _handle_admin_command(self, text):
+        parts = text.strip().split()
+        if self._admin_token:
+            supplied = parts.pop(0) if parts else ""
+            if not hmac.compare_digest(supplied.encode("utf-8"), self._admin_token.encode("utf-8")):
+                self._log_with_cooldown("admin-unauthorized", "[admin] rejected command: bad or missing ADMIN_TOKEN", 60)
+                return {"error": "unauthorized"}
+        elif parts and parts[0] in self._admin_privileged_commands:
+            return {"error": f"{parts[0]} is disabled until ADMIN_TOKEN is set"}
+        if not parts or parts[0] not in self._admin_commands:
+            return {"error": f"unknown command, expected one of {sorted(self._admin_commands)}"}
+        try:
+            return self._admin_commands[parts[0]](parts[1:])
+        except Exception as e:
+            return {"error": str(e)}
+
+    def admin_loop(self):
+        admin_socket = socket(AF_INET, SOCK_DGRAM)
+        try:
+            admin_socket.bind(("127.0.0.1", self._admin_port))
+        except Exception as e:
+            self.log(f"Failed to bind admin interface on 127.0.0.1:{self._admin_port}: {e}")
+            admin_socket.close()
+            return
+        self.log(f"Admin interface listening on 127.0.0.1:{self._admin_port}.")
+        while True:
+            try:
+                data, addr = admin_socket.recvfrom(4096)
+                reply = self._handle_admin_command(data.decode("utf-8", "replace"))
+                admin_socket.sendto(json.dumps(reply).encode("utf-8"), addr)
+            except Exception as e:
+                self._log_with_cooldown("admin-error", f"[admin] error: {e}", 60)
+
+    def start_admin_thread(self):
+        t = threading.Thread(target=self.admin_loop, name="AdminThread")
+        t.daemon = True
+        t.start()
+        return t
 
     def start_ip_monitor_thread(self):
         t = threading.Thread(target=self.ip_monitor_loop, name="IPMonitorThread")
@@ -369,12 +1296,29 @@ class UDPServer:
         return t
 
     def start(self):
+        # Bind and start receiving before anything that may block on the network.
+        self._bind_server_socket()
+        self._mark_startup_phase("bind")
         self.start_receive_thread()
+        self._mark_startup_phase("receive_ready")
+        self.start_exclusion_refresh_thread()
+        self.start_remediation_thread()
+        if self._dns_batcher:
+            self.start_dns_batch_thread()
+        if self._peer_coordinator:
+            self.start_peer_threads()
+        if self._address_watch_enabled:
+            self.start_address_watch_thread()
         self.start_ip_monitor_thread()
+        if self._admin_port:
+            self.start_admin_thread()
+        self._mark_startup_phase("threads_started")
+        self.log(f"[startup] {self._format_startup_phases()}")
 
 
 if __name__ == "__main__":
     server = UDPServer()
+    server.install_signal_handlers()
     server.start()
     while True:
         time.sleep(1)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from UDPServer import UDPServer
+
+
+class ServerTestCase(unittest.TestCase):
+    """Base for tests that need a UDPServer: LightSail and the public-IP lookups are patched, the log goes to a temp file."""
+
+    def make_server(self, **kwargs):
+        fd, self.log_file = tempfile.mkstemp(prefix="udp_server_test_", suffix=".log")
+        os.close(fd)
+        self.addCleanup(self._remove_log_file, self.log_file)
+        lightsail_patcher = patch("UDPServer.LightSail")
+        self.mock_lightsail = lightsail_patcher.start()
+        self.addCleanup(lightsail_patcher.stop)
+        ipv4_patcher = patch("UDPServer.UDPServer.get_ipv4", return_value="1.2.3.4")
+        ipv6_patcher = patch("UDPServer.UDPServer.get_ipv6", return_value="::1")
+        self.mock_get_ipv4 = ipv4_patcher.start()
+        self.addCleanup(ipv4_patcher.stop)
+        self.mock_get_ipv6 = ipv6_patcher.start()
+        self.addCleanup(ipv6_patcher.stop)
+        server = UDPServer(log_file=self.log_file, **kwargs)
+        for listener in server._listeners:
+            self.addCleanup(listener.close)
+        return server
+
+    @staticmethod
+    def _remove_log_file(log_file):
+        try:
+            os.remove(log_file)
+        except OSError:
+            pass
@@ -0,0 +1,42 @@
+import struct
+import unittest
+from socket import AF_INET, AF_INET6, inet_pton
+
+from AddressWatcher import IFA_ADDRESS, IFA_LOCAL, RTM_DELADDR, RTM_NEWADDR, parse_address_events
+from server_test_support import ServerTestCase
+
+
+def address_message(msg_type, family, ifindex, attributes):
+    body = struct.pack("=BBBBI", family, 24, 0, 0, ifindex)
+    for attr_type, value in attributes:
+        attr = struct.pack("=HH", 4 + len(value), attr_type) + value
+        body += attr + b"\0" * (-len(attr) % 4)
+    return struct.pack("=IHHII", 16 + len(body), msg_type, 0, 0, 0) + body
+
+
+class TestParseAddressEvents(unittest.TestCase):
+    def test_new_and_deleted_addresses_in_one_datagram(self):
+        data = address_message(RTM_NEWADDR, AF_INET, 2, [(IFA_ADDRESS, inet_pton(AF_INET, "10.0.0.5")), (IFA_LOCAL, inet_pton(AF_INET, "8.8.8.8"))])
+        data += address_message(RTM_DELADDR, AF_INET6, 3, [(IFA_ADDRESS, inet_pton(AF_INET6, "2001:db8::1"))])
+        self.assertEqual(parse_address_events(data), [("new", 2, "8.8.8.8"), ("del", 3, "2001:db8::1")])
+
+    def test_other_messages_and_truncated_data_are_ignored(self):
+        link_message = struct.pack("=IHHII", 16, 16, 0, 0, 0)
+        data = address_message(RTM_NEWADDR, AF_INET, 2, [(IFA_LOCAL, inet_pton(AF_INET, "8.8.8.8"))])
+        self.assertEqual(parse_address_events(link_message + data[:20]), [])
+
+
+class TestIPMonitorWakeup(ServerTestCase):
+    def test_address_event_wakes_monitor_before_interval(self):
+        server = self.make_server()
+        server._address_event_settle_seconds = 0
+        self.assertEqual(server._ip_monitor_fallback_seconds, server._ip_monitor_interval_seconds)
+        server._on_address_event("new", 2, "8.8.8.8")
+        self.assertEqual(server._wait_for_ip_check(), "address_event")
+        self.assertFalse(server._address_changed.is_set())
+        server._ip_monitor_interval_seconds = 0
+        self.assertEqual(server._wait_for_ip_check(), "timer")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from server_test_support import ServerTestCase
+
+
+class TestDecisionLogging(ServerTestCase):
+    def setUp(self):
+        self.server = self.make_server()
+        self.server._receive_log_interval_seconds = 60
+
+    def _log_lines(self):
+        with open(self.log_file) as file_handle:
+            return file_handle.read().splitlines()
+
+    def test_repeated_decision_is_not_formatted(self):
+        with patch("builtins.print"), patch.object(self.server, "_format_decision_record", wraps=self.server._format_decision_record) as mock_format:
+            for _ in range(5):
+                self.server._log_decision("dns-update:a.example.com", "8.8.8.8", "a.example.com", "8.8.8.8", "not_updated", "dns_already_matches")
+            self.assertEqual(mock_format.call_count, 1)
+            self.server._log_decision("dns-update:a.example.com", "8.8.8.8", "a.example.com", "1.1.1.1", "updated", "dns_not_match_update_sent")
+            self.assertEqual(mock_format.call_count, 2)
+        self.assertTrue(self._log_lines()[-1].endswith("[client=8.8.8.8] [domain=a.example.com@1.1.1.1] -> [server=-@-] [action=updated:dns_not_match_update_sent]||"))
+
+    def test_json_lines_mode(self):
+        self.server._log_json = True
+        with patch("builtins.print"):
+            self.server._log_decision("dns-update:a.example.com", "8.8.8.8", "a.example.com", "1.1.1.1", "updated", "dns_not_match_update_sent")
+            self.server.log("plain message")
+        decision, plain = [json.loads(line) for line in self._log_lines()[-2:]]
+        self.assertEqual(decision["domain"], "a.example.com")
+        self.assertEqual(decision["action"], "updated")
+        self.assertEqual(decision["reason"], "dns_not_match_update_sent")
+        self.assertEqual(plain["msg"], "plain message")
+
+
+if __name__ == "__main__":
+    unittest.main()
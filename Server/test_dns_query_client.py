@@ -0,0 +1,121 @@
+import struct
+import threading
+import time
+import unittest
+from socket import AF_INET, AF_INET6, SOCK_DGRAM, inet_pton, socket
+from unittest.mock import patch
+
+from DNSQueryClient import DNSQueryClient, build_query, parse_response
+from server_test_support import ServerTestCase
+
+ZONE = {
+    ("a.qyp.life", 1): [(300, "8.8.8.8"), (300, "8.8.4.4")],
+    ("b.qyp.life", 1): [(60, "1.1.1.1")],
+    ("a.qyp.life", 28): [(120, "2001:4860:4860::8888")],
+}
+
+
+class StubNameserver:
+    def __init__(self):
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.queries = 0
+        self.spoof = None
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except OSError:
+                return
+            self.queries += 1
+            query_id = struct.unpack_from("!H", data, 0)[0]
+            offset = 12
+            labels = []
+            while data[offset]:
+                labels.append(data[offset + 1:offset + 1 + data[offset]].decode())
+                offset += data[offset] + 1
+            record_type = struct.unpack_from("!H", data, offset + 1)[0]
+            question = data[12:offset + 5]
+            if self.spoof == "question":
+                question = build_query(0, "evil.qyp.life", "A")[12:]
+            records = ZONE.get((".".join(labels), record_type))
+            known_name = any(name == ".".join(labels) for name, _ in ZONE)
+            rcode = 0 if known_name else 3
+            answers = b""
+            for ttl, value in records or []:
+                rdata = inet_pton(AF_INET6 if ":" in value else AF_INET, value)
+                answers += struct.pack("!HHHIH", 0xC00C, record_type, 1, ttl, len(rdata)) + rdata
+            header = struct.pack("!HHHHHH", query_id, 0x8400 | rcode, 1, len(records or []), 0, 0)
+            if self.spoof == "source":
+                with socket(AF_INET, SOCK_DGRAM) as other:
+                    other.sendto(header + question + answers, addr)
+                continue
+            self.sock.sendto(header + question + answers, addr)
+
+    def close(self):
+        self.sock.close()
+
+
+class TestDNSWireFormat(unittest.TestCase):
+    def test_parse_response_with_compressed_names(self):
+        query = build_query(4660, "a.qyp.life", "A")
+        answer = struct.pack("!HHHIH", 0xC00C, 1, 1, 300, 4) + bytes([8, 8, 8, 8])
+        response = struct.pack("!HHHHHH", 4660, 0x8400, 1, 1, 0, 0) + query[12:] + answer
+        self.assertEqual(parse_response(response), (4660, 0, [("a.qyp.life", "A", 300, "8.8.8.8")], []))
+
+
+class TestDNSQueryClient(unittest.TestCase):
+    def setUp(self):
+        self.nameserver = StubNameserver()
+        self.addCleanup(self.nameserver.close)
+        self.client = DNSQueryClient(nameservers=["127.0.0.1"], port=self.nameserver.port, timeout=1)
+
+    def test_pipelined_queries_return_addresses_and_ttl(self):
+        results = self.client.resolve_many([("a.qyp.life", "A"), ("b.qyp.life", "A"), ("a.qyp.life", "AAAA"), ("missing.qyp.life", "A")])
+        self.assertEqual(results[("a.qyp.life", "A")], (["8.8.8.8", "8.8.4.4"], 300, "ok"))
+        self.assertEqual(results[("b.qyp.life", "A")], (["1.1.1.1"], 60, "ok"))
+        self.assertEqual(results[("a.qyp.life", "AAAA")], (["2001:4860:4860::8888"], 120, "ok"))
+        self.assertEqual(results[("missing.qyp.life", "A")], ([], 0, "nxdomain"))
+        self.assertEqual(self.nameserver.queries, 4)
+
+    def test_response_must_come_from_the_server_and_repeat_the_question(self):
+        client = DNSQueryClient(nameservers=["127.0.0.1"], port=self.nameserver.port, timeout=0.3)
+        for spoof in ("question", "source"):
+            self.nameserver.spoof = spoof
+            self.assertEqual(client.resolve("a.qyp.life"), ([], 0, "timeout"), spoof)
+
+    def test_failed_nameserver_discovery_is_cached_briefly(self):
+        client = DNSQueryClient(bootstrap_resolvers=["127.0.0.1"], port=self.nameserver.port, timeout=0.2, negative_cache_seconds=60)
+        self.assertEqual(client.resolve("a.qyp.life"), ([], 0, "no_nameserver"))
+        queries = self.nameserver.queries
+        self.assertEqual(client.resolve("a.qyp.life"), ([], 0, "no_nameserver"))
+        self.assertEqual(self.nameserver.queries, queries)
+        with patch("DNSQueryClient.time.time", return_value=time.time() + 61):
+            client.resolve("a.qyp.life")
+        self.assertGreater(self.nameserver.queries, queries)
+
+    def test_unanswered_query_times_out(self):
+        client = DNSQueryClient(nameservers=["127.0.0.1"], port=1, timeout=0.2)
+        self.assertEqual(client.resolve("a.qyp.life"), ([], 0, "timeout"))
+
+
+class TestAuthoritativeMatchCheck(ServerTestCase):
+    @patch("UDPServer.getaddrinfo", return_value=[(None, None, None, None, ("9.9.9.9", 0))])
+    def test_authoritative_answer_overrides_stale_system_resolver(self, mock_getaddrinfo):
+        nameserver = StubNameserver()
+        self.addCleanup(nameserver.close)
+        server = self.make_server()
+        server._dns_query_client = DNSQueryClient(nameservers=["127.0.0.1"], port=nameserver.port, timeout=1)
+        results = server._domains_point_to_ips([("a.qyp.life", "8.8.4.4"), ("b.qyp.life", "8.8.8.8"), ("missing.qyp.life", "8.8.8.8")])
+        self.assertEqual(results[("a.qyp.life", "8.8.4.4")], (True, "8.8.4.4", "match"))
+        self.assertEqual(results[("b.qyp.life", "8.8.8.8")], (False, "1.1.1.1", "mismatch"))
+        self.assertEqual(results[("missing.qyp.life", "8.8.8.8")], (False, "", "no_ipv4_record"))
+        self.assertEqual(server._dns_record_ttl["b.qyp.life"], 60)
+        mock_getaddrinfo.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import unittest
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from Clock import VirtualClock
+from DNSUpdateBackend import BatchDNSBackend, DNSChange, DNSUpdateBatcher, LambdaDNSBackend
+from server_test_support import ServerTestCase
+
+
+class StubChangeBatchHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(payload)
+        results = []
+        for change in payload["change_batch"]["Changes"]:
+            name = change["ResourceRecordSet"]["Name"]
+            if name.startswith("bad."):
+                results.append({"name": name, "status": "error", "error": "InvalidChangeBatch"})
+            else:
+                results.append({"name": name, "status": "ok"})
+        body = json.dumps({"hosted_zone_id": f"Z-{payload['zone_name']}", "results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestBatchDNSBackend(unittest.TestCase):
+    def setUp(self):
+        self.stub = HTTPServer(("127.0.0.1", 0), StubChangeBatchHandler)
+        self.stub.requests = []
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        self.addCleanup(self.stub.server_close)
+        self.addCleanup(self.stub.shutdown)
+        self.backend = BatchDNSBackend(f"http://127.0.0.1:{self.stub.server_port}/", zone_names=["qyp.life", "cn.qyp.life"])
+
+    def test_one_request_per_zone_with_per_record_results(self):
+        changes = [DNSChange("a.qyp.life", "8.8.8.8", "1"), DNSChange("bad.qyp.life", "8.8.4.4", "1"), DNSChange("c.qinyupeng.com", "1.1.1.1", "0")]
+        results = self.backend.update_records(changes)
+        self.assertEqual([(change.domain_name, ok) for change, ok, _ in results], [("a.qyp.life", True), ("bad.qyp.life", False), ("c.qinyupeng.com", True)])
+        self.assertEqual(len(self.stub.requests), 2)
+        first = self.stub.requests[0]
+        self.assertEqual(first["zone_name"], "qyp.life")
+        self.assertEqual(first["change_batch"]["Changes"][0], {"Action": "UPSERT", "ResourceRecordSet": {"Name": "a.qyp.life.", "Type": "A", "TTL": 60, "ResourceRecords": [{"Value": "8.8.8.8"}]}})
+
+    def test_dual_stack_change_upserts_a_and_aaaa(self):
+        results = self.backend.update_records([DNSChange("a.qyp.life", "8.8.8.8", "1", "2001:4860:4860::8888")])
+        self.assertTrue(results[0][1])
+        record_sets = [change["ResourceRecordSet"] for change in self.stub.requests[0]["change_batch"]["Changes"]]
+        self.assertEqual([(record_set["Type"], record_set["ResourceRecords"][0]["Value"]) for record_set in record_sets], [("A", "8.8.8.8"), ("AAAA", "2001:4860:4860::8888")])
+
+    def test_zone_id_is_cached(self):
+        self.backend.update_records([DNSChange("a.qyp.life", "8.8.8.8", "1")])
+        self.backend.update_records([DNSChange("b.qyp.life", "8.8.8.8", "1")])
+        self.assertIsNone(self.stub.requests[0]["hosted_zone_id"])
+        self.assertEqual(self.stub.requests[1]["hosted_zone_id"], "Z-qyp.life")
+
+    def test_longest_configured_zone_wins(self):
+        self.assertEqual(self.backend.zone_for("x.cn.qyp.life"), "cn.qyp.life")
+        self.assertEqual(self.backend.zone_for("x.example.com."), "example.com")
+
+    def test_unreachable_endpoint_fails_every_record(self):
+        backend = BatchDNSBackend("http://127.0.0.1:1/", timeout=1)
+        results = backend.update_records([DNSChange("a.qyp.life", "8.8.8.8", "1")])
+        self.assertFalse(results[0][1])
+
+
+class TestDNSUpdateBatcher(unittest.TestCase):
+    def test_flush_merges_pending_changes(self):
+        calls = []
+        reported = []
+        backend = LambdaDNSBackend(lambda ip, connectivity, domain_name=None: calls.append((domain_name, ip)) or True)
+        batcher = DNSUpdateBatcher(backend, 0, lambda change, ok, detail: reported.append((change.domain_name, ok)))
+        batcher.submit(DNSChange("a.qyp.life", "8.8.8.8", "1"))
+        batcher.submit(DNSChange("a.qyp.life", "8.8.4.4", "1"))
+        batcher.submit(DNSChange("b.qyp.life", "1.1.1.1", "1"))
+        batcher.flush()
+        self.assertEqual(calls, [("a.qyp.life", "8.8.4.4"), ("b.qyp.life", "1.1.1.1")])
+        self.assertEqual(reported, [("a.qyp.life", True), ("b.qyp.life", True)])
+        self.assertEqual(batcher.flush(), [])
+
+    def test_run_waits_out_the_window_with_the_injected_sleep(self):
+        slept = []
+        flushed = threading.Event()
+        batcher = DNSUpdateBatcher(LambdaDNSBackend(lambda ip, connectivity, domain_name=None: True), 5, lambda change, ok, detail: flushed.set(), sleep=slept.append)
+        threading.Thread(target=batcher.run, daemon=True).start()
+        batcher.submit(DNSChange("a.qyp.life", "8.8.8.8", "1"))
+        self.assertTrue(flushed.wait(2))
+        self.assertEqual(slept, [5])
+
+
+class TestServerDNSBackend(ServerTestCase):
+    def test_batch_backend_requires_its_own_url(self):
+        with patch.dict(os.environ, {"DNS_UPDATE_BACKEND": "batch", "IPV4_DOMAIN_UPDATE_LAMBDA": "http://lambda.local/"}):
+            os.environ.pop("DNS_BATCH_UPDATE_URL", None)
+            server = self.make_server()
+        self.assertIsNone(server._dns_batcher)
+        with open(self.log_file) as f:
+            self.assertIn("DNS_BATCH_UPDATE_URL is not set", f.read())
+
+    def test_batcher_sleeps_on_the_server_clock(self):
+        clock = VirtualClock(1000)
+        with patch.dict(os.environ, {"DNS_UPDATE_BACKEND": "batch", "DNS_BATCH_UPDATE_URL": "http://batch.local/"}):
+            server = self.make_server(clock=clock)
+        server._dns_batcher._sleep(2)
+        self.assertEqual(clock.time(), 1002)
+
+    def test_unbatched_updates_go_through_the_backend(self):
+        server = self.make_server()
+        with patch.object(server._dns_backend, "update_records", return_value=[(None, True, "")]) as mock_update, patch.object(server, "_domain_points_to_ip", return_value=(False, "8.8.4.4", "mismatch")):
+            self.assertEqual(server._decide_update("a.qyp.life", "8.8.8.8", None, "1")[2:], ("updated", "dns_not_match_update_sent"))
+        mock_update.assert_called_once_with([DNSChange("a.qyp.life", "8.8.8.8", "1", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import threading
+import unittest
+
+from DomainHistory import DomainHistory
+from server_test_support import ServerTestCase
+
+
+class TestDomainHistory(unittest.TestCase):
+    def test_last_events_newest_first(self):
+        history = DomainHistory(events_per_domain=4)
+        history.record("a.example.com", 1000, "8.8.8.8", "1", "updated:dns_not_match_update_sent")
+        history.record("a.example.com", 1060, "8.8.8.8", "1", "not_updated:dns_already_matches")
+        events = history.last_events("a.example.com", 5)
+        self.assertEqual([event["timestamp"] for event in events], [1060, 1000])
+        self.assertEqual(events[0], {"timestamp": 1060, "ip": "8.8.8.8", "connectivity": "1", "decision": "not_updated:dns_already_matches"})
+
+    def test_repeated_event_is_stored_once_per_heartbeat(self):
+        history = DomainHistory(heartbeat_seconds=3600)
+        self.assertTrue(history.record("a.example.com", 1000, "8.8.8.8", "1", "not_updated:dns_already_matches"))
+        self.assertFalse(history.record("a.example.com", 1060, "8.8.8.8", "1", "not_updated:dns_already_matches"))
+        self.assertTrue(history.record("a.example.com", 4600, "8.8.8.8", "1", "not_updated:dns_already_matches"))
+
+    def test_ring_buffer_keeps_fixed_size(self):
+        history = DomainHistory(events_per_domain=4, memory_budget_bytes=4 * DomainHistory.EVENT_BYTES * 2)
+        for index in range(10):
+            history.record("a.example.com", 1000 + index, f"8.8.8.{index + 1}", "1", "updated:dns_not_match_update_sent")
+        self.assertEqual(len(history.last_events("a.example.com", 100)), 4)
+        self.assertEqual(len(history._times), 8)
+        history.record("b.example.com", 2000, "1.1.1.1", "1", "updated:dns_not_match_update_sent")
+        history.record("c.example.com", 2001, "1.1.1.2", "1", "updated:dns_not_match_update_sent")
+        self.assertEqual(sorted(history.domains()), ["b.example.com", "c.example.com"])
+
+    def test_concurrent_records_never_share_a_slot(self):
+        history = DomainHistory(events_per_domain=4, memory_budget_bytes=4 * DomainHistory.EVENT_BYTES * 8)
+
+        def record_many(worker):
+            for index in range(500):
+                history.record(f"w{worker}-{index % 12}.example.com", 1000 + index, f"8.8.{worker}.{index % 250 + 1}", "1", "updated:dns_not_match_update_sent")
+
+        threads = [threading.Thread(target=record_many, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        slots = list(history._slots.values())
+        self.assertEqual(len(slots), len(set(slots)))
+        self.assertEqual(len(slots) + len(history._free_slots), 8)
+
+    def test_change_rate_and_flapping(self):
+        history = DomainHistory()
+        for offset, ip in [(0, "8.8.8.8"), (600, "1.1.1.1"), (1200, "8.8.8.8"), (1800, "8.8.8.8")]:
+            history.record("a.example.com", 1000 + offset, ip, "1", "updated:dns_not_match_update_sent")
+        history.record("b.example.com", 1000, "9.9.9.9", "1", "not_updated:dns_already_matches")
+        self.assertEqual(history.ip_changes("a.example.com", 0), [1600, 2200])
+        self.assertEqual(history.change_rate("a.example.com", 3600, 2800), 2)
+        self.assertTrue(history.is_flapping("a.example.com", 3600, 2800))
+        self.assertEqual(history.flapping_domains(3600, 2800), ["a.example.com"])
+
+
+class TestHistoryAdminCommands(ServerTestCase):
+    def test_history_command_returns_events(self):
+        server = self.make_server()
+        server._domain_history.record("a.example.com", 1000, "8.8.8.8", "1", "updated:dns_not_match_update_sent")
+        reply = server._handle_admin_command("history a.example.com 1")
+        self.assertEqual(reply["events"][0]["ip"], "8.8.8.8")
+        self.assertIn("error", server._handle_admin_command("unknown"))
+        json.dumps(server._handle_admin_command("flapping"))
+
+
+if __name__ == "__main__":
+    unittest.main()
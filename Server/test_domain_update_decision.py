@@ -1,8 +1,10 @@
 import os
 import tempfile
 import unittest
+from socket import AF_INET
 from unittest.mock import patch
 
+from Clock import VirtualClock
 from UDPServer import UDPServer
 
 
@@ -73,6 +75,97 @@ class TestDomainUpdateDecision(unittest.TestCase):
         finally:
             server.server_socket.close()
 
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.UDPServer.get_ipv4", return_value="1.2.3.4")
+    @patch("UDPServer.UDPServer.get_ipv6", return_value="::1")
+    @patch("UDPServer.getaddrinfo")
+    def test_dual_stack_mismatch_sends_one_combined_update(self, mock_getaddrinfo, mock_get_ipv6, mock_get_ipv4, mock_lightsail):
+        mock_getaddrinfo.side_effect = lambda domain_name, port, family: [(None, None, None, None, ("8.8.8.8", 0))] if family == AF_INET else [(None, None, None, None, ("2001:4860:4860::8844", 0, 0, 0))]
+        server = UDPServer(log_file=self.log_file)
+        server._lambda_supports_ipv6 = True
+        try:
+            with patch.object(server, "update_client_ip_via_lambda", return_value=True) as mock_update:
+                domain_ip, dns_status, action, reason = server._decide_update("demo.example.com", "8.8.8.8", "2001:4860:4860::8888", "1")
+            mock_update.assert_called_once_with("8.8.8.8", "1", domain_name="demo.example.com", client_ipv6="2001:4860:4860::8888")
+            self.assertEqual((domain_ip, dns_status, action, reason), ("8.8.8.8,2001:4860:4860::8844", "match,mismatch", "updated", "dns_not_match_update_sent"))
+        finally:
+            server.server_socket.close()
+
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.UDPServer.get_ipv4", return_value="1.2.3.4")
+    @patch("UDPServer.UDPServer.get_ipv6", return_value="::1")
+    @patch("UDPServer.getaddrinfo", return_value=[(None, None, None, None, ("2001:4860:4860::8888", 0, 0, 0))])
+    def test_ipv6_only_match_skips_update(self, mock_getaddrinfo, mock_get_ipv6, mock_get_ipv4, mock_lightsail):
+        server = UDPServer(log_file=self.log_file)
+        server._lambda_supports_ipv6 = True
+        try:
+            with patch.object(server, "update_client_ip_via_lambda") as mock_update:
+                self.assertEqual(server._decide_update("demo.example.com", None, "2001:4860:4860::8888", "1")[2:], ("not_updated", "dns_already_matches"))
+            mock_update.assert_not_called()
+            self.assertIsNone(server._normalize_global_ipv6("fe80::1"))
+        finally:
+            server.server_socket.close()
+
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.getaddrinfo")
+    def test_aaaa_is_not_sent_to_a_lambda_without_ipv6_support(self, mock_getaddrinfo, mock_lightsail):
+        mock_getaddrinfo.side_effect = lambda domain_name, port, family: [(None, None, None, None, ("8.8.4.4", 0))] if family == AF_INET else [(None, None, None, None, ("2001:4860:4860::8844", 0, 0, 0))]
+        server = UDPServer(log_file=self.log_file)
+        try:
+            with patch.object(server, "update_client_ip_via_lambda", return_value=True) as mock_update:
+                self.assertEqual(server._decide_update("demo.example.com", "8.8.8.8", "2001:4860:4860::8888", "1")[1:], ("mismatch", "updated", "dns_not_match_update_sent"))
+                self.assertEqual(server._decide_update("v6.example.com", None, "2001:4860:4860::8888", "1")[2:], ("not_updated", "ipv6_update_unsupported"))
+            mock_update.assert_called_once_with("8.8.8.8", "1", domain_name="demo.example.com")
+        finally:
+            server.server_socket.close()
+
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.UDPServer.get_ipv4", return_value="1.2.3.4")
+    @patch("UDPServer.UDPServer.get_ipv6", return_value="::1")
+    @patch("UDPServer.requests.post")
+    def test_lambda_payload_carries_both_addresses(self, mock_post, mock_get_ipv6, mock_get_ipv4, mock_lightsail):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"message": "DNS record updated successfully!"}
+        server = UDPServer(log_file=self.log_file)
+        server.lambda_url = "http://lambda.local/"
+        try:
+            self.assertTrue(server.update_client_ip_via_lambda("8.8.8.8", "1", domain_name="demo.example.com", client_ipv6="2001:4860:4860::8888"))
+            self.assertEqual(mock_post.call_args.kwargs["json"], {"client_ip": "8.8.8.8", "connectivity": "1", "domain_name": "demo.example.com", "client_ipv6": "2001:4860:4860::8888"})
+            server.update_client_ip_via_lambda(None, "1", domain_name="demo.example.com", client_ipv6="2001:4860:4860::8888")
+            self.assertNotIn("client_ip", mock_post.call_args.kwargs["json"])
+        finally:
+            server.server_socket.close()
+
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.UDPServer.get_ipv4", return_value="1.2.3.4")
+    @patch("UDPServer.UDPServer.get_ipv6", return_value="::1")
+    def test_packed_datagram_handles_every_report(self, mock_get_ipv6, mock_get_ipv4, mock_lightsail):
+        server = UDPServer(log_file=self.log_file)
+        try:
+            with patch.object(server, "_decide_update", return_value=("8.8.8.8", "match", "not_updated", "dns_already_matches")) as mock_decide, patch("builtins.print"):
+                server._handle_datagram(b"a.example.com,v4,8.8.8.8,1;b.example.com,v4,8.8.4.4,1,2001:4860:4860::8888\n", "9.9.9.9", 5000)
+            self.assertEqual([call.args for call in mock_decide.call_args_list], [("a.example.com", "8.8.8.8", None, "1"), ("b.example.com", "8.8.4.4", "2001:4860:4860::8888", "1")])
+        finally:
+            server.server_socket.close()
+
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.getaddrinfo", return_value=[(None, None, None, None, ("8.8.4.4", 0))])
+    def test_repeat_reports_are_suppressed_while_update_propagates(self, mock_getaddrinfo, mock_lightsail):
+        clock = VirtualClock(1_700_000_000)
+        server = UDPServer(log_file=self.log_file, clock=clock)
+        server._dns_record_ttl["demo.example.com"] = 120
+        try:
+            with patch.object(server, "update_client_ip_via_lambda", return_value=True) as mock_update:
+                self.assertEqual(server._decide_update("demo.example.com", "8.8.8.8", None, "1")[2:], ("updated", "dns_not_match_update_sent"))
+                clock.advance(60)
+                self.assertEqual(server._decide_update("demo.example.com", "8.8.8.8", None, "1")[2:], ("not_updated", "update_propagating"))
+                self.assertEqual(server._decide_update("demo.example.com", "1.1.1.1", None, "1")[2:], ("updated", "dns_not_match_update_sent"))
+                clock.advance(121)
+                self.assertEqual(server._decide_update("demo.example.com", "1.1.1.1", None, "1")[2:], ("updated", "dns_not_match_update_sent"))
+            self.assertEqual(mock_update.call_count, 3)
+        finally:
+            server.server_socket.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,40 @@
+import ipaddress
+import random
+import unittest
+
+from FastIPv4 import _SPECIAL_BLOCKS, is_global_ipv4, normalize_global_ipv4, normalize_ipv4, parse_ipv4
+
+
+def reference_normalize(text):
+    try:
+        return str(ipaddress.IPv4Address(text.strip()))
+    except Exception:
+        return None
+
+
+class TestFastIPv4(unittest.TestCase):
+    def test_global_check_matches_ipaddress_at_every_boundary(self):
+        values = set()
+        for block in _SPECIAL_BLOCKS:
+            network = ipaddress.IPv4Network(block)
+            for edge in (int(network.network_address), int(network.broadcast_address)):
+                values.update(value for value in (edge - 1, edge, edge + 1) if 0 <= value < 1 << 32)
+        values.update(random.Random(44).randrange(1 << 32) for _ in range(20000))
+        for value in sorted(values):
+            self.assertEqual(is_global_ipv4(value), ipaddress.IPv4Address(value).is_global, str(ipaddress.IPv4Address(value)))
+
+    def test_parsing_matches_ipaddress(self):
+        samples = ["8.8.8.8", " 8.8.8.8\n", "0.0.0.0", "255.255.255.255", "256.1.1.1", "01.2.3.4", "1.2.3", "1.2.3.4.5", "1..3.4", "1.2.3.-4", "+1.2.3.4", "1.2.3.4 ", "١.2.3.4", "1.2.3.0004", "", "a.b.c.d", "::1", "1.2.3.4/32"]
+        for text in samples:
+            self.assertEqual(normalize_ipv4(text), reference_normalize(text), repr(text))
+            expected = reference_normalize(text)
+            self.assertEqual(normalize_global_ipv4(text), expected if expected and ipaddress.IPv4Address(expected).is_global else None, repr(text))
+
+    def test_non_text_input(self):
+        self.assertIsNone(normalize_global_ipv4(None))
+        self.assertIsNone(normalize_ipv4(b"8.8.8.8"))
+        self.assertEqual(parse_ipv4("1.2.3.4"), 0x01020304)
+
+
+if __name__ == "__main__":
+    unittest.main()
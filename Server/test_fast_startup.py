@@ -0,0 +1,35 @@
+import unittest
+
+from server_test_support import ServerTestCase
+
+
+class TestFastStartup(ServerTestCase):
+    def test_constructor_does_not_discover_ips(self):
+        server = self.make_server(port=0)
+        self.mock_get_ipv4.assert_not_called()
+        self.mock_get_ipv6.assert_not_called()
+        self.assertEqual([name for name, _ in server._startup_phases], ["init"])
+
+    def test_socket_is_bound_before_ip_discovery(self):
+        server = self.make_server(port=0)
+        order = []
+        server.start_receive_thread = lambda: order.append(("receive", server._server_socket_bound))
+        server.start_ip_monitor_thread = lambda: order.append(("ip_monitor", server._server_socket_bound))
+        server.start_exclusion_refresh_thread = lambda: None
+        server.start_remediation_thread = lambda: None
+        server.start_address_watch_thread = lambda: None
+        server.start()
+        self.assertEqual(order, [("receive", True), ("ip_monitor", True)])
+        self.assertNotEqual(server.server_socket.getsockname()[1], 0)
+        self.assertEqual([name for name, _ in server._startup_phases], ["init", "bind", "receive_ready", "threads_started"])
+        with open(self.log_file) as f:
+            self.assertIn("[startup] init=", f.read())
+
+    def test_phase_formatting(self):
+        server = self.make_server(port=0)
+        server._startup_phases = [("bind", 1.2), ("ip_discovery", 2500.4)]
+        self.assertEqual(server._format_startup_phases(), "bind=1ms ip_discovery=2500ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
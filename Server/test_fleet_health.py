@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch
+
+from Clock import VirtualClock
+from FleetHealth import FleetHealth
+from server_test_support import ServerTestCase
+
+
+class TestFleetHealth(unittest.TestCase):
+    def test_disconnected_after_full_window_of_zero(self):
+        health = FleetHealth(window_seconds=300)
+        health.record("a.example.com", False, 1000)
+        self.assertFalse(health.is_disconnected("a.example.com", 1299))
+        health.record("a.example.com", False, 1300)
+        self.assertTrue(health.is_disconnected("a.example.com", 1300))
+
+    def test_reachable_sample_breaks_zero_run(self):
+        health = FleetHealth(window_seconds=300)
+        health.record("a.example.com", False, 1000)
+        health.record("a.example.com", True, 1200)
+        health.record("a.example.com", False, 1260)
+        self.assertFalse(health.is_disconnected("a.example.com", 1500))
+        self.assertTrue(health.is_disconnected("a.example.com", 1560))
+
+    def test_ring_buffer_wraps_without_growing(self):
+        health = FleetHealth(window_seconds=300, samples_per_client=4)
+        for index in range(10):
+            health.record("a.example.com", index % 2 == 0, 1000 + index * 60)
+        self.assertEqual(len(health._times), 4 * health._max_clients)
+        self.assertEqual(health.reachability("a.example.com", 1540), 0.5)
+
+    def test_quorum_counts_only_active_clients(self):
+        health = FleetHealth(window_seconds=300, active_seconds=900)
+        health.record("stale.example.com", True, 0)
+        health.record("a.example.com", False, 1000)
+        health.record("a.example.com", False, 1300)
+        health.record("b.example.com", True, 1300)
+        self.assertEqual(health.quorum(1300), (1, 2))
+
+    def test_evicts_stale_client_when_full(self):
+        health = FleetHealth(max_clients=1, active_seconds=900)
+        self.assertTrue(health.record("a.example.com", True, 0))
+        self.assertFalse(health.record("b.example.com", True, 100))
+        self.assertTrue(health.record("b.example.com", True, 1000))
+        self.assertIsNone(health.reachability("a.example.com", 1000))
+
+
+class TestFleetQuorumTrigger(ServerTestCase):
+    def setUp(self):
+        self.clock = VirtualClock(1000)
+        self.server = self.make_server(clock=self.clock)
+        self.server._replace_quorum_fraction = 0.5
+
+    def _report(self, client, reachable, now):
+        self.server._fleet_health.record(client, reachable, now)
+
+    def test_single_client_outage_does_not_replace(self):
+        for client in ["8.8.4.4", "1.1.1.1"]:
+            self._report(client, True, 1300)
+        self._report("8.8.8.8", False, 1000)
+        self._report("8.8.8.8", False, 1300)
+        self.clock.set(1300)
+        with patch.object(self.server, "request_instance_ip_replacement") as mock_request:
+            self.assertFalse(self.server._check_fleet_quorum("8.8.8.8", "a.example.com"))
+            mock_request.assert_not_called()
+
+    def test_quorum_outage_requests_replacement(self):
+        self._report("1.1.1.1", True, 1300)
+        for client in ["8.8.8.8", "8.8.4.4"]:
+            self._report(client, False, 1000)
+            self._report(client, False, 1300)
+        self.clock.set(1300)
+        with patch.object(self.server, "request_instance_ip_replacement", return_value=True) as mock_request:
+            self.assertTrue(self.server._check_fleet_quorum("8.8.8.8", "a.example.com"))
+            mock_request.assert_called_once_with("quorum:2/3:8.8.8.8(a.example.com)")
+
+    def test_one_host_reporting_many_domains_counts_once(self):
+        # One disconnected host with five domains among two healthy single-domain hosts: 1/3, not 5/7.
+        packed = ";".join(f"d{index}.example.com,v4,8.8.8.8,0" for index in range(5)).encode()
+        with patch.object(self.server, "_decide_update", return_value=("8.8.8.8", "match", "not_updated", "dns_already_matches")), patch.object(self.server, "request_instance_ip_replacement") as mock_request:
+            for now in (1000, 1150, 1300):
+                self.clock.set(now)
+                self.server._handle_datagram(packed, "9.9.9.9", 40000)
+                self.server._handle_datagram(b"e.example.com,v4,8.8.4.4,1", "1.1.1.1", 40000)
+                self.server._handle_datagram(b"f.example.com,v4,8.8.4.4,1", "1.0.0.1", 40000)
+            mock_request.assert_not_called()
+        self.assertEqual(self.server._fleet_health.quorum(1300), (1, 3))
+        self.assertEqual(self.server._fleet_health._counts[self.server._fleet_health._slots["9.9.9.9"]], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from Clock import VirtualClock
+from FleetSimulation import run_simulation
+
+
+class TestVirtualClock(unittest.TestCase):
+    def test_sleep_advances_without_blocking(self):
+        clock = VirtualClock(100)
+        clock.sleep(3600)
+        self.assertEqual(clock.time(), 3700)
+        clock.set(50)
+        self.assertEqual(clock.monotonic(), 3700)
+
+
+class TestFleetSimulation(unittest.TestCase):
+    def test_same_seed_gives_same_result(self):
+        scenario = {"clients": 3, "hours": 2, "seed": 7, "loss": 0.05, "lambda_failure": 0.2, "ip_changes_per_day": 24}
+        self.assertEqual(run_simulation(**scenario), run_simulation(**scenario))
+
+    def test_ip_changes_are_published_within_a_few_cycles(self):
+        result = run_simulation(clients=3, hours=4, seed=3, ip_changes_per_day=12)
+        self.assertGreater(result["ip_changes"], 0)
+        self.assertEqual(result["ip_changes_undetected"], 0)
+        self.assertEqual(result["dns_updates"], result["ip_changes"])
+        self.assertLessEqual(result["ip_change_detection"]["max_seconds"], 120)
+
+    def test_blocked_server_is_replaced_once(self):
+        result = run_simulation(clients=4, hours=2, seed=5, ip_changes_per_day=0, block_at_hours=[0.5])
+        self.assertEqual(result["replacements"], 1)
+        self.assertFalse(result["blocked_at_end"])
+        self.assertGreaterEqual(result["block_detection"]["max_seconds"], 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import signal
+import threading
+import unittest
+from unittest.mock import patch
+
+from FlightRecorder import FlightRecorder, SamplingProfiler
+from server_test_support import ServerTestCase
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def test_ring_buffer_keeps_newest_spans(self):
+        recorder = FlightRecorder(capacity=3)
+        for index, stage in enumerate(["decode", "dns", "lambda", "log"]):
+            recorder.record(stage, float(index), 0.001 * (index + 1))
+        self.assertEqual([stage for stage, _, _ in recorder.spans()], ["dns", "lambda", "log"])
+        self.assertEqual(recorder.dump()[0], "+0.000ms dns 2.000ms")
+
+    def test_summary_per_stage(self):
+        recorder = FlightRecorder(capacity=100)
+        for duration in [0.001, 0.002, 0.003, 0.010]:
+            recorder.record("dns", 0.0, duration)
+        self.assertEqual(recorder.summary()["dns"], {"count": 4, "mean_ms": 4.0, "p50_ms": 3.0, "p95_ms": 10.0, "max_ms": 10.0})
+
+    def test_span_context_manager_uses_clock(self):
+        ticks = iter([10.0, 10.25])
+        recorder = FlightRecorder(capacity=4, clock=lambda: next(ticks))
+        with recorder.span("lambda"):
+            pass
+        self.assertEqual(recorder.spans(), [("lambda", 10.0, 0.25)])
+
+
+    def test_concurrent_records_are_all_kept(self):
+        recorder = FlightRecorder(capacity=8 * 500)
+        threads = [threading.Thread(target=lambda stage=f"stage{index}": [recorder.record(stage, 0.0, 0.001) for _ in range(500)]) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual({stage: row["count"] for stage, row in recorder.summary().items()}, {f"stage{index}": 500 for index in range(8)})
+        self.assertEqual({name: recorder._stage_names[stage_id] for name, stage_id in recorder._stage_index.items()}, {f"stage{index}": f"stage{index}" for index in range(8)})
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_sample_sees_other_threads(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=stop.wait, name="BusyWorker", daemon=True)
+        worker.start()
+        profiler = SamplingProfiler()
+        profiler.sample_once()
+        stop.set()
+        self.assertIn("BusyWorker", [row["thread"] for row in profiler.top(50)])
+
+
+class TestServerTracing(ServerTestCase):
+    def setUp(self):
+        self.server = self.make_server()
+
+    def test_receive_stages_are_recorded(self):
+        with patch.object(self.server, "_domain_points_to_ip", return_value=(False, "1.1.1.1", "mismatch")), patch.object(self.server, "update_client_ip_via_lambda", return_value=True), patch.object(self.server, "_get_excluded_ips", return_value=set()):
+            self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "8.8.4.4", 40000)
+        self.assertEqual(set(self.server._flight_recorder.summary()), {"datagram", "decode", "validate", "dns", "lambda", "log"})
+
+    def test_sigusr1_dumps_trace(self):
+        previous = {signum: signal.getsignal(signum) for signum in (signal.SIGUSR1, signal.SIGUSR2)}
+        for signum, handler in previous.items():
+            self.addCleanup(signal.signal, signum, handler)
+        trace_file = f"{os.path.splitext(self.log_file)[0]}.trace"
+        self.addCleanup(lambda: os.path.exists(trace_file) and os.remove(trace_file))
+        self.server._flight_recorder.record("dns", 1.0, 0.002)
+        self.assertTrue(self.server.install_signal_handlers())
+        os.kill(os.getpid(), signal.SIGUSR1)
+        with open(trace_file) as f:
+            self.assertIn("dns 2.000ms", f.read())
+        with open(self.log_file) as f:
+            self.assertIn("[trace] dns:n=1", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ import os
 # Add the current directory to sys.path to import UDPServer
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from ExclusionIndex import ExclusionIndex, parse_exclusion_targets
 from UDPServer import UDPServer
 
 
@@ -52,5 +53,39 @@ class TestIPExclusion(unittest.TestCase):
         else:
             self.fail(f"Failed to allow {sender_ip_allowed}.")
 
+class TestExclusionIndex(unittest.TestCase):
+    def test_parse_targets_splits_networks_and_domains(self):
+        networks, domains = parse_exclusion_targets("la.qinyupeng.com, 8.8.8.8, 10.0.0.0/8,2001:db8::/32,")
+        self.assertEqual([str(network) for network in networks], ["8.8.8.8/32", "10.0.0.0/8", "2001:db8::/32"])
+        self.assertEqual(domains, ["la.qinyupeng.com"])
+
+    def test_contains_uses_merged_ranges(self):
+        networks, _ = parse_exclusion_targets("1.1.1.0/24,1.1.2.0/24,1.1.1.7,9.9.9.9,2001:db8::/32")
+        index = ExclusionIndex(networks)
+        self.assertEqual(len(index), 3)
+        self.assertTrue(index.contains("1.1.1.0"))
+        self.assertTrue(index.contains("1.1.2.255"))
+        self.assertFalse(index.contains("1.1.3.0"))
+        self.assertTrue(index.contains("9.9.9.9"))
+        self.assertFalse(index.contains("9.9.9.8"))
+        self.assertTrue(index.contains("2001:db8::1"))
+        self.assertFalse(index.contains("not-an-ip"))
+
+    @patch("UDPServer.LightSail")
+    @patch("UDPServer.UDPServer.get_ipv4", return_value="1.2.3.4")
+    @patch("UDPServer.UDPServer.get_ipv6", return_value="::1")
+    @patch("UDPServer.gethostbyname", return_value="8.8.8.8")
+    def test_receive_path_exclusion_reason(self, mock_gethostbyname, mock_get_ipv6, mock_get_ipv4, mock_lightsail):
+        with patch.dict(os.environ, {"EXCLUDED_TARGETS": "la.qinyupeng.com,203.0.113.0/24"}):
+            server = UDPServer(log_file="test_udp_server.log")
+        try:
+            self.assertEqual(server._exclusion_reason("203.0.113.9", "1.1.1.1"), "excluded_sender_ip")
+            self.assertIsNone(server._exclusion_reason("1.1.1.1", "8.8.8.8"))
+            server._get_excluded_ips()
+            self.assertEqual(server._exclusion_reason("1.1.1.1", "8.8.8.8"), "excluded_reported_ip")
+        finally:
+            server.server_socket.close()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from LogAnalyzer import LogAnalyzer
+
+SERVER_LOG = """[2024-10-19 10:00:00] UDP server started on port 7171.
+[2024-10-19 10:00:05] [client=8.8.8.8] [domain=a.example.com@1.1.1.1] -> [server=timov4.qyp.life@9.9.9.9] [action=updated:dns_not_match_update_sent]||
+[2024-10-19 10:01:05] [client=8.8.8.8] [domain=a.example.com@8.8.8.8] -> [server=timov4.qyp.life@9.9.9.9] [action=not_updated:dns_already_matches]||
+[2024-10-19 10:02:05] [client=8.8.4.4] [domain=a.example.com@8.8.8.8] -> [server=timov4.qyp.life@9.9.9.9] [action=not_updated:lambda_call_failed]||
+[2024-10-19 10:02:06] [client=0.0.0.0] [domain=b.example.com@-] -> [server=-@-] [action=not_updated:invalid_reported_non_global_ip]||
+"""
+
+CLIENT_LOG = """[2024-10-19 10:00:00] [client=8.8.8.8(source=https://ifconfig.me/ip)] [domain=a.example.com@8.8.8.8] [connectivity=connected(timov4.qyp.life@9.9.9.9)]||
+[2024-10-19 10:01:00] [client=8.8.8.8(source=https://ifconfig.me/ip)] [domain=a.example.com@8.8.8.8] [connectivity=disconnected(5/300)]||
+[2024-10-19 10:02:00] [client=8.8.8.8(source=https://ifconfig.me/ip)] [domain=a.example.com@8.8.8.8] [connectivity=disconnected(65/300)]||
+[2024-10-19 10:03:00] [client=8.8.4.4(source=dns:a.example.com)] [domain=a.example.com@8.8.4.4] [connectivity=connected(timov4.qyp.life@9.9.9.9)]||"""
+
+
+class TestLogAnalyzer(unittest.TestCase):
+    def _write(self, content):
+        fd, path = tempfile.mkstemp(suffix=".log")
+        with os.fdopen(fd, "w") as file_handle:
+            file_handle.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_server_log_aggregates(self):
+        analyzer = LogAnalyzer()
+        analyzer.analyze_file(self._write(SERVER_LOG))
+        report = analyzer.report()
+        self.assertEqual(report["total_lines"], 5)
+        self.assertEqual(report["unparsed_lines"], 1)
+        domain = report["domains"]["a.example.com"]
+        self.assertEqual(domain["updates"], 1)
+        self.assertEqual(domain["lambda_failures"], 1)
+        self.assertEqual(domain["lambda_failure_rate"], 0.5)
+        self.assertEqual(domain["ip_changes"], 1)
+        # The reported client address, not the DNS answer (8.8.8.8 on the last line).
+        self.assertEqual(domain["last_ip"], "8.8.4.4")
+        self.assertEqual(report["actions"]["not_updated:invalid_reported_non_global_ip"], 1)
+
+    def test_client_log_connectivity_timeline(self):
+        analyzer = LogAnalyzer(timeline_limit=2)
+        analyzer.analyze_file(self._write(CLIENT_LOG))
+        domain = analyzer.report()["domains"]["a.example.com"]
+        self.assertEqual(domain["lines"], 4)
+        self.assertEqual(domain["ip_changes"], 1)
+        self.assertEqual(domain["actions"], {"report:connected": 2, "report:disconnected": 2})
+        self.assertEqual(domain["connectivity_timeline"], [("2024-10-19 10:01:00", "disconnected"), ("2024-10-19 10:03:00", "connected")])
+
+    def test_json_lines_server_log(self):
+        analyzer = LogAnalyzer()
+        analyzer.analyze_file(self._write('{"ts": "2024-10-19 10:00:00", "msg": "UDP server started on port 7171."}\n{"ts": "2024-10-19 10:00:05", "client": "8.8.8.8", "domain": "a.example.com", "domain_ip": "1.1.1.1", "server": "-", "server_ip": "-", "action": "not_updated", "reason": "lambda_call_failed"}\n'))
+        report = analyzer.report()
+        self.assertEqual(report["unparsed_lines"], 1)
+        self.assertEqual(report["domains"]["a.example.com"]["lambda_failures"], 1)
+        self.assertEqual(report["domains"]["a.example.com"]["last_ip"], "8.8.8.8")
+
+    def test_empty_file(self):
+        analyzer = LogAnalyzer()
+        analyzer.analyze_file(self._write(""))
+        self.assertEqual(analyzer.report()["total_lines"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
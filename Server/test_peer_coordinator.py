@@ -0,0 +1,152 @@
+import json
+import unittest
+from socket import AF_INET, AF_INET6
+from unittest.mock import patch
+
+from PeerCoordinator import PeerCoordinator, parse_peer_addresses
+from server_test_support import ServerTestCase
+
+SECRET = "test-secret"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPeerCoordinator(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.servers = {server_id: PeerCoordinator(server_id, SECRET, peer_timeout_seconds=15, handoff_grace_seconds=30, clock=self.clock, wall_clock=self.clock) for server_id in ("s1", "s2", "s3")}
+        self._exchange_heartbeats()
+
+    def _exchange_heartbeats(self, silent=()):
+        for sender_id, sender in self.servers.items():
+            if sender_id in silent:
+                continue
+            for receiver_id, receiver in self.servers.items():
+                if receiver_id != sender_id:
+                    receiver.handle_message(sender.heartbeat_message())
+
+    def _domain_owned_by(self, owner):
+        return next(f"d{index}.qyp.life" for index in range(100) if self.servers["s1"].owner(f"d{index}.qyp.life") == owner)
+
+    def test_exactly_one_server_holds_each_lease(self):
+        for index in range(20):
+            domain_name = f"d{index}.qyp.life"
+            decisions = [coordinator.should_update(domain_name, "8.8.8.8,-")[0] for coordinator in self.servers.values()]
+            self.assertEqual(decisions.count(True), 1)
+
+    def test_handled_announcement_suppresses_peers(self):
+        domain_name = self._domain_owned_by("s2")
+        announcement = self.servers["s2"].handled_message(domain_name, "8.8.8.8,-")
+        self.servers["s1"].handle_message(announcement)
+        self.assertEqual(self.servers["s1"].should_update(domain_name, "8.8.8.8,-"), (False, "handled_by_peer:s2"))
+        self.assertEqual(self.servers["s1"].should_update(domain_name, "8.8.4.4,-"), (False, "deferred_to_peer:s2"))
+
+    def test_lease_fails_over_when_owner_goes_silent(self):
+        domain_name = self._domain_owned_by("s2")
+        self.clock.now += 20
+        self._exchange_heartbeats(silent=("s2",))
+        new_owner = self.servers["s1"].owner(domain_name)
+        self.assertNotEqual(new_owner, "s2")
+        self.assertEqual(self.servers[new_owner].should_update(domain_name, "8.8.8.8,-"), (True, "lease_held"))
+
+    def test_non_owner_updates_after_grace(self):
+        domain_name = self._domain_owned_by("s2")
+        self.assertEqual(self.servers["s1"].should_update(domain_name, "8.8.8.8,-"), (False, "deferred_to_peer:s2"))
+        self.clock.now += 10
+        self._exchange_heartbeats()
+        self.clock.now += 21
+        self._exchange_heartbeats()
+        self.assertEqual(self.servers["s1"].should_update(domain_name, "8.8.8.8,-"), (True, "lease_handoff_grace_expired"))
+
+    def test_garbage_is_not_a_peer_message(self):
+        self.assertIsNone(self.servers["s1"].handle_message(b"a.qyp.life,v4,8.8.8.8,1"))
+
+    def test_forged_message_is_rejected(self):
+        forged = PeerCoordinator("s9", "wrong-secret", clock=self.clock, wall_clock=self.clock)
+        self.assertIsNone(self.servers["s1"].handle_message(forged.heartbeat_message()))
+        self.assertNotIn("s9", self.servers["s1"].live_members())
+
+    def test_unsigned_message_is_rejected(self):
+        body = json.dumps({"type": "heartbeat", "server": "s9", "ts": self.clock.now}).encode()
+        self.assertIsNone(self.servers["s1"].handle_message(body))
+        self.assertIsNone(self.servers["s1"].handle_message(b"0" * 64 + b" " + body))
+
+    def test_stale_message_is_rejected(self):
+        heartbeat = self.servers["s2"].heartbeat_message()
+        self.clock.now += 61
+        self.assertIsNone(self.servers["s1"].handle_message(heartbeat))
+
+    def test_empty_secret_is_refused(self):
+        with self.assertRaises(ValueError):
+            PeerCoordinator("s1", "")
+
+    def test_parse_peer_addresses(self):
+        self.assertEqual(parse_peer_addresses("a.qyp.life, 10.0.0.2:9000,[2001:db8::1]:9001", 7172), [("a.qyp.life", 7172), ("10.0.0.2", 9000), ("2001:db8::1", 9001)])
+
+
+class TestLeasedUpdateDecision(ServerTestCase):
+    def test_non_owner_defers_without_calling_lambda(self):
+        server = self.make_server()
+        server._peer_coordinator = PeerCoordinator("s1", SECRET)
+        server._peer_coordinator.handle_message(PeerCoordinator("s2", SECRET).heartbeat_message())
+        domain_name = next(f"d{index}.qyp.life" for index in range(100) if server._peer_coordinator.owner(f"d{index}.qyp.life") == "s2")
+        with patch.object(server, "_domain_points_to_ip", return_value=(False, "1.1.1.1", "mismatch")), patch.object(server, "update_client_ip_via_lambda") as mock_update:
+            self.assertEqual(server._decide_update(domain_name, "8.8.8.8", None, "1"), ("1.1.1.1", "mismatch", "not_updated", "deferred_to_peer:s2"))
+        mock_update.assert_not_called()
+
+
+class TestPeerTransport(ServerTestCase):
+    def _server(self, **env):
+        with patch.dict("os.environ", {"PEER_SERVERS": "peer.qyp.life,[2001:db8::2]:7173", "SERVER_ID": "s1", **env}):
+            return self.make_server()
+
+    def test_peers_disabled_without_secret(self):
+        server = self._server()
+        self.assertIsNone(server._peer_coordinator)
+        with open(self.log_file) as log:
+            self.assertIn("PEER_SECRET is not set", log.read())
+
+    def test_peers_resolve_to_targets_and_allowed_sources(self):
+        server = self._server(PEER_SECRET=SECRET)
+        infos = {"peer.qyp.life": [(AF_INET, 2, 17, "", ("10.0.0.2", 7172))], "2001:db8::2": [(AF_INET6, 2, 17, "", ("2001:db8::2", 7173, 0, 0))]}
+        with patch("UDPServer.getaddrinfo", side_effect=lambda host, *args: infos[host]):
+            server._resolve_peers()
+        self.assertEqual(server._peer_targets, [(AF_INET, ("10.0.0.2", 7172)), (AF_INET6, ("2001:db8::2", 7173))])
+        self.assertTrue(server._is_peer_source("10.0.0.2"))
+        self.assertTrue(server._is_peer_source("2001:db8::2"))
+        self.assertFalse(server._is_peer_source("10.0.0.3"))
+
+    def test_datagram_from_non_peer_is_dropped(self):
+        server = self._server(PEER_SECRET=SECRET)
+        with patch("UDPServer.getaddrinfo", return_value=[(AF_INET, 2, 17, "", ("10.0.0.2", 7172))]):
+            server._resolve_peers()
+        heartbeat = PeerCoordinator("s2", SECRET).heartbeat_message()
+        self.assertIsNone(server._handle_peer_datagram(heartbeat, "10.0.0.3"))
+        self.assertNotIn("s2", server._peer_coordinator.live_members())
+        self.assertEqual(server._handle_peer_datagram(heartbeat, "10.0.0.2"), "s2")
+
+    def test_ipv6_peers_are_sent_through_the_ipv6_socket(self):
+        server = self._server(PEER_SECRET=SECRET)
+        server._peer_targets = [(AF_INET, ("10.0.0.2", 7172)), (AF_INET6, ("2001:db8::2", 7173))]
+        sent = {AF_INET: [], AF_INET6: []}
+
+        class FakeSocket:
+            def __init__(self, family):
+                self.family = family
+
+            def sendto(self, message, address):
+                sent[self.family].append(address)
+
+        server._peer_sockets = {AF_INET: FakeSocket(AF_INET), AF_INET6: FakeSocket(AF_INET6)}
+        server._send_to_peers(b"message")
+        self.assertEqual(sent, {AF_INET: [("10.0.0.2", 7172)], AF_INET6: [("2001:db8::2", 7173)]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import patch
+
+from server_test_support import ServerTestCase
+
+
+class TestRemediationWorker(ServerTestCase):
+    def setUp(self):
+        self.server = self.make_server()
+        self.server._remediation_cooldown_seconds = 600
+
+    def test_concurrent_triggers_merge_into_single_flight(self):
+        with patch.object(self.server, "replace_instance_ip") as mock_replace:
+            self.assertTrue(self.server.request_instance_ip_replacement("connectivity_0:a.example.com"))
+            self.assertFalse(self.server.request_instance_ip_replacement("connectivity_0:b.example.com"))
+            self.assertTrue(self.server._remediation_wakeup.is_set())
+            self.assertTrue(self.server._run_pending_remediation())
+            self.assertFalse(self.server._run_pending_remediation())
+            self.assertEqual(mock_replace.call_count, 1)
+
+    def test_finished_replacement_wakes_the_ip_monitor(self):
+        with patch.object(self.server, "replace_instance_ip"):
+            self.server.request_instance_ip_replacement("quorum:2/3:8.8.8.8")
+            self.assertFalse(self.server._address_changed.is_set())
+            self.server._run_pending_remediation()
+        self.assertTrue(self.server._address_changed.is_set())
+
+    def test_trigger_during_flight_is_merged(self):
+        def replace():
+            self.assertFalse(self.server.request_instance_ip_replacement("connectivity_0:b.example.com"))
+
+        with patch.object(self.server, "replace_instance_ip", side_effect=replace) as mock_replace:
+            self.server.request_instance_ip_replacement("connectivity_0:a.example.com")
+            self.server._run_pending_remediation()
+            self.assertEqual(mock_replace.call_count, 1)
+            self.assertEqual(self.server._remediation_pending, [])
+
+    def test_cooldown_blocks_until_elapsed(self):
+        with patch.object(self.server, "replace_instance_ip"), patch("UDPServer.time.time", return_value=1000):
+            self.server.request_instance_ip_replacement("connectivity_0:a.example.com")
+            self.server._run_pending_remediation()
+        with patch("UDPServer.time.time", return_value=1599):
+            self.assertFalse(self.server.request_instance_ip_replacement("connectivity_0:a.example.com"))
+        with patch("UDPServer.time.time", return_value=1600):
+            self.assertTrue(self.server.request_instance_ip_replacement("connectivity_0:a.example.com"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+
+from Clock import VirtualClock
+from server_test_support import ServerTestCase
+
+
+class TestReportHints(ServerTestCase):
+    def setUp(self):
+        self.clock = VirtualClock(1_700_000_000)
+        self.server = self.make_server(clock=self.clock)
+
+    def test_hints_spread_clients_over_the_interval(self):
+        phases = set()
+        for index in range(200):
+            hint = self.server._next_report_hint(f"c{index}.example.com")
+            self.assertGreaterEqual(hint, 30)
+            self.assertLess(hint, 90)
+            phases.add((int(self.clock.time()) + hint) % 60)
+        self.assertGreater(len(phases), 50)
+
+    def test_same_client_keeps_its_phase(self):
+        first = self.server._next_report_hint("a.example.com")
+        self.clock.advance(first)
+        self.assertEqual(self.server._next_report_hint("a.example.com"), 60)
+
+    def test_overload_stretches_interval(self):
+        self.server._report_capacity_per_second = 1
+        for _ in range(60 * 4):
+            self.server._record_arrival()
+        hint = self.server._next_report_hint("a.example.com")
+        self.assertGreaterEqual(hint, 120)
+        self.assertLess(hint, 360)
+
+    def test_datagram_returns_hint_and_rate_limited_sender_gets_maximum_once(self):
+        with patch.object(self.server, "_handle_report"):
+            self.assertEqual(self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "8.8.4.4", 40000), self.server._next_report_hint("a.example.com"))
+            self.server._rate_limit_per_minute = 1
+            self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "1.1.1.1", 40000)
+            self.assertEqual(self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "1.1.1.1", 40000), 600)
+            # Further drops within the minute get no reply at all.
+            self.assertIsNone(self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "1.1.1.1", 40000))
+            self.clock.advance(30)
+            self.assertIsNone(self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "1.1.1.1", 40000))
+        self.server._report_hints_enabled = False
+        with patch.object(self.server, "_handle_report"):
+            self.assertIsNone(self.server._handle_datagram(b"b.example.com,v4,8.8.8.8,1", "9.9.9.9", 40000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import patch
+
+from Clock import VirtualClock
+from server_test_support import ServerTestCase
+
+
+class TestRuntimeConfig(ServerTestCase):
+    def setUp(self):
+        self.clock = VirtualClock(1000)
+        self.server = self.make_server(clock=self.clock)
+        self.server._admin_token = "admin-secret"
+
+    def test_set_applies_all_changes_and_audits(self):
+        reply = self.server._handle_admin_command("admin-secret set ip_monitor_interval_seconds=120 replace_quorum_fraction=0.75")
+        self.assertEqual(reply["applied"]["ip_monitor_interval_seconds"]["new"], 120)
+        self.assertEqual(self.server._ip_monitor_interval_seconds, 120)
+        self.assertEqual(self.server._replace_quorum_fraction, 0.75)
+        audit = self.server._handle_admin_command("admin-secret config audit")["audit"]
+        self.assertEqual([(entry["setting"], entry["new"]) for entry in audit], [("ip_monitor_interval_seconds", 120), ("replace_quorum_fraction", 0.75)])
+        with open(self.log_file) as f:
+            self.assertIn("[config] ip_monitor_interval_seconds: 60 -> 120 (source=admin)", f.read())
+
+    def test_admin_commands_need_the_token(self):
+        self.assertEqual(self.server._handle_admin_command("set rate_limit_per_minute=5"), {"error": "unauthorized"})
+        self.assertEqual(self.server._handle_admin_command("wrong-secret config"), {"error": "unauthorized"})
+        self.assertEqual(self.server._rate_limit_per_minute, 0)
+        self.server._admin_token = ""
+        self.assertIn("disabled until ADMIN_TOKEN is set", self.server._handle_admin_command("set rate_limit_per_minute=5")["error"])
+        self.assertIn("rate_limit_per_minute", self.server._handle_admin_command("config"))
+
+    def test_lambda_url_is_not_settable(self):
+        self.assertEqual(self.server.apply_config({"lambda_url": "http://attacker.example/"})[1], {"lambda_url": "unknown setting"})
+
+    def test_invalid_value_rejects_whole_change(self):
+        reply = self.server._handle_admin_command("admin-secret set ip_monitor_interval_seconds=120 replace_quorum_fraction=2")
+        self.assertEqual(reply["invalid"], {"replace_quorum_fraction": "must be between 0 and 1"})
+        self.assertEqual(self.server._ip_monitor_interval_seconds, 60)
+        self.assertIn("unknown setting", self.server._handle_admin_command("admin-secret set no_such_setting=1")["invalid"]["no_such_setting"])
+
+    def test_exclusions_take_effect_immediately(self):
+        self.assertIsNone(self.server._exclusion_reason("203.0.113.7", "8.8.8.8"))
+        self.server.apply_config({"excluded_targets": "203.0.113.0/24,blocked.example.com"})
+        self.assertEqual(self.server._exclusion_reason("203.0.113.7", "8.8.8.8"), "excluded_sender_ip")
+        self.assertEqual(self.server.excluded_domains, ["blocked.example.com"])
+        self.assertEqual(self.server.excluded_ips_cache["last_updated"], 0)
+        self.assertTrue(self.server._exclusion_refresh_wakeup.is_set())
+
+    def test_new_exclusions_drop_addresses_of_old_domains(self):
+        self.server.excluded_domains = ["old.example.com"]
+        with patch("UDPServer.gethostbyname", return_value="198.51.100.1"):
+            self.server._get_excluded_ips()
+        self.assertEqual(self.server._exclusion_reason("198.51.100.1"), "excluded_sender_ip")
+        self.server.apply_config({"excluded_targets": "new.example.com"})
+        self.assertIsNone(self.server._exclusion_reason("198.51.100.1"))
+        with patch("UDPServer.gethostbyname", return_value="198.51.100.2"):
+            self.assertEqual(self.server._get_excluded_ips(), {"198.51.100.2"})
+        self.assertEqual(self.server._exclusion_reason("198.51.100.2"), "excluded_sender_ip")
+
+    def test_refresh_racing_a_config_change_is_discarded(self):
+        self.server.excluded_domains = ["old.example.com"]
+
+        def resolve(domain):
+            self.server.apply_config({"excluded_targets": "new.example.com"})
+            return "198.51.100.1"
+
+        with patch("UDPServer.gethostbyname", side_effect=resolve):
+            self.server._get_excluded_ips()
+        self.assertEqual(self.server.excluded_ips_cache["ips"], set())
+        self.assertIsNone(self.server._exclusion_reason("198.51.100.1"))
+
+    def test_replacement_uses_configured_instance(self):
+        self.server.apply_config({"lightsail_instance_name": "Edge-2", "lightsail_region": "us-west-2"})
+        self.server.replace_instance_ip()
+        self.mock_lightsail.return_value.replace_ip.assert_called_once_with("us-west-2", "Edge-2")
+
+    def test_rate_limit_per_sender(self):
+        self.server.apply_config({"rate_limit_per_minute": "2"})
+        with patch.object(self.server, "_handle_report") as mock_handle:
+            for _ in range(3):
+                self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "8.8.4.4", 40000)
+            self.server._handle_datagram(b"b.example.com,v4,8.8.8.8,1", "1.1.1.1", 40000)
+            self.assertEqual(mock_handle.call_count, 3)
+            self.clock.advance(30)
+            self.server._handle_datagram(b"a.example.com,v4,8.8.8.8,1", "8.8.4.4", 40000)
+            self.assertEqual(mock_handle.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from ServiceScoreboard import ServiceScoreboard
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestServiceScoreboard(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.board = ServiceScoreboard(alpha=0.5, failure_threshold=2, cooldown_seconds=60, clock=self.clock)
+
+    def test_unsampled_services_keep_given_order(self):
+        self.assertEqual(self.board.order(["a", "b", "c"]), ["a", "b", "c"])
+
+    def test_faster_service_moves_first(self):
+        self.board.record_success("a", 2.0)
+        self.board.record_success("b", 0.1)
+        self.assertEqual(self.board.order(["a", "b"]), ["b", "a"])
+
+    def test_errors_raise_score(self):
+        self.board.record_success("a", 0.1)
+        self.board.record_success("b", 0.2)
+        self.board.record_failure("a")
+        self.assertEqual(self.board.order(["a", "b"]), ["b", "a"])
+
+    def test_circuit_opens_after_threshold_and_half_opens_after_cooldown(self):
+        self.board.record_failure("a")
+        self.assertEqual(self.board.order(["a", "b"]), ["b", "a"])
+        self.board.record_failure("a")
+        self.assertEqual(self.board.order(["a", "b"]), ["b"])
+        self.clock.now += 61
+        self.assertIn("a", self.board.order(["a", "b"]))
+        self.board.record_failure("a")
+        self.assertEqual(self.board.order(["a", "b"]), ["b"])
+        self.clock.now += 61
+        self.board.record_success("a", 0.01)
+        self.assertFalse(self.board.is_open("a"))
+
+    def test_all_open_still_returns_every_service(self):
+        for service in ("a", "b"):
+            self.board.record_failure(service)
+            self.board.record_failure(service)
+        self.assertEqual(sorted(self.board.order(["a", "b"])), ["a", "b"])
+
+    def test_format_shows_latency_error_rate_and_state(self):
+        self.board.record_success("a", 0.25)
+        self.board.record_failure("b")
+        self.board.record_failure("b")
+        self.assertEqual(self.board.format(["a", "b"]), "a=250ms/err=0.00 b=-/err=0.75/open")
+
+
+if __name__ == "__main__":
+    unittest.main()
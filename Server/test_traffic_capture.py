@@ -0,0 +1,134 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ReplayCapture import replay_in_process, replay_to_socket, start_stub_lambda
+from TrafficCapture import MAGIC, CaptureWriter, read_capture
+from server_test_support import ServerTestCase
+
+
+class TestTrafficCapture(unittest.TestCase):
+    def setUp(self):
+        self.capture_dir = tempfile.mkdtemp(prefix="capture_test_")
+        self.path = os.path.join(self.capture_dir, "capture.bin")
+
+    def tearDown(self):
+        for file_name in os.listdir(self.capture_dir):
+            os.remove(os.path.join(self.capture_dir, file_name))
+        os.rmdir(self.capture_dir)
+
+    def test_round_trip_ipv4_and_ipv6_senders(self):
+        writer = CaptureWriter(self.path)
+        writer.write(100.5, "8.8.4.4", 40000, b"a.example.com,v4,8.8.8.8,1")
+        writer.write(101.0, "2001:db8::1", 40001, b"b.example.com,v6,2001:db8::2,1")
+        writer.close()
+        self.assertEqual(list(read_capture(self.path)), [(100.5, "8.8.4.4", 40000, b"a.example.com,v4,8.8.8.8,1"), (101.0, "2001:db8::1", 40001, b"b.example.com,v6,2001:db8::2,1")])
+
+    def test_scoped_ipv6_sender_is_recorded_without_scope(self):
+        writer = CaptureWriter(self.path)
+        writer.write(1.0, "fe80::1%eth0", 40000, b"a.example.com,v6,2001:db8::2,1")
+        writer.close()
+        self.assertEqual([record[1] for record in read_capture(self.path)], ["fe80::1"])
+
+    def test_rotation_keeps_size_cap_and_backups(self):
+        writer = CaptureWriter(self.path, max_bytes=0, backups=2)
+        payload = b"x" * 300
+        for index in range(20):
+            writer.write(float(index), "8.8.4.4", 40000, payload)
+        writer.close()
+        self.assertEqual(sorted(os.listdir(self.capture_dir)), ["capture.bin", "capture.bin.1", "capture.bin.2"])
+        for file_name in os.listdir(self.capture_dir):
+            self.assertLessEqual(os.path.getsize(os.path.join(self.capture_dir, file_name)), writer.max_bytes)
+        newest = [record[0] for record in read_capture(self.path)]
+        self.assertEqual(newest[-1], 19.0)
+
+    def test_truncated_tail_is_ignored(self):
+        writer = CaptureWriter(self.path)
+        writer.write(1.0, "8.8.4.4", 40000, b"a.example.com,v4,8.8.8.8,1")
+        writer.close()
+        with open(self.path, "ab") as f:
+            f.write(b"\x00\x01")
+        self.assertEqual(len(list(read_capture(self.path))), 1)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(len(MAGIC)), MAGIC)
+
+    def test_replay_over_udp_at_full_speed(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1)
+        self.addCleanup(receiver.close)
+        records = [(float(index), "8.8.4.4", 40000, f"c{index}.example.com,v4,8.8.8.8,1".encode()) for index in range(5)]
+        self.assertEqual(replay_to_socket(records, receiver.getsockname(), speed=0), 5)
+        self.assertEqual([receiver.recvfrom(1024)[0] for _ in range(5)], [record[3] for record in records])
+
+    def test_in_process_replay_uses_stub_lambda(self):
+        stub = start_stub_lambda()
+        self.addCleanup(stub.server_close)
+        self.addCleanup(stub.shutdown)
+        records = [(1.0, "8.8.4.4", 40000, b"a.example.com,v4,8.8.8.8,1"), (2.0, "1.1.1.1", 40000, b"b.example.com,v4,1.1.1.1,1")]
+        with patch("UDPServer.UDPServer._domain_points_to_ip", return_value=(False, "9.9.9.9", "mismatch")):
+            handled, stages = replay_in_process(records, 0, f"http://127.0.0.1:{stub.server_port}/")
+        self.assertEqual(handled, 2)
+        self.assertEqual(stub.calls, 2)
+        self.assertEqual(stages["lambda"]["count"], 2)
+
+
+class TestServerCapture(ServerTestCase):
+    def test_receive_loop_records_datagrams(self):
+        server = self.make_server(port=0)
+        server._admin_token = "admin-secret"
+        server._capture_dir = os.path.realpath(tempfile.mkdtemp(prefix="capture_test_"))
+        capture_path = os.path.join(server._capture_dir, "capture.bin")
+        self.addCleanup(os.rmdir, server._capture_dir)
+        self.addCleanup(lambda: os.path.exists(capture_path) and os.remove(capture_path))
+        self.assertEqual(server._handle_admin_command("admin-secret capture start capture.bin"), {"capturing": capture_path})
+        server._bind_server_socket()
+        with patch.object(server, "_handle_datagram", return_value=None):
+            server.start_receive_thread()
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.addCleanup(sender.close)
+            sender.sendto(b"a.example.com,v4,8.8.8.8,1", ("127.0.0.1", server.server_socket.getsockname()[1]))
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline:
+                server._capture.flush()
+                if list(read_capture(capture_path)):
+                    break
+                time.sleep(0.01)
+        server.running = False
+        self.assertEqual(server._handle_admin_command("admin-secret capture stop"), {"capturing": None})
+        self.assertEqual([record[3] for record in read_capture(capture_path)], [b"a.example.com,v4,8.8.8.8,1"])
+
+    def test_capture_start_rejects_paths_outside_capture_dir(self):
+        server = self.make_server()
+        server._admin_token = "admin-secret"
+        server._capture_dir = os.path.realpath(tempfile.gettempdir() + "/capture_test_missing")
+        for name in ("../udp_server.log", "/etc/passwd", ".", "sub/capture.bin"):
+            reply = server._handle_admin_command(f"admin-secret capture start {name}")
+            self.assertIn("capture files must be plain names", reply["error"])
+        self.assertIsNone(server._capture)
+        self.assertFalse(os.path.exists(server._capture_dir))
+
+
+class TestCaptureFailure(ServerTestCase):
+    def test_failed_capture_write_stops_capture_but_not_handling(self):
+        server = self.make_server()
+        capture = MagicMock(path="/full/disk/capture.bin")
+        capture.write.side_effect = OSError(28, "No space left on device")
+        server._capture = capture
+        listener = MagicMock(label="0.0.0.0:7171", errors=0, datagrams=0, bytes=0)
+        listener.socket.recvfrom.side_effect = [(b"a.example.com,v4,8.8.8.8,1", ("8.8.4.4", 40000)), BlockingIOError()]
+        with patch.object(server, "_handle_datagram", return_value=None) as mock_handle:
+            server._receive_from(listener)
+        mock_handle.assert_called_once_with(b"a.example.com,v4,8.8.8.8,1", "8.8.4.4", 40000)
+        self.assertIsNone(server._capture)
+        capture.close.assert_called_once_with()
+        self.assertEqual(listener.errors, 0)
+        with open(self.log_file) as log:
+            self.assertIn("[capture] write to /full/disk/capture.bin failed, capture stopped", log.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import re
+import socket
+import time
+import unittest
+from unittest.mock import patch
+
+from UDPListeners import parse_listen_addresses
+from server_test_support import ServerTestCase
+
+
+def _ipv6_available():
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as probe:
+            probe.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+
+class TestParseListenAddresses(unittest.TestCase):
+    def test_ipv4_ipv6_and_default_port(self):
+        self.assertEqual(parse_listen_addresses("0.0.0.0:7171, [::]:7171, 10.0.0.5, [2001:db8::1], :443", 7171), [
+            (socket.AF_INET, "0.0.0.0", 7171),
+            (socket.AF_INET6, "::", 7171),
+            (socket.AF_INET, "10.0.0.5", 7171),
+            (socket.AF_INET6, "2001:db8::1", 7171),
+            (socket.AF_INET, "", 443),
+        ])
+        self.assertEqual(parse_listen_addresses("", 7171), [])
+
+    def test_invalid_entries_raise(self):
+        for value in ("example.com:7171", "0.0.0.0:70000", "[::1]:port"):
+            with self.assertRaisesRegex(ValueError, f"invalid LISTEN_ADDRESSES entry '{re.escape(value)}'"):
+                parse_listen_addresses(f"0.0.0.0:7171, {value}", 7171)
+
+
+class TestMultiListener(ServerTestCase):
+    def _server(self, listen_addresses):
+        with patch.dict(os.environ, {"LISTEN_ADDRESSES": listen_addresses}):
+            server = self.make_server(port=0)
+        self.addCleanup(setattr, server, "running", False)
+        return server
+
+    def _exchange(self, family, address, payload):
+        client = socket.socket(family, socket.SOCK_DGRAM)
+        self.addCleanup(client.close)
+        client.settimeout(2)
+        client.sendto(payload, address)
+        return client.recvfrom(64)[0]
+
+    def test_hostname_entry_names_the_setting(self):
+        with self.assertRaisesRegex(ValueError, "invalid LISTEN_ADDRESSES entry 'example.com:7171'"):
+            self._server("0.0.0.0:0,example.com:7171")
+
+    def test_default_is_single_ipv4_listener(self):
+        server = self._server("")
+        self.assertEqual(len(server._listeners), 1)
+        self.assertIs(server.server_socket, server._listeners[0].socket)
+        self.assertEqual(server._admin_listeners([])["listeners"][0]["address"], "0.0.0.0:0")
+
+    def test_one_loop_serves_every_listener_and_replies_on_the_same_socket(self):
+        addresses = "127.0.0.1:0,127.0.0.1:0" + (",[::1]:0" if _ipv6_available() else "")
+        server = self._server(addresses)
+        self.assertTrue(server._bind_server_socket())
+        handled = []
+        with patch.object(server, "_handle_datagram", side_effect=lambda data, sender_ip, sender_port: handled.append((data, sender_ip)) or 60):
+            server.start_receive_thread()
+            for listener in server._listeners:
+                reply = self._exchange(listener.family, (listener.host, listener.port), f"{listener.label}.example.com,v4,8.8.8.8,1".encode())
+                self.assertEqual(reply, b"next,60")
+            deadline = time.monotonic() + 2
+            while any(listener.hints < 1 for listener in server._listeners) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(handled), len(server._listeners))
+        snapshots = server._admin_listeners([])["listeners"]
+        self.assertEqual([(row["datagrams"], row["hints"], row["errors"]) for row in snapshots], [(1, 1, 0)] * len(server._listeners))
+        if len(snapshots) == 3:
+            self.assertEqual(handled[2][1], "::1")
+
+
+if __name__ == "__main__":
+    unittest.main()